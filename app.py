@@ -1,48 +1,117 @@
+import asyncio
 import logging
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ConversationHandler, MessageHandler, filters
-from config import settings
-from handlers.commands import start, health, version, noop_callback, ask_command, my_asks_command, all_asks_command
+import signal
+import time
+from typing import Optional
+from telegram import Update
+from telegram.ext import (
+    Application, CommandHandler, CallbackQueryHandler, ConversationHandler, InlineQueryHandler, MessageHandler,
+    TypeHandler, filters
+)
+from telegram.request import BaseRequest
+from config import GLOBAL_GROUP_ID, local_zone, settings
+from handlers.commands import (
+    start, health, version, noop_callback, ask_command, my_asks_command, all_asks_command, digest_command,
+    search_command
+)
 from handlers.asks import (
-    start_new_ask, on_toggle_assignee, on_picker_next, on_text_entered, 
+    start_new_ask, on_toggle_assignee, on_picker_page, on_picker_search, on_picker_clear,
+    on_picker_next, on_text_entered, 
     on_submit_ask, on_cancel, my_asks, on_done_click, on_done_confirm, 
-    on_done_cancel, all_open_asks, PICK_ASSIGNEES, ENTER_TEXT, CONFIRM_SUBMIT
+    on_done_cancel, all_open_asks, search_results, PICK_ASSIGNEES, ENTER_TEXT, CONFIRM_SUBMIT
 )
+from handlers.export import export_command, on_export_group
+from handlers.inline import on_inline_query, on_inline_done
+from handlers.groups import track_membership, group_command, on_switch_group
+from handlers.reminders import remind_command, on_remind_group, on_remind_pick, on_remind_time
 import db
+import db_async
+import jobs
+import metrics
+from outbound import dispatcher
+import outbox
+from persistence import SQLitePersistence
+import reminders
 
 VERSION = "v0.0.1"
 
 logger = logging.getLogger(__name__)
 
 
-def main():
-    """Main function to set up and run the bot."""
-    logger.info(f"Starting Ford-Fencers-Bot {VERSION}")
-    logger.info(f"Log level: {settings.LOG_LEVEL}")
-    logger.info(f"Timezone: {settings.TZ}")
-    
-    if settings.ALLOWED_CHAT_IDS:
-        logger.info(f"Allowed chat IDs: {settings.ALLOWED_CHAT_IDS}")
-    else:
-        logger.info("No chat ID restrictions - bot will respond to all chats")
-    
-    # Initialize database
-    logger.info("Initializing database...")
-    db.init_db()
+metrics_server = metrics.MetricsServer(settings.METRICS_LISTEN, settings.METRICS_PORT)
+# perf_counter() when main() began, for the startup timing breakdown
+main_started = 0.0
+
+
+async def post_init(app: Application):
+    """Bind background services to the running bot."""
+    dispatcher.start(app.bot)
+    outbox.worker.start()
+    await reminders.scheduler.start(app.job_queue)
+    # Inline queries are answered from memory; build the index before the first update arrives
+    await db_async.load_open_ask_index()
+    await db_async.start_online_migrations()
+    metrics.add_collector(lambda: metrics.OUTBOUND_PENDING.set(dispatcher.pending))
+    if settings.METRICS_PORT:
+        await metrics_server.start()
+    if db.profiler is not None and hasattr(signal, "SIGUSR1"):
+        # kill -USR1 <pid> logs the slowest statements so far without a restart
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGUSR1, lambda: logger.info(db.profiler.report(settings.DB_PROFILE_TOP))
+        )
+        logger.info(f"Query profiling on: slow threshold {settings.DB_SLOW_MS} ms, report on SIGUSR1")
     
-    # Build the application
-    app = Application.builder().token(settings.BOT_TOKEN).build()
+    # Everything from main() until now: database, handler setup, bot login and persistence load
+    ready = time.perf_counter() - main_started
+    metrics.STARTUP_SECONDS.set(ready, "ready")
+    logger.info(f"Bot ready {ready * 1000:.0f} ms after start")
+
+
+async def post_stop(app: Application):
+    """Let in-flight outbound messages finish while the bot can still send."""
+    await db_async.stop_online_migrations()
+    await outbox.worker.stop()
+    await dispatcher.stop()
+
+
+async def post_shutdown(app: Application):
+    """Drain pending database work once the bot has stopped."""
+    await metrics_server.stop()
+    await db_async.flush_registrations()
+    db_async.shutdown()
+
+
+def build_app(request: Optional[BaseRequest] = None) -> Application:
+    """Build the application with every handler and job registered; tests pass a request to stub the Bot API."""
+    builder = (
+        Application.builder()
+        .token(settings.BOT_TOKEN)
+        # Same pool sizes as PTB's defaults; the subclass records per-method Bot API latency
+        .request(request or metrics.InstrumentedRequest(connection_pool_size=256))
+        .get_updates_request(metrics.InstrumentedRequest(connection_pool_size=1))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    if settings.PERSISTENCE:
+        # Conversation state and user_data survive restarts; written behind in batches
+        builder = builder.persistence(SQLitePersistence(update_interval=settings.PERSISTENCE_FLUSH_SECONDS))
+    app = builder.build()
     
     # Add Ask conversation handler
     ask_conv_handler = ConversationHandler(
         entry_points=[
-            CallbackQueryHandler(start_new_ask, pattern=r"^ak:new$"),
+            CallbackQueryHandler(start_new_ask, pattern=r"^ak:(new|g:-?\d+:new)$"),
             CommandHandler("ask", ask_command)
         ],
         states={
             PICK_ASSIGNEES: [
                 CallbackQueryHandler(on_toggle_assignee, pattern=r"^ak:t:\d+$"),
+                CallbackQueryHandler(on_picker_page, pattern=r"^ak:pg:\d+$"),
+                CallbackQueryHandler(on_picker_clear, pattern=r"^ak:qc$"),
                 CallbackQueryHandler(on_picker_next, pattern=r"^ak:n$"),
-                CallbackQueryHandler(on_cancel, pattern=r"^ak:c$")
+                CallbackQueryHandler(on_cancel, pattern=r"^ak:c$"),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, on_picker_search)
             ],
             ENTER_TEXT: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, on_text_entered)
@@ -54,32 +123,119 @@ def main():
         },
         fallbacks=[
             CallbackQueryHandler(on_cancel, pattern=r"^ak:c$")
-        ]
+        ],
+        name="ask",
+        persistent=settings.PERSISTENCE
     )
     
+    # Keep per-group rosters current from activity in group chats, before any other handler runs
+    app.add_handler(TypeHandler(Update, track_membership), group=-2)
+    
     # Add command handlers
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("health", health))
     app.add_handler(CommandHandler("version", version))
     app.add_handler(CommandHandler("my_asks", my_asks_command))
     app.add_handler(CommandHandler("asks_all", all_asks_command))
+    app.add_handler(CommandHandler("group", group_command))
+    app.add_handler(CommandHandler("remind", remind_command))
+    app.add_handler(CommandHandler("digest", digest_command))
+    app.add_handler(CommandHandler("search", search_command))
+    app.add_handler(CommandHandler("export", export_command))
     
     # Add Ask conversation handler
     app.add_handler(ask_conv_handler)
     
     # Add Ask-related callback handlers (outside conversation)
-    app.add_handler(CallbackQueryHandler(my_asks, pattern=r"^ak:my$"))
-    app.add_handler(CallbackQueryHandler(all_open_asks, pattern=r"^ak:all$"))
+    app.add_handler(CallbackQueryHandler(my_asks, pattern=r"^ak:(my|m[pn]:\d+|g:-?\d+:my)$"))
+    app.add_handler(CallbackQueryHandler(all_open_asks, pattern=r"^ak:(all|a[pn]:\d+|g:-?\d+:all)$"))
+    app.add_handler(CallbackQueryHandler(search_results, pattern=r"^ak:(f[pn]:\d+|g:-?\d+:sr)$"))
+    app.add_handler(CallbackQueryHandler(on_switch_group, pattern=r"^ak:g:-?\d+:sw$"))
     app.add_handler(CallbackQueryHandler(on_done_click, pattern=r"^ak:d:\d+$"))
     app.add_handler(CallbackQueryHandler(on_done_confirm, pattern=r"^ak:dy:\d+$"))
     app.add_handler(CallbackQueryHandler(on_done_cancel, pattern=r"^ak:dn:\d+$"))
+    app.add_handler(CallbackQueryHandler(on_remind_group, pattern=r"^ak:g:-?\d+:rm$"))
+    app.add_handler(CallbackQueryHandler(on_remind_pick, pattern=r"^ak:r:\d+$"))
+    app.add_handler(CallbackQueryHandler(on_remind_time, pattern=r"^ak:rt:\d+:[\w: ]+$"))
+    app.add_handler(CallbackQueryHandler(on_inline_done, pattern=r"^ak:id:\d+:\d+$"))
+    app.add_handler(CallbackQueryHandler(on_export_group, pattern=r"^ak:g:-?\d+:ex$"))
+    
+    # "@bot <words>" from any chat: the user's matching open asks to share or mark done
+    app.add_handler(InlineQueryHandler(on_inline_query))
     
     # Add callback query handler for noop buttons (should be last)
     app.add_handler(CallbackQueryHandler(noop_callback, pattern=r"^noop:"))
     
+    # Time every handler registered above and watch the update queue
+    metrics.instrument_handlers(app)
+    
+    # Batch user registrations if configured
+    if settings.REGISTER_FLUSH_SECONDS > 0:
+        app.job_queue.run_repeating(
+            jobs.flush_registrations, interval=settings.REGISTER_FLUSH_SECONDS, name="flush_registrations"
+        )
+    
+    # Archive long-closed asks and return freed pages, off the hot path
+    app.job_queue.run_repeating(
+        jobs.run_retention, interval=settings.RETENTION_INTERVAL_SECONDS, first=60, name="retention"
+    )
+    
+    # Morning digest of open assignments, one grouped query per group
+    if settings.DIGEST_TIME is not None:
+        app.job_queue.run_daily(
+            jobs.send_daily_digest, time=settings.DIGEST_TIME.replace(tzinfo=local_zone()), name="daily_digest"
+        )
+        logger.info(f"Daily digest at {settings.DIGEST_TIME.strftime('%H:%M')} ({settings.TZ})")
+    
+    return app
+
+
+def main():
+    """Main function to set up and run the bot."""
+    global main_started
+    main_started = time.perf_counter()
+    logger.info(f"Starting Ford-Fencers-Bot {VERSION}")
+    logger.info(f"Log level: {settings.LOG_LEVEL}")
+    logger.info(f"Timezone: {settings.TZ}")
+    
+    if settings.ALLOWED_CHAT_IDS:
+        logger.info(f"Allowed chat IDs: {settings.ALLOWED_CHAT_IDS}")
+    else:
+        logger.info("No chat ID restrictions - bot will respond to all chats")
+    if settings.DEFAULT_GROUP_ID == GLOBAL_GROUP_ID:
+        logger.info("New users join the everyone group")
+    else:
+        logger.info(f"New users join group {settings.DEFAULT_GROUP_ID}")
+    logger.info(f"Database shards: {settings.DB_SHARDS}")
+    if settings.UPDATE_MODE == "webhook" and not settings.WEBHOOK_URL:
+        # PTB would otherwise register a URL built from the listen address, which Telegram cannot reach
+        raise SystemExit("UPDATE_MODE=webhook needs WEBHOOK_URL, the public URL Telegram calls")
+    
+    # Initialize database
+    logger.info("Initializing database...")
+    db.init_db()
+    
+    app = build_app()
+    
     # Start the bot
-    logger.info("Starting bot polling...")
-    app.run_polling()
+    if settings.UPDATE_MODE == "webhook":
+        logger.info(f"Starting webhook server on {settings.WEBHOOK_LISTEN}:{settings.WEBHOOK_PORT}/{settings.WEBHOOK_PATH}")
+        if not settings.WEBHOOK_SECRET:
+            logger.warning("WEBHOOK_SECRET is not set - webhook requests will not be authenticated")
+        app.run_webhook(
+            listen=settings.WEBHOOK_LISTEN,
+            port=settings.WEBHOOK_PORT,
+            url_path=settings.WEBHOOK_PATH,
+            webhook_url=settings.WEBHOOK_URL,
+            secret_token=settings.WEBHOOK_SECRET,
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            cert=settings.WEBHOOK_CERT,
+            key=settings.WEBHOOK_KEY,
+            drop_pending_updates=settings.DROP_PENDING_UPDATES,
+        )
+    else:
+        logger.info("Starting bot polling...")
+        app.run_polling(drop_pending_updates=settings.DROP_PENDING_UPDATES)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+"""Compare two bench.run JSON reports and flag regressions.
+
+    python -m bench.compare baseline.json candidate.json --threshold 0.2
+
+Exits non-zero if any benchmark's p95 grew by more than the threshold, or a
+query plan uses a temp B-tree that EXPECTED_SORTS does not list for it.
+"""
+import argparse
+import json
+import sys
+from typing import Set
+
+_ORDER_BY = "USE TEMP B-TREE FOR ORDER BY"
+# Sorts these plans do by design, as they appear in EXPLAIN QUERY PLAN. Each one orders a
+# handful of rows, or only the inner key of rows an index already groups. Any other temp
+# B-tree is a regression, even if the base report had it too.
+EXPECTED_SORTS = {
+    # One group's members by display name
+    "get_roster (cold)": {_ORDER_BY},
+    # Assignees of the requester's last few asks, counted and ranked
+    "get_frequent_assignees": {"USE TEMP B-TREE FOR GROUP BY", _ORDER_BY},
+    # One user's open assignments; the unary + in db.py keeps it off the group's whole open list
+    "page_my_open_assignments": {_ORDER_BY},
+    # idx_assign_open_assignee yields rows grouped by assignee; only each assignee's few are sorted
+    "digest (grouped)": {"USE TEMP B-TREE FOR RIGHT PART OF ORDER BY"},
+    # One page of FTS hits put back in rank order after the join to asks
+    "search_asks": {_ORDER_BY},
+    "search_asks (prefix, 2 words)": {_ORDER_BY},
+    "search_asks (deep page)": {_ORDER_BY},
+}
+
+
+def temp_btrees(result: dict) -> Set[str]:
+    """The temp B-tree steps in every plan a benchmark captured."""
+    return {line.strip() for plan in result.get("plans", {}).values() for line in plan if "TEMP B-TREE" in line}
+
+
+def compare(base: dict, new: dict, threshold: float, metric: str = "p95_ms") -> int:
+    """Print a side-by-side table and return the number of regressions."""
+    regressions = 0
+    print(f"{'benchmark':40s} {'base':>10s} {'new':>10s} {'change':>8s}")
+    for name, result in new["results"].items():
+        flags = []
+        unexpected = temp_btrees(result) - EXPECTED_SORTS.get(name, set())
+        if unexpected:
+            flags.append("TEMP B-TREE (" + ", ".join(sorted(unexpected)) + ")")
+        before = base["results"].get(name)
+        if before is None:
+            print(f"{name:40s} {'-':>10s} {result[metric]:10.3f} {'new':>8s} {' '.join(flags)}")
+            regressions += bool(flags)
+            continue
+        change = (result[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+        if change > threshold:
+            flags.insert(0, "REGRESSION")
+        regressions += bool(flags)
+        print(f"{name:40s} {before[metric]:10.3f} {result[metric]:10.3f} {change:+8.1%} {' '.join(flags)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown (0.2 = 20%%)")
+    parser.add_argument("--metric", default="p95_ms", choices=["p50_ms", "p95_ms", "p99_ms", "mean_ms"])
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"base {base['meta']['commit']} vs new {new['meta']['commit']} ({args.metric})")
+    sys.exit(1 if compare(base, new, args.threshold, args.metric) else 0)
+
+
+if __name__ == "__main__":
+    main()
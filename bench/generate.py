@@ -0,0 +1,125 @@
+"""Fill a SQLite database with a seeded synthetic dataset for benchmarking db.py.
+
+    python -m bench.generate --db bench.db --users 1000 --asks 1000000
+
+The same seed and scale always produce the same rows, so timings from
+different commits are comparable.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("BOT_TOKEN", "bench")
+
+import db  # noqa: E402
+
+FIRST_NAMES = [
+    "Alice", "Ben", "Chloe", "Dan", "Eva", "Frank", "Grace", "Hugo", "Ivy", "Jack",
+    "Kira", "Liam", "Maya", "Noah", "Olive", "Pete", "Quinn", "Rosa", "Sam", "Tess",
+]
+VERBS = ["renew", "book", "pick up", "pay", "pack", "wash", "sharpen", "register for", "email", "order"]
+OBJECTS = [
+    "the fencing club dues", "the tournament entry", "groceries", "the epee", "the car",
+    "the masks", "the coach", "new gloves", "the team jackets", "the hotel",
+]
+# Fixed end of the generated history so the same seed yields identical timestamps
+HISTORY_END = datetime(2025, 9, 1)
+
+
+def generate(path: str, users: int, asks: int, chats: int, open_ratio: float,
+             max_assignees: int, years: float, seed: int, batch: int = 20000):
+    """Create a fresh database at path and fill it with synthetic users, asks and assignments."""
+    rng = random.Random(seed)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    db.close_pool()
+    db.DB_PATH = path
+    db.init_db()
+
+    user_rows = [
+        (1_000_000 + i, f"{rng.choice(FIRST_NAMES)} {i}", "2020-01-01T00:00:00")
+        for i in range(users)
+    ]
+    chat_ids = [-1_000_000_000_000 - i for i in range(chats)]
+    start = HISTORY_END - timedelta(days=365 * years)
+    span = timedelta(days=365 * years).total_seconds()
+
+    # Every chat is a group on shard 0 with all users on its roster, as in a single-tenant deployment
+    with db.get_pool().write() as conn:
+        conn.executemany("INSERT INTO users (user_id, display_name, created_at) VALUES (?, ?, ?)", user_rows)
+        conn.executemany("INSERT INTO groups (chat_id, title, shard, created_at) VALUES (?, ?, 0, ?)",
+                         [(chat_id, f"Family {i}", "2020-01-01T00:00:00") for i, chat_id in enumerate(chat_ids)])
+        conn.executemany("INSERT INTO group_members (chat_id, user_id, joined_at) VALUES (?, ?, ?)",
+                         [(chat_id, user_id, created) for chat_id in chat_ids for user_id, _, created in user_rows])
+
+    # Asks are generated in creation order so ids and created_at grow together, as in production
+    offsets = sorted(rng.random() * span for _ in range(asks))
+    ask_id = 0
+    for lo in range(0, asks, batch):
+        ask_rows, assignee_rows = [], []
+        for offset in offsets[lo:lo + batch]:
+            ask_id += 1
+            created = start + timedelta(seconds=offset)
+            requester_id, requester_name, _ = rng.choice(user_rows)
+            # Recent asks are far more likely to still be open; the mean stays at open_ratio
+            is_open = rng.random() < open_ratio * 2 * offset / span
+            closed_at = None if is_open else (created + timedelta(hours=rng.randint(1, 240))).isoformat()
+            text = f"{rng.choice(VERBS)} {rng.choice(OBJECTS)}"
+
+            picked = rng.sample(user_rows, rng.randint(1, max_assignees))
+            # Open asks keep at least one open assignment; closed asks have all of them done
+            open_index = rng.randrange(len(picked)) if is_open else -1
+            open_count = 0
+            for i, (user_id, display_name, _) in enumerate(picked):
+                done = not is_open or (i != open_index and rng.random() < 0.3)
+                done_at = (created + timedelta(hours=rng.randint(1, 200))).isoformat() if done else None
+                open_count += not done
+                assignee_rows.append((ask_id, user_id, display_name, 'done' if done else 'open', done_at))
+
+            ask_rows.append((ask_id, rng.choice(chat_ids), requester_id, requester_name, text,
+                             'open' if is_open else 'closed', created.isoformat(), closed_at, open_count))
+
+        with db.get_pool().write() as conn:
+            conn.executemany("""
+                INSERT INTO asks (id, chat_id, requester_id, requester_name, text, status, created_at,
+                                  closed_at, open_assignees)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, ask_rows)
+            conn.executemany("""
+                INSERT INTO ask_assignees (ask_id, assignee_id, assignee_name, status, done_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, assignee_rows)
+
+    with db.get_pool().write() as conn:
+        conn.execute("ANALYZE;")
+    db.close_pool()
+    return {
+        "users": users, "asks": asks, "chats": chats, "open_ratio": open_ratio,
+        "max_assignees": max_assignees, "years": years, "seed": seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic benchmark database.")
+    parser.add_argument("--db", default="bench.db", help="output database path (overwritten)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--asks", type=int, default=100000)
+    parser.add_argument("--chats", type=int, default=1)
+    parser.add_argument("--open-ratio", type=float, default=0.05, help="fraction of asks still open")
+    parser.add_argument("--max-assignees", type=int, default=4)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generate(args.db, args.users, args.asks, args.chats, args.open_ratio,
+             args.max_assignees, args.years, args.seed)
+    print(f"Generated {args.asks} asks for {args.users} users in {time.perf_counter() - started:.1f}s -> {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Time db.py functions against a generated database and capture their query plans.
+
+    python -m bench.generate --db bench.db --asks 1000000
+    python -m bench.run --db bench.db --out bench_results.json
+
+Each function is called repeatedly with seeded random arguments; latencies
+are reported as p50/p95/p99 and every SQL statement it ran is recorded with
+its EXPLAIN QUERY PLAN. Write benchmarks run against a scratch copy of the
+database so the source stays reusable.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+os.environ.setdefault("BOT_TOKEN", "bench")
+
+import db  # noqa: E402
+from config import settings  # noqa: E402
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+    index = max(0, min(len(samples) - 1, int(round(pct / 100 * len(samples) + 0.5)) - 1))
+    return samples[index]
+
+
+def capture_statements(func: Callable[[], object]) -> Dict[str, str]:
+    """Run func once and return {normalized SQL: first expanded SQL} for statements it executed."""
+    pool = db.get_pool()
+    connections = [pool._writer] + list(pool._readers.queue)
+    statements: Dict[str, str] = {}
+
+    def trace(sql: str):
+        head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+        if head in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE"):
+            statements.setdefault(db.normalize_sql(sql), sql)
+
+    for conn in connections:
+        conn.set_trace_callback(trace)
+    try:
+        func()
+    finally:
+        for conn in connections:
+            conn.set_trace_callback(None)
+    return statements
+
+
+def explain(sql: str) -> List[str]:
+    """EXPLAIN QUERY PLAN for one statement, as indented plan lines."""
+    conn = sqlite3.connect(db.DB_PATH)
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    except sqlite3.Error as e:
+        return [f"<explain failed: {e}>"]
+    finally:
+        conn.close()
+    depth: Dict[int, int] = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def measure(name: str, make_call: Callable[[], Callable[[], object]], iterations: int,
+            before_each: Callable[[], None] = None) -> Dict:
+    """Time `iterations` calls; make_call returns a fresh zero-argument call each time."""
+    plans = {key: explain(sql) for key, sql in capture_statements(make_call()).items()}
+    samples = []
+    for _ in range(iterations):
+        call = make_call()
+        if before_each:
+            before_each()
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    result = {
+        "iterations": iterations,
+        "mean_ms": sum(samples) / len(samples),
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "max_ms": samples[-1],
+        "temp_btree": any("TEMP B-TREE" in line for plan in plans.values() for line in plan),
+        "plans": plans,
+    }
+    print(f"{name:40s} p50 {result['p50_ms']:8.3f}ms  p95 {result['p95_ms']:8.3f}ms  "
+          f"p99 {result['p99_ms']:8.3f}ms{'  [temp b-tree]' if result['temp_btree'] else ''}")
+    return result
+
+
+def load_ids(sql: str) -> List:
+    with db.get_pool().read() as conn:
+        return [row[0] if len(row) == 1 else row for row in conn.execute(sql).fetchall()]
+
+
+def run_benchmarks(iterations: int, seed: int) -> Dict[str, Dict]:
+    """Benchmark every public db.py function against the currently configured DB_PATH."""
+    rng = random.Random(seed)
+    user_ids = load_ids("SELECT user_id FROM users")
+    users = load_ids("SELECT user_id, display_name FROM users")
+    chat_ids = load_ids("SELECT DISTINCT chat_id FROM asks")
+    open_assignments = load_ids("""
+        SELECT aa.id, aa.assignee_id, aa.ask_id FROM ask_assignees aa
+        WHERE aa.status = 'open' ORDER BY aa.id
+    """)
+    open_ask_ids = load_ids("SELECT id FROM asks WHERE status = 'open'")
+    rng.shuffle(open_assignments)
+    assignments = iter(open_assignments)
+    now = datetime.utcnow().isoformat()
+    results = {}
+
+    results["get_roster (cold)"] = measure(
+        "get_roster (cold)", lambda: (lambda cid=rng.choice(chat_ids): db.get_roster(cid)), iterations,
+        before_each=db.invalidate_rosters)
+    results["get_frequent_assignees"] = measure(
+        "get_frequent_assignees",
+        lambda: (lambda cid=rng.choice(chat_ids), uid=rng.choice(user_ids): db.get_frequent_assignees(cid, uid)),
+        iterations)
+    results["list_my_open_assignments"] = measure(
+        "list_my_open_assignments",
+        lambda: (lambda uid=rng.choice(user_ids): db.list_my_open_assignments(uid)), iterations)
+    results["get_all_open_asks"] = measure(
+        "get_all_open_asks",
+        lambda: (lambda cid=rng.choice(chat_ids): db.get_all_open_asks(cid)), iterations)
+    results["page_my_open_assignments"] = measure(
+        "page_my_open_assignments",
+        lambda: (lambda cid=rng.choice(chat_ids), uid=rng.choice(user_ids):
+                 db.page_my_open_assignments(cid, uid, settings.PAGE_SIZE)), iterations)
+    results["page_open_asks"] = measure(
+        "page_open_asks",
+        lambda: (lambda cid=rng.choice(chat_ids): db.page_open_asks(cid, settings.PAGE_SIZE)), iterations)
+    results["page_open_asks (deep)"] = measure(
+        "page_open_asks (deep)",
+        lambda: (lambda cid=rng.choice(chat_ids), before=rng.choice(open_ask_ids):
+                 db.page_open_asks(cid, settings.PAGE_SIZE, before=before)), iterations)
+
+    # The daily digest's grouped pass over one chat against the per-assignee queries it replaces
+    results["digest (grouped)"] = measure(
+        "digest (grouped)",
+        lambda: (lambda cid=rng.choice(chat_ids): list(db.iter_open_assignments_by_assignee(cid))), iterations)
+    results["digest (per assignee)"] = measure(
+        "digest (per assignee)",
+        lambda: (lambda cid=rng.choice(chat_ids):
+                 [db.list_my_open_assignments(uid) for uid, _ in db.get_roster(cid)]), max(1, iterations // 10))
+
+    # /search: a common word matches much of the history, a two-word prefix query far less
+    words = ["renew", "fencing", "groceries", "epee", "jackets", "hotel", "tournament", "coach"]
+    results["search_asks"] = measure(
+        "search_asks",
+        lambda: (lambda cid=rng.choice(chat_ids), word=rng.choice(words):
+                 db.search_asks(cid, word, settings.PAGE_SIZE)), iterations)
+    results["search_asks (prefix, 2 words)"] = measure(
+        "search_asks (prefix, 2 words)",
+        lambda: (lambda cid=rng.choice(chat_ids), pair=rng.sample(words, 2):
+                 db.search_asks(cid, f"{pair[0][:4]} {pair[1][:4]}", settings.PAGE_SIZE)), iterations)
+    results["search_asks (deep page)"] = measure(
+        "search_asks (deep page)",
+        lambda: (lambda cid=rng.choice(chat_ids), word=rng.choice(words):
+                 db.search_asks(cid, word, settings.PAGE_SIZE, offset=10 * settings.PAGE_SIZE)), iterations)
+
+    # Inline queries: the startup load from SQLite, then per-keystroke lookups served from memory
+    results["load_open_ask_index"] = measure(
+        "load_open_ask_index", lambda: db.load_open_ask_index, max(1, iterations // 10))
+    results["inline query (index)"] = measure(
+        "inline query (index)",
+        lambda: (lambda uid=rng.choice(user_ids), word=rng.choice(words):
+                 db.open_ask_index.search(uid, word[:3], settings.INLINE_RESULTS)), iterations)
+
+    # Writes: fresh names force real upserts; each assignment is completed at most once
+    counter = iter(range(10 ** 9))
+    results["register_user"] = measure(
+        "register_user",
+        lambda: (lambda u=rng.choice(users), n=next(counter): db.register_user(u[0], f"{u[1]} #{n}")), iterations)
+    results["create_ask"] = measure(
+        "create_ask",
+        lambda: (lambda cid=rng.choice(chat_ids), req=rng.choice(users), who=rng.sample(users, 3):
+                 db.create_ask(cid, req[0], req[1], "bench ask", who, notify=True)), iterations)
+
+    def complete_next():
+        assignment_id, assignee_id, _ = next(assignments)
+        return lambda: db.complete_assignment(assignment_id, assignee_id, now, notify_name="Bench")
+
+    results["complete_assignment"] = measure(
+        "complete_assignment", complete_next, min(iterations, max(1, len(open_assignments) - 1)))
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark db.py against a generated database.")
+    parser.add_argument("--db", default="bench.db", help="database produced by bench.generate")
+    parser.add_argument("--out", default="bench_results.json", help="JSON results path")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} not found; create it with python -m bench.generate")
+
+    # Benchmark a scratch copy so write benchmarks don't drift the source dataset
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    scratch = os.path.join(workdir, "bench.db")
+    with sqlite3.connect(args.db) as src, sqlite3.connect(scratch) as dst:
+        src.backup(dst)
+
+    db.close_pool()
+    db.DB_PATH = scratch
+    db.init_db()
+    try:
+        with db.get_pool().read() as conn:
+            scale = {
+                "users": conn.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+                "asks": conn.execute("SELECT COUNT(*) FROM asks").fetchone()[0],
+                "open_asks": conn.execute("SELECT COUNT(*) FROM asks WHERE status = 'open'").fetchone()[0],
+                "assignments": conn.execute("SELECT COUNT(*) FROM ask_assignees").fetchone()[0],
+            }
+        print(f"Dataset: {scale}")
+        results = run_benchmarks(args.iterations, args.seed)
+    finally:
+        db.close_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "sqlite_version": sqlite3.sqlite_version,
+            "python": platform.python_version(),
+            "db": args.db,
+            "iterations": args.iterations,
+            "seed": args.seed,
+            "read_connections": settings.DB_READ_CONNECTIONS,
+            "scale": scale,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import os
 import logging
 from dataclasses import dataclass
+from datetime import datetime, time, timedelta, timezone, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 
 def parse_chat_ids(s: str | None) -> set[int]:
@@ -19,19 +21,213 @@ def parse_chat_ids(s: str | None) -> set[int]:
     return chat_ids
 
 
+def parse_bool(s: str | None, default: bool = False) -> bool:
+    """Parse a boolean flag from environment variable."""
+    if s is None or not s.strip():
+        return default
+    return s.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Roster of every user in deployments without an allowed chat to use as the default group,
+# like the single global roster before groups existed; no Telegram chat has id 0
+GLOBAL_GROUP_ID = 0
+GLOBAL_GROUP_TITLE = "Everyone"
+
+
+def parse_default_group(s: str | None, allowed_chat_ids: str | None) -> int:
+    """Group that new users join automatically: DEFAULT_GROUP_ID, the first allowed chat, or GLOBAL_GROUP_ID."""
+    if s and s.strip():
+        try:
+            return int(s.strip())
+        except ValueError:
+            logging.warning(f"Invalid chat ID in DEFAULT_GROUP_ID: {s}")
+    for part in (allowed_chat_ids or "").split(','):
+        try:
+            return int(part.strip())
+        except ValueError:
+            continue
+    return GLOBAL_GROUP_ID
+
+
+def parse_clock(s: str | None, name: str) -> time | None:
+    """Parse an HH:MM time of day from environment variable; empty or invalid means None."""
+    if not s or not s.strip():
+        return None
+    try:
+        hours, minutes = (int(part) for part in s.strip().split(':'))
+        return time(hours, minutes)
+    except ValueError:
+        logging.warning(f"Invalid HH:MM time in {name}: {s}")
+        return None
+
+
+def parse_clock_range(s: str | None, name: str) -> tuple[time, time] | None:
+    """Parse an HH:MM-HH:MM range of the day (it may wrap past midnight) from environment variable."""
+    if not s or not s.strip():
+        return None
+    start, _, end = s.partition('-')
+    start, end = parse_clock(start, name), parse_clock(end, name)
+    if start is None or end is None:
+        logging.warning(f"Invalid HH:MM-HH:MM range in {name}: {s}")
+        return None
+    return start, end
+
+
+def quiet_seconds_left(now: datetime, quiet: tuple[time, time] | None) -> float:
+    """Seconds until the quiet range ends if the local time now falls inside it, else 0."""
+    if quiet is None:
+        return 0.0
+    start, end = quiet
+    clock = now.time().replace(tzinfo=None)
+    inside = start <= clock < end if start <= end else clock >= start or clock < end
+    if not inside:
+        return 0.0
+    until = now.replace(hour=end.hour, minute=end.minute, second=0, microsecond=0)
+    if until <= now:
+        until += timedelta(days=1)
+    return (until - now).total_seconds()
+
+
+def local_zone() -> tzinfo:
+    """The bot's configured timezone (TZ), UTC if it is not a known zone."""
+    try:
+        return ZoneInfo(settings.TZ)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
 @dataclass
 class Settings:
     BOT_TOKEN: str
     ALLOWED_CHAT_IDS: set[int]
+    DEFAULT_GROUP_ID: int
     LOG_LEVEL: str
     TZ: str
+    DB_READER_THREADS: int
+    DB_READ_CONNECTIONS: int
+    DB_CACHE_SIZE_KB: int
+    DB_MMAP_SIZE: int
+    DB_BUSY_TIMEOUT_MS: int
+    DB_STATEMENT_CACHE: int
+    DB_SHARDS: int
+    DB_PROFILE: bool
+    DB_SLOW_MS: float
+    DB_PROFILE_PROGRESS_OPS: int
+    DB_PROFILE_TOP: int
+    REGISTER_FLUSH_SECONDS: float
+    PERSISTENCE: bool
+    PERSISTENCE_FLUSH_SECONDS: float
+    OUTBOUND_CONCURRENCY: int
+    OUTBOUND_GLOBAL_RATE: float
+    OUTBOUND_CHAT_RATE: float
+    OUTBOUND_MAX_RETRIES: int
+    OUTBOX_BATCH_SIZE: int
+    OUTBOX_POLL_SECONDS: float
+    OUTBOX_MAX_ATTEMPTS: int
+    OUTBOX_RETENTION_DAYS: int
+    UPDATE_MODE: str
+    WEBHOOK_LISTEN: str
+    WEBHOOK_PORT: int
+    WEBHOOK_PATH: str
+    WEBHOOK_URL: str | None
+    WEBHOOK_SECRET: str | None
+    WEBHOOK_MAX_CONNECTIONS: int
+    WEBHOOK_CERT: str | None
+    WEBHOOK_KEY: str | None
+    DROP_PENDING_UPDATES: bool
+    PAGE_SIZE: int
+    VIEW_CACHE_SIZE: int
+    PICKER_PAGE_SIZE: int
+    INLINE_RESULTS: int
+    INLINE_CACHE_SECONDS: int
+    REMINDER_WINDOW: int
+    DIGEST_TIME: time | None
+    QUIET_HOURS: tuple[time, time] | None
+    ARCHIVE_AFTER_DAYS: int
+    ARCHIVE_BATCH_SIZE: int
+    RETENTION_INTERVAL_SECONDS: float
+    VACUUM_PAGES: int
+    EXPORT_SPOOL_BYTES: int
+    METRICS_LISTEN: str
+    METRICS_PORT: int
 
 
 settings = Settings(
     BOT_TOKEN=os.environ["BOT_TOKEN"],
     ALLOWED_CHAT_IDS=parse_chat_ids(os.getenv("ALLOWED_CHAT_IDS")),
+    # Everyone who talks to the bot joins this roster, so there is always one like the old global roster
+    DEFAULT_GROUP_ID=parse_default_group(os.getenv("DEFAULT_GROUP_ID"), os.getenv("ALLOWED_CHAT_IDS")),
     LOG_LEVEL=os.getenv("LOG_LEVEL", "INFO"),
     TZ=os.getenv("TZ", "UTC"),
+    DB_READER_THREADS=int(os.getenv("DB_READER_THREADS", "3")),
+    # Defaults to one reader connection per reader thread
+    DB_READ_CONNECTIONS=int(os.getenv("DB_READ_CONNECTIONS") or os.getenv("DB_READER_THREADS", "3")),
+    DB_CACHE_SIZE_KB=int(os.getenv("DB_CACHE_SIZE_KB", "8192")),
+    DB_MMAP_SIZE=int(os.getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024))),
+    DB_BUSY_TIMEOUT_MS=int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000")),
+    DB_STATEMENT_CACHE=int(os.getenv("DB_STATEMENT_CACHE", "128")),
+    # SQLite files new groups are spread over; existing groups stay on the shard they started on
+    DB_SHARDS=max(int(os.getenv("DB_SHARDS", "1")), 1),
+    # Opt-in statement profiling: log statements slower than DB_SLOW_MS with their query plan and
+    # dump the DB_PROFILE_TOP statements by total time on SIGUSR1
+    DB_PROFILE=parse_bool(os.getenv("DB_PROFILE")),
+    DB_SLOW_MS=float(os.getenv("DB_SLOW_MS", "100")),
+    DB_PROFILE_PROGRESS_OPS=int(os.getenv("DB_PROFILE_PROGRESS_OPS", "1000")),
+    DB_PROFILE_TOP=int(os.getenv("DB_PROFILE_TOP", "20")),
+    # 0 writes registrations immediately; >0 batches them and flushes on this interval
+    REGISTER_FLUSH_SECONDS=float(os.getenv("REGISTER_FLUSH_SECONDS", "0")),
+    # Keep half-finished asks across restarts; changes are written in one batch per interval
+    PERSISTENCE=parse_bool(os.getenv("PERSISTENCE"), default=True),
+    PERSISTENCE_FLUSH_SECONDS=max(float(os.getenv("PERSISTENCE_FLUSH_SECONDS", "10")), 1.0),
+    # Telegram allows ~30 messages/s overall and ~1 message/s per chat
+    OUTBOUND_CONCURRENCY=int(os.getenv("OUTBOUND_CONCURRENCY", "8")),
+    OUTBOUND_GLOBAL_RATE=float(os.getenv("OUTBOUND_GLOBAL_RATE", "25")),
+    OUTBOUND_CHAT_RATE=float(os.getenv("OUTBOUND_CHAT_RATE", "1")),
+    OUTBOUND_MAX_RETRIES=int(os.getenv("OUTBOUND_MAX_RETRIES", "5")),
+    OUTBOX_BATCH_SIZE=int(os.getenv("OUTBOX_BATCH_SIZE", "50")),
+    OUTBOX_POLL_SECONDS=float(os.getenv("OUTBOX_POLL_SECONDS", "30")),
+    OUTBOX_MAX_ATTEMPTS=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10")),
+    OUTBOX_RETENTION_DAYS=int(os.getenv("OUTBOX_RETENTION_DAYS", "7")),
+    # "polling" (default) or "webhook"
+    UPDATE_MODE=os.getenv("UPDATE_MODE", "polling").lower(),
+    WEBHOOK_LISTEN=os.getenv("WEBHOOK_LISTEN", "127.0.0.1"),
+    WEBHOOK_PORT=int(os.getenv("WEBHOOK_PORT", "8443")),
+    WEBHOOK_PATH=os.getenv("WEBHOOK_PATH", "telegram"),
+    # Public URL Telegram should call; required in webhook mode
+    WEBHOOK_URL=os.getenv("WEBHOOK_URL"),
+    WEBHOOK_SECRET=os.getenv("WEBHOOK_SECRET"),
+    WEBHOOK_MAX_CONNECTIONS=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40")),
+    WEBHOOK_CERT=os.getenv("WEBHOOK_CERT"),
+    WEBHOOK_KEY=os.getenv("WEBHOOK_KEY"),
+    DROP_PENDING_UPDATES=parse_bool(os.getenv("DROP_PENDING_UPDATES")),
+    # Items per My Asks / All Open Asks page; keeps messages and keyboards within Telegram limits
+    PAGE_SIZE=min(max(int(os.getenv("PAGE_SIZE", "8")), 1), 20),
+    # Rendered My Asks pages kept in memory (LRU across all users)
+    VIEW_CACHE_SIZE=int(os.getenv("VIEW_CACHE_SIZE", "512")),
+    # People per assignee picker page, two per row; Telegram allows at most 100 buttons per keyboard
+    PICKER_PAGE_SIZE=min(max(int(os.getenv("PICKER_PAGE_SIZE", "10")), 2), 90),
+    # Open asks per inline query answer (Telegram allows 50); more arrive as the user scrolls.
+    # Telegram may reuse an answer for INLINE_CACHE_SECONDS, so keep it short: asks close often
+    INLINE_RESULTS=min(max(int(os.getenv("INLINE_RESULTS", "20")), 1), 50),
+    INLINE_CACHE_SECONDS=max(int(os.getenv("INLINE_CACHE_SECONDS", "10")), 0),
+    # Pending reminders the scheduler keeps in memory; more are loaded from SQLite as these fire
+    REMINDER_WINDOW=max(int(os.getenv("REMINDER_WINDOW", "256")), 1),
+    # Daily "still open" DM to every assignee at this TZ time (e.g. 08:00); off unless set
+    DIGEST_TIME=parse_clock(os.getenv("DIGEST_TIME"), "DIGEST_TIME"),
+    # TZ range (e.g. 22:00-07:00) in which neither digests nor reminders are sent; what falls due
+    # inside it goes out when it ends
+    QUIET_HOURS=parse_clock_range(os.getenv("QUIET_HOURS"), "QUIET_HOURS"),
+    # Asks closed this many days ago move to the archive tables (0 keeps everything hot), a batch per
+    # short transaction; every RETENTION_INTERVAL_SECONDS, then up to VACUUM_PAGES free pages (0 = all) go back to the filesystem
+    ARCHIVE_AFTER_DAYS=max(int(os.getenv("ARCHIVE_AFTER_DAYS", "30")), 0),
+    ARCHIVE_BATCH_SIZE=max(int(os.getenv("ARCHIVE_BATCH_SIZE", "500")), 1),
+    RETENTION_INTERVAL_SECONDS=max(float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600")), 60.0),
+    VACUUM_PAGES=max(int(os.getenv("VACUUM_PAGES", "2000")), 0),
+    # /export files stay in memory up to this size while they are written, then move to a temp file
+    EXPORT_SPOOL_BYTES=max(int(os.getenv("EXPORT_SPOOL_BYTES", str(8 * 1024 * 1024))), 0),
+    # Prometheus text endpoint at http://METRICS_LISTEN:METRICS_PORT/metrics; 0 disables it
+    METRICS_LISTEN=os.getenv("METRICS_LISTEN", "127.0.0.1"),
+    METRICS_PORT=int(os.getenv("METRICS_PORT", "0")),
 )
 
 
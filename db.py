@@ -1,208 +1,2029 @@
+import heapq
+import json
+import os
 import sqlite3
 import logging
+import queue
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from itertools import groupby
+from operator import itemgetter
+from typing import Callable, Iterable, Iterator, List, Dict, Set, Tuple, Optional, NamedTuple
+
+import metrics
+from config import GLOBAL_GROUP_ID, GLOBAL_GROUP_TITLE, settings
 
 logger = logging.getLogger(__name__)
 
 DB_PATH = "family_bot.db"
 
+# Statement kinds the profiler times; transaction control and PRAGMAs only mark where the previous one ended
+_PROFILED_KINDS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and replace literals with ? so repeated statements share one key."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"(?<![\w.])-?\d+(?:\.\d+)?\b", "?", sql)
+    return " ".join(sql.split())
+
+
+class QueryProfiler:
+    """Opt-in statement timing through sqlite3 trace and progress callbacks.
+    
+    The trace callback fires when a statement starts; it ends when the next statement starts on the
+    same connection or the connection goes back to the pool, so times include fetching the rows.
+    The progress handler counts VM steps (in units of `progress_ops`) as a load-independent cost.
+    """
+    
+    def __init__(self, slow_ms: float, progress_ops: int):
+        self.slow_ms = slow_ms
+        self.progress_ops = progress_ops
+        self._lock = threading.Lock()
+        # normalized SQL -> [calls, total_ms, max_ms, steps]
+        self._stats: Dict[str, List[float]] = {}
+        # (database path, normalized SQL) -> query plan
+        self._plans: Dict[Tuple[str, str], List[str]] = {}
+        # id(connection) -> [sql, started, steps, database path] of the statement running on it
+        self._running: Dict[int, list] = {}
+        # database path -> private connection that runs EXPLAIN QUERY PLAN on that file
+        self._explain_conns: Dict[str, sqlite3.Connection] = {}
+        self.since = datetime.utcnow()
+    
+    def attach(self, conn: sqlite3.Connection, path: str):
+        """Trace conn, a connection on the database file at path (where its plans are explained)."""
+        state = self._running[id(conn)] = [None, 0.0, 0, path]
+        
+        def on_statement(sql: str):
+            # Statements run by triggers are part of the one that fired them. Depending on the Python
+            # version they arrive as the trigger's "-- ..." text or as the firing statement's own SQL
+            # again; either way they neither end it nor count as calls of their own
+            if sql.startswith("--") or sql == state[0]:
+                return
+            self._finish(state)
+            head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+            if head in _PROFILED_KINDS:
+                state[0], state[1], state[2] = sql, time.perf_counter(), 0
+        
+        def on_progress():
+            state[2] += 1
+        
+        conn.set_trace_callback(on_statement)
+        conn.set_progress_handler(on_progress, self.progress_ops)
+    
+    def finish(self, conn: sqlite3.Connection):
+        """Close out the statement last run on conn; call when the connection is released."""
+        state = self._running.get(id(conn))
+        if state is not None:
+            self._finish(state)
+    
+    def _finish(self, state: list):
+        sql = state[0]
+        if sql is None:
+            return
+        state[0] = None
+        elapsed_ms = (time.perf_counter() - state[1]) * 1000
+        key = normalize_sql(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [0, 0.0, 0.0, 0]
+            stats[0] += 1
+            stats[1] += elapsed_ms
+            stats[2] = max(stats[2], elapsed_ms)
+            stats[3] += state[2]
+        if elapsed_ms >= self.slow_ms:
+            plan = "\n    ".join(self._plan(state[3], key, sql))
+            logger.warning(f"Slow query ({elapsed_ms:.1f} ms, {state[2] * self.progress_ops} VM ops): "
+                           f"{' '.join(sql.split())}\n    {plan}")
+    
+    def _plan(self, path: str, key: str, sql: str) -> List[str]:
+        """EXPLAIN QUERY PLAN on a private connection to the statement's own file, once per normalized statement."""
+        with self._lock:
+            plan = self._plans.get((path, key))
+            if plan is not None:
+                return plan
+            try:
+                explain_conn = self._explain_conns.get(path)
+                if explain_conn is None:
+                    explain_conn = self._explain_conns[path] = sqlite3.connect(path, check_same_thread=False)
+                    explain_conn.execute("PRAGMA query_only=ON;")
+                plan = [row[3] for row in explain_conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            except sqlite3.Error as e:
+                # e.g. a table created by a transaction that has not committed yet; try again next time
+                return [f"<no plan: {e}>"]
+            self._plans[(path, key)] = plan
+            return plan
+    
+    def report(self, top: int = 20) -> str:
+        """The top statements by total time since start or the last reset, as a text table."""
+        with self._lock:
+            rows = sorted(self._stats.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        lines = [f"Top {len(rows)} statements by total time since {self.since.isoformat(timespec='seconds')}Z:",
+                 f"{'total ms':>10} {'calls':>7} {'avg ms':>8} {'max ms':>8} {'VM ops':>10}  statement"]
+        for key, (calls, total_ms, max_ms, steps) in rows:
+            lines.append(f"{total_ms:10.1f} {calls:7d} {total_ms / calls:8.2f} {max_ms:8.1f} "
+                         f"{steps * self.progress_ops:10d}  {key[:200]}")
+        return "\n".join(lines)
+    
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.since = datetime.utcnow()
+
+
+# Set when DB_PROFILE is on; every pooled connection is then traced
+profiler: Optional[QueryProfiler] = (
+    QueryProfiler(settings.DB_SLOW_MS, settings.DB_PROFILE_PROGRESS_OPS) if settings.DB_PROFILE else None
+)
+
+
+class ConnectionPool:
+    """Long-lived SQLite connections: one writer plus a fixed set of query_only readers."""
+
+    def __init__(self, path: str, readers: int):
+        self.path = path
+        self._write_lock = threading.Lock()
+        # Writer first so the file exists and is in WAL mode before readers attach
+        self._writer = self._connect(read_only=False)
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(readers):
+            self._readers.put(self._connect(read_only=True))
+
+    def _connect(self, read_only: bool) -> sqlite3.Connection:
+        """Open a connection with the tuned PRAGMAs every connection must share."""
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=settings.DB_STATEMENT_CACHE,
+        )
+        conn.execute(f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS};")
+        # auto_vacuum can only be chosen before the first table exists; new files let the retention
+        # job hand archived pages back to the filesystem (older files: python -m tools.retention vacuum)
+        if not read_only and conn.execute("PRAGMA page_count;").fetchone()[0] == 0:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        # WAL is persistent in the file; only switch (which needs a lock) when it is not on yet
+        if not read_only and conn.execute("PRAGMA journal_mode;").fetchone()[0] != "wal":
+            conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute(f"PRAGMA cache_size=-{settings.DB_CACHE_SIZE_KB};")
+        conn.execute(f"PRAGMA mmap_size={settings.DB_MMAP_SIZE};")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        conn.execute("PRAGMA foreign_keys=ON;")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON;")
+        if profiler is not None:
+            profiler.attach(conn, self.path)
+        return conn
+
+    @contextmanager
+    def read(self):
+        """Borrow a reader connection for the duration of the block."""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            if profiler is not None:
+                profiler.finish(conn)
+            self._readers.put(conn)
+
+    @contextmanager
+    def write(self):
+        """Run the block in a single IMMEDIATE transaction on the writer connection."""
+        with self._write_lock:
+            conn = self._writer
+            conn.execute("BEGIN IMMEDIATE;")
+            try:
+                yield conn
+                conn.execute("COMMIT;")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK;")
+                raise
+            finally:
+                if profiler is not None:
+                    profiler.finish(conn)
+
+    def close(self):
+        """Close every connection held by the pool."""
+        with self._write_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+
+# Asks, assignments and the outbox live in the shard of their group's chat; ids of those rows
+# carry the shard in their high bits so any id can be routed without a lookup.
+# Shard 0 is DB_PATH and also holds the directory: users, groups and group memberships.
+SHARD_ID_BITS = 40
+
+_pools: Dict[int, ConnectionPool] = {}
+_pool_lock = threading.Lock()
+
+
+def shard_path(shard: int) -> str:
+    """SQLite file for a shard: DB_PATH for shard 0, e.g. family_bot.shard2.db for the others."""
+    if shard == 0:
+        return DB_PATH
+    root, ext = os.path.splitext(DB_PATH)
+    return f"{root}.shard{shard}{ext}"
+
+
+def shard_of_id(row_id: int) -> int:
+    """Shard holding an ask, assignment or outbox row."""
+    return row_id >> SHARD_ID_BITS
+
+
+class UnknownShard(LookupError):
+    """A shard number that no configured shard or known group lives on, e.g. from a made-up id."""
+
+
+def is_known_shard(shard: int) -> bool:
+    """Whether a shard exists or may be created: shard 0, one of DB_SHARDS, or the home of a known group."""
+    return shard == 0 or shard in shards()
+
+
+def get_pool(shard: int = 0) -> ConnectionPool:
+    """Return the connection pool of a shard, opening it on first use.
+    
+    Raises UnknownShard rather than creating a file for a shard outside shards().
+    """
+    pool = _pools.get(shard)
+    if pool is None:
+        if not is_known_shard(shard):
+            raise UnknownShard(f"No shard {shard}")
+        with _pool_lock:
+            pool = _pools.get(shard)
+            if pool is None:
+                path = shard_path(shard)
+                logger.info(f"Opening connection pool on {path} with {settings.DB_READ_CONNECTIONS} readers")
+                pool = _pools[shard] = ConnectionPool(path, settings.DB_READ_CONNECTIONS)
+    return pool
+
+
+def close_pool():
+    """Close every shard's connection pool; the next call to get_pool() reopens them."""
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def _allocate_ids(conn: sqlite3.Connection, table: str, shard: int, count: int = 1) -> int:
+    """Reserve `count` consecutive ids for table in this shard and return the first.
+    
+    Ids stay inside the shard's range and are never handed out twice, even after rows are deleted.
+    """
+    floor = max((conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0) + 1,
+                (shard << SHARD_ID_BITS) + 1)
+    return conn.execute("""
+        INSERT INTO id_sequences (name, next_id) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET next_id = max(next_id, excluded.next_id - ?) + ?
+        RETURNING next_id - ?
+    """, (table, floor + count, count, count, count)).fetchone()[0]
+
+
+# Assignees of one ask as a JSON array of [name, status] in assignment order
+_SUMMARY_ASSIGNEES = """
+    (SELECT json_group_array(json_array(assignee_name, status))
+     FROM (SELECT assignee_name, status FROM ask_assignees WHERE ask_id = {ask_id} ORDER BY id))
+"""
+
+# open_ask_summary holds one ready-to-render row per open ask; these triggers keep it
+# in step with asks and ask_assignees inside the writing transaction
+_SUMMARY_TRIGGERS = {
+    "trg_summary_ask_insert": """
+        AFTER INSERT ON asks WHEN NEW.status = 'open'
+        BEGIN
+            INSERT INTO open_ask_summary (ask_id, chat_id, created_at, text, requester_name, assignees_json)
+            VALUES (NEW.id, NEW.chat_id, NEW.created_at, NEW.text, NEW.requester_name,
+                    """ + _SUMMARY_ASSIGNEES.format(ask_id="NEW.id") + """);
+        END
+    """,
+    "trg_summary_ask_update": """
+        AFTER UPDATE OF status, chat_id, created_at, text, requester_name ON asks
+        WHEN OLD.status IS NOT NEW.status OR OLD.chat_id IS NOT NEW.chat_id OR OLD.created_at IS NOT NEW.created_at
+          OR OLD.text IS NOT NEW.text OR OLD.requester_name IS NOT NEW.requester_name
+        BEGIN
+            DELETE FROM open_ask_summary WHERE ask_id = OLD.id;
+            INSERT INTO open_ask_summary (ask_id, chat_id, created_at, text, requester_name, assignees_json)
+            SELECT NEW.id, NEW.chat_id, NEW.created_at, NEW.text, NEW.requester_name,
+                   """ + _SUMMARY_ASSIGNEES.format(ask_id="NEW.id") + """
+            WHERE NEW.status = 'open';
+        END
+    """,
+    "trg_summary_ask_delete": """
+        AFTER DELETE ON asks
+        BEGIN
+            DELETE FROM open_ask_summary WHERE ask_id = OLD.id;
+        END
+    """,
+    "trg_summary_assignee_insert": """
+        AFTER INSERT ON ask_assignees
+        BEGIN
+            UPDATE open_ask_summary SET assignees_json = """ + _SUMMARY_ASSIGNEES.format(ask_id="NEW.ask_id") + """
+            WHERE ask_id = NEW.ask_id;
+        END
+    """,
+    "trg_summary_assignee_update": """
+        AFTER UPDATE OF status, assignee_name ON ask_assignees
+        BEGIN
+            UPDATE open_ask_summary SET assignees_json = """ + _SUMMARY_ASSIGNEES.format(ask_id="NEW.ask_id") + """
+            WHERE ask_id = NEW.ask_id;
+        END
+    """,
+    "trg_summary_assignee_delete": """
+        AFTER DELETE ON ask_assignees
+        BEGIN
+            UPDATE open_ask_summary SET assignees_json = """ + _SUMMARY_ASSIGNEES.format(ask_id="OLD.ask_id") + """
+            WHERE ask_id = OLD.ask_id;
+        END
+    """,
+}
+
+
+class Migration(NamedTuple):
+    """One numbered schema change, applied to every shard (apply gets the shard to tell shard 0 apart).
+    
+    Offline migrations run at startup, all pending ones in a single transaction. A migration with
+    `batch` is online: it runs after startup, calling batch(conn, shard, cursor) in short transactions
+    until it returns None (the cursor is kept in migration_progress, so restarts resume), then apply()
+    finishes it. Migrations after a pending online one wait for it.
+    """
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection, int], None]
+    batch: Optional[Callable[[sqlite3.Connection, int, Optional[int]], Optional[int]]] = None
+
+
+def _baseline(conn: sqlite3.Connection, shard: int):
+    """Schema as of the first versioned release; safe on databases created before versioning."""
+    _init_shard(conn)
+    if shard == 0:
+        _init_directory(conn)
+
+
+def _add_reminders(conn: sqlite3.Connection, shard: int):
+    """Reminders live next to their ask; the partial index serves the scheduler's next-due window."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY,
+            ask_id INTEGER NOT NULL,
+            requester_id INTEGER NOT NULL,
+            fire_at TEXT NOT NULL,
+            status TEXT NOT NULL CHECK (status IN ('pending','sent','skipped')),
+            created_at TEXT NOT NULL,
+            fired_at TEXT,
+            FOREIGN KEY(ask_id) REFERENCES asks(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_pending ON reminders(fire_at) WHERE status = 'pending';")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_ask ON reminders(ask_id);")
+
+
+def _add_digest_opt_outs(conn: sqlite3.Connection, shard: int):
+    """Users who turned the daily digest off; a directory table, so only on shard 0."""
+    if shard != 0:
+        return
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS digest_opt_outs (
+            user_id INTEGER PRIMARY KEY,
+            opted_out_at TEXT NOT NULL
+        )
+    """)
+
+
+# Columns shared by the hot tables and their archives
+_ASK_COLUMNS = "id, chat_id, requester_id, requester_name, text, status, created_at, closed_at, open_assignees"
+_ASSIGNEE_COLUMNS = "id, ask_id, assignee_id, assignee_name, status, done_at"
+
+
+def _split_hot_and_cold(conn: sqlite3.Connection, shard: int):
+    """Archive tables for long-closed asks, and indexes that only cover the rows the bot still works on."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS asks_archive (
+            id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            requester_id INTEGER NOT NULL,
+            requester_name TEXT NOT NULL,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            closed_at TEXT,
+            open_assignees INTEGER NOT NULL DEFAULT 0,
+            archived_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ask_assignees_archive (
+            id INTEGER PRIMARY KEY,
+            ask_id INTEGER NOT NULL,
+            assignee_id INTEGER NOT NULL,
+            assignee_name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            done_at TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_asks_archive_chat_created ON asks_archive(chat_id, created_at);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_assign_archive_ask ON ask_assignees_archive(ask_id);")
+    
+    # Every hot-path query asks for open rows only; partial indexes keep them the size of the open set
+    conn.execute("DROP INDEX IF EXISTS idx_asks_chat_status_created;")
+    conn.execute("DROP INDEX IF EXISTS idx_assign_assignee_status;")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_asks_open_chat_created ON asks(chat_id, created_at) WHERE status = 'open';")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_assign_open_assignee ON ask_assignees(assignee_id) WHERE status = 'open';")
+    # Closed asks in the order they become due for archiving
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_asks_closed_at ON asks(closed_at) WHERE status = 'closed';")
+    
+    # _allocate_ids falls back to MAX(id) for tables without a sequence; pin one now so ids moved
+    # to the archive are never handed out again
+    floor = (shard << SHARD_ID_BITS) + 1
+    for table in ("asks", "ask_assignees"):
+        conn.execute(f"""
+            INSERT INTO id_sequences (name, next_id)
+            SELECT ?, max(COALESCE(MAX(id) + 1, 0), ?) FROM {table} WHERE true
+            ON CONFLICT(name) DO UPDATE SET next_id = max(next_id, excluded.next_id)
+        """, (table, floor))
+
+
+# asks_fts holds one document per ask id, hot or archived: its text, requester and assignee names.
+# Rows are never deleted, so archived asks stay searchable; chat_id is stored to filter by group
+_SEARCH_TRIGGERS = {
+    "trg_search_ask_insert": """
+        AFTER INSERT ON asks
+        BEGIN
+            INSERT INTO asks_fts (rowid, chat_id, text, requester_name, assignees)
+            VALUES (NEW.id, NEW.chat_id, NEW.text, NEW.requester_name, '');
+        END
+    """,
+    "trg_search_ask_update": """
+        AFTER UPDATE OF chat_id, text, requester_name ON asks
+        WHEN OLD.chat_id IS NOT NEW.chat_id OR OLD.text IS NOT NEW.text OR OLD.requester_name IS NOT NEW.requester_name
+        BEGIN
+            UPDATE asks_fts SET chat_id = NEW.chat_id, text = NEW.text, requester_name = NEW.requester_name
+            WHERE rowid = NEW.id;
+        END
+    """,
+    "trg_search_assignee_insert": """
+        AFTER INSERT ON ask_assignees
+        BEGIN
+            UPDATE asks_fts
+            SET assignees = CASE WHEN assignees = '' THEN NEW.assignee_name ELSE assignees || ', ' || NEW.assignee_name END
+            WHERE rowid = NEW.ask_id;
+        END
+    """,
+    "trg_search_assignee_rename": """
+        AFTER UPDATE OF assignee_name ON ask_assignees WHEN OLD.assignee_name IS NOT NEW.assignee_name
+        BEGIN
+            UPDATE asks_fts
+            SET assignees = (SELECT group_concat(assignee_name, ', ')
+                             FROM (SELECT assignee_name FROM ask_assignees WHERE ask_id = NEW.ask_id ORDER BY id))
+            WHERE rowid = NEW.ask_id;
+        END
+    """,
+}
+
+# Asks indexed per online batch when building the search index for existing history
+SEARCH_BACKFILL_BATCH = 2000
+
+
+def _add_search_index(conn: sqlite3.Connection, shard: int):
+    """Full-text index over asks; new and changed asks are indexed by triggers from here on."""
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS asks_fts USING fts5(
+            chat_id UNINDEXED, text, requester_name, assignees,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+    # ORDER BY rank: matches in the text count five times as much as matches in names
+    conn.execute("INSERT INTO asks_fts (asks_fts, rank) VALUES ('rank', 'bm25(0.0, 10.0, 2.0, 2.0)')")
+    for name, body in _SEARCH_TRIGGERS.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def _backfill_search_index(conn: sqlite3.Connection, shard: int, cursor: Optional[int]) -> Optional[int]:
+    """Index the next batch of asks created before the triggers, hot and archived, in id order."""
+    cursor = cursor or 0
+    last = conn.execute("""
+        SELECT max(id) FROM (
+            SELECT id FROM asks WHERE id > ?1 UNION ALL SELECT id FROM asks_archive WHERE id > ?1
+            ORDER BY id LIMIT ?2
+        )
+    """, (cursor, SEARCH_BACKFILL_BATCH)).fetchone()[0]
+    if last is None:
+        return None
+    for asks, assignees in (("asks", "ask_assignees"), ("asks_archive", "ask_assignees_archive")):
+        conn.execute(f"""
+            INSERT INTO asks_fts (rowid, chat_id, text, requester_name, assignees)
+            SELECT a.id, a.chat_id, a.text, a.requester_name,
+                   COALESCE((SELECT group_concat(assignee_name, ', ')
+                             FROM (SELECT assignee_name FROM {assignees} WHERE ask_id = a.id ORDER BY id)), '')
+            FROM {asks} a
+            WHERE a.id > ? AND a.id <= ? AND NOT EXISTS (SELECT 1 FROM asks_fts f WHERE f.rowid = a.id)
+        """, (cursor, last))
+    return last
+
+
+def _optimize_search_index(conn: sqlite3.Connection, shard: int):
+    """Merge the b-tree segments the backfill left behind into one."""
+    conn.execute("INSERT INTO asks_fts (asks_fts) VALUES ('optimize')")
+
+
+# Append new migrations with the next number; never edit or renumber one that has shipped
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline schema", _baseline),
+    Migration(2, "reminders", _add_reminders),
+    Migration(3, "digest opt-outs", _add_digest_opt_outs),
+    Migration(4, "archive tables and partial open-row indexes", _split_hot_and_cold),
+    Migration(5, "ask search index", _add_search_index),
+    Migration(6, "search index for existing asks", _optimize_search_index, _backfill_search_index),
+]
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+# Seconds spent per startup step in the last init_db(), e.g. {"shard 0 schema": 0.0004}
+startup_timings: Dict[str, float] = {}
+
+
+def schema_version(shard: int = 0) -> int:
+    """PRAGMA user_version of a shard: the last migration applied to it."""
+    with get_pool(shard).read() as conn:
+        return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def _migrate_offline(shard: int) -> int:
+    """Apply the shard's pending offline migrations in one transaction. Returns the version reached."""
+    version = schema_version(shard)
+    if version >= SCHEMA_VERSION:
+        return version
+    
+    pending = []
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        if migration.batch is not None:
+            break
+        pending.append(migration)
+    if not pending:
+        return version
+    
+    with get_pool(shard).write() as conn:
+        for migration in pending:
+            logger.info(f"Shard {shard}: applying migration {migration.version} ({migration.description})")
+            migration.apply(conn, shard)
+        conn.execute(f"PRAGMA user_version = {pending[-1].version};")
+    return pending[-1].version
+
+
+def run_online_migrations(should_stop: Callable[[], bool] = lambda: False) -> bool:
+    """Apply pending online migrations (and any after them) on every shard, batch by batch.
+    
+    Each batch is its own short write transaction, so the bot keeps writing in between.
+    Returns True when every shard is current, False if should_stop() ended the run early.
+    """
+    for shard in shards():
+        version = schema_version(shard)
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            if migration.batch is not None:
+                with get_pool(shard).write() as conn:
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS migration_progress (
+                            version INTEGER PRIMARY KEY,
+                            cursor INTEGER
+                        )
+                    """)
+                    row = conn.execute("SELECT cursor FROM migration_progress WHERE version = ?",
+                                       (migration.version,)).fetchone()
+                cursor = row[0] if row else None
+                batches = 0
+                while True:
+                    if should_stop():
+                        logger.info(f"Shard {shard}: migration {migration.version} paused after {batches} batches")
+                        return False
+                    with get_pool(shard).write() as conn:
+                        cursor = migration.batch(conn, shard, cursor)
+                        if cursor is None:
+                            break
+                        conn.execute("INSERT OR REPLACE INTO migration_progress (version, cursor) VALUES (?, ?)",
+                                     (migration.version, cursor))
+                    batches += 1
+            
+            with get_pool(shard).write() as conn:
+                logger.info(f"Shard {shard}: applying migration {migration.version} ({migration.description})")
+                migration.apply(conn, shard)
+                if migration.batch is not None:
+                    conn.execute("DELETE FROM migration_progress WHERE version = ?", (migration.version,))
+                conn.execute(f"PRAGMA user_version = {migration.version};")
+            version = migration.version
+    return True
+
+
+def pending_migrations() -> Dict[int, List[int]]:
+    """shard -> versions of migrations not yet applied there (empty lists when current)."""
+    pending = {}
+    for shard in shards():
+        version = schema_version(shard)
+        pending[shard] = [m.version for m in MIGRATIONS if m.version > version]
+    return pending
+
 
 def init_db():
-    """Initialize the database with tables and indexes."""
+    """Bring every shard's schema up to date; one PRAGMA read per shard when it already is.
+    
+    Online migrations are left for run_online_migrations(). Timings land in startup_timings.
+    """
     logger.info("Initializing database")
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA foreign_keys=ON;")
-        
-        # Users table
+    startup_timings.clear()
+    
+    def timed_step(name: str, step: Callable[[], object]):
+        started = time.perf_counter()
+        result = step()
+        startup_timings[name] = time.perf_counter() - started
+        metrics.STARTUP_SECONDS.set(startup_timings[name], name)
+        return result
+    
+    global _directory
+    _directory = None
+    timed_step("shard 0 open", get_pool)
+    timed_step("shard 0 schema", lambda: _migrate_offline(0))
+    timed_step("directory load", _load_directory)
+    
+    # Groups stay on the shard they were created on, even if DB_SHARDS is lowered later
+    for shard in shards():
+        if shard == 0:
+            continue
+        timed_step(f"shard {shard} open", lambda: get_pool(shard))
+        timed_step(f"shard {shard} schema", lambda: _migrate_offline(shard))
+    
+    total = sum(startup_timings.values())
+    logger.info(f"Database ready in {total * 1000:.1f} ms (schema version {SCHEMA_VERSION}): " +
+                ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in startup_timings.items()))
+
+
+def _init_directory(conn: sqlite3.Connection):
+    """Create the users and group directory tables on shard 0."""
+    # Users table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER UNIQUE NOT NULL,
+            display_name TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+    
+    # Groups (tenants): each family group chat and the shard holding its asks
+    has_groups = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'groups'").fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS groups (
+            chat_id INTEGER PRIMARY KEY,
+            title TEXT,
+            shard INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL
+        )
+    """)
+    
+    # Group rosters: who can be asked in which group
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS group_members (
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            joined_at TEXT NOT NULL,
+            PRIMARY KEY (chat_id, user_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members(user_id);")
+    
+    # Bot conversation state (see persistence.py): pickled user_data and ConversationHandler states
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS persisted_user_data (
+            user_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS persisted_conversations (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (name, key)
+        ) WITHOUT ROWID
+    """)
+    
+    if not has_groups:
+        # Existing single-group databases: every ask belongs to the one family the bot served, but was
+        # filed under the chat it was created from (the requester's DM without ALLOWED_CHAT_IDS), and
+        # the roster was every registered user. Move the asks into the default group and put everyone
+        # on its roster, so existing assignments stay in My Asks, All Open Asks and /remind
+        now = datetime.utcnow().isoformat()
         conn.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY,
-                user_id INTEGER UNIQUE NOT NULL,
-                display_name TEXT NOT NULL,
-                created_at TEXT NOT NULL
-            )
-        """)
-        
-        # Asks table
+            INSERT INTO groups (chat_id, title, shard, created_at) VALUES (?, ?, 0, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET title = COALESCE(excluded.title, groups.title)
+        """, (settings.DEFAULT_GROUP_ID, _default_group_title(), now))
+        conn.execute("UPDATE asks SET chat_id = ? WHERE chat_id != ?",
+                     (settings.DEFAULT_GROUP_ID, settings.DEFAULT_GROUP_ID))
         conn.execute("""
-            CREATE TABLE IF NOT EXISTS asks (
-                id INTEGER PRIMARY KEY,
-                chat_id INTEGER NOT NULL,
-                requester_id INTEGER NOT NULL,
-                requester_name TEXT NOT NULL,
-                text TEXT NOT NULL,
-                status TEXT NOT NULL CHECK (status IN ('open','closed')),
-                created_at TEXT NOT NULL,
-                closed_at TEXT
-            )
-        """)
-        
-        # Ask assignees table
+            INSERT OR IGNORE INTO group_members (chat_id, user_id, joined_at)
+            SELECT ?, user_id, created_at FROM users
+        """, (settings.DEFAULT_GROUP_ID,))
+
+
+def _init_shard(conn: sqlite3.Connection):
+    """Create the per-group data tables (asks, assignments, outbox, summary) on one shard."""
+    # Id allocation per table, see _allocate_ids
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS id_sequences (
+            name TEXT PRIMARY KEY,
+            next_id INTEGER NOT NULL
+        )
+    """)
+    
+    # Asks table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS asks (
+            id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            requester_id INTEGER NOT NULL,
+            requester_name TEXT NOT NULL,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL CHECK (status IN ('open','closed')),
+            created_at TEXT NOT NULL,
+            closed_at TEXT,
+            open_assignees INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    
+    # Databases created before the open-assignee counter: add it and backfill open asks
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(asks);")]
+    if 'open_assignees' not in columns:
+        logger.info("Adding asks.open_assignees counter")
+        conn.execute("ALTER TABLE asks ADD COLUMN open_assignees INTEGER NOT NULL DEFAULT 0;")
         conn.execute("""
-            CREATE TABLE IF NOT EXISTS ask_assignees (
-                id INTEGER PRIMARY KEY,
-                ask_id INTEGER NOT NULL,
-                assignee_id INTEGER NOT NULL,
-                assignee_name TEXT NOT NULL,
-                status TEXT NOT NULL CHECK (status IN ('open','done')),
-                done_at TEXT,
-                FOREIGN KEY(ask_id) REFERENCES asks(id) ON DELETE CASCADE
+            UPDATE asks SET open_assignees = (
+                SELECT COUNT(*) FROM ask_assignees aa WHERE aa.ask_id = asks.id AND aa.status = 'open'
             )
+            WHERE status = 'open'
         """)
-        
-        # Indexes
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_asks_chat_status ON asks(chat_id, status);")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_assign_assignee_status ON ask_assignees(assignee_id, status);")
-        
-        conn.commit()
+    
+    # Ask assignees table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ask_assignees (
+            id INTEGER PRIMARY KEY,
+            ask_id INTEGER NOT NULL,
+            assignee_id INTEGER NOT NULL,
+            assignee_name TEXT NOT NULL,
+            status TEXT NOT NULL CHECK (status IN ('open','done')),
+            done_at TEXT,
+            FOREIGN KEY(ask_id) REFERENCES asks(id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Outbox of notifications, written in the same transaction as the change they announce
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            ref_id INTEGER,
+            status TEXT NOT NULL CHECK (status IN ('pending','sent','failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TEXT NOT NULL,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            sent_at TEXT
+        )
+    """)
+    
+    # Indexes
+    # (chat_id, status, created_at) serves the open-asks list in order without a sort;
+    # it supersedes the old (chat_id, status) index
+    conn.execute("DROP INDEX IF EXISTS idx_asks_chat_status;")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_asks_chat_status_created ON asks(chat_id, status, created_at);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_assign_ask_status ON ask_assignees(ask_id, status);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_assign_assignee_status ON ask_assignees(assignee_id, status);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_asks_requester_created ON asks(requester_id, created_at);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status_next ON outbox(status, next_attempt_at);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_ref ON outbox(kind, ref_id);")
+
+    # Materialized open-asks view: the All Open Asks list is one range scan of this table
+    has_summary = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'open_ask_summary'"
+    ).fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS open_ask_summary (
+            ask_id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            text TEXT NOT NULL,
+            requester_name TEXT NOT NULL,
+            assignees_json TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_summary_chat_created ON open_ask_summary(chat_id, created_at);")
+    for name, body in _SUMMARY_TRIGGERS.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    if not has_summary:
+        logger.info(f"Built open-asks summary with {_fill_summary(conn)} rows")
+
+
+def _fill_summary(conn: sqlite3.Connection) -> int:
+    """Repopulate open_ask_summary from the base tables. Returns rows written."""
+    conn.execute("DELETE FROM open_ask_summary;")
+    return conn.execute("""
+        INSERT INTO open_ask_summary (ask_id, chat_id, created_at, text, requester_name, assignees_json)
+        SELECT a.id, a.chat_id, a.created_at, a.text, a.requester_name,""" + _SUMMARY_ASSIGNEES.format(ask_id="a.id") + """
+        FROM asks a WHERE a.status = 'open'
+    """).rowcount
+
+
+def rebuild_open_ask_summary() -> int:
+    """Throw away and recompute the open-asks summary on every shard. Returns rows written."""
+    rows = 0
+    for shard in shards():
+        with get_pool(shard).write() as conn:
+            rows += _fill_summary(conn)
+    return rows
+
+
+def verify_open_ask_summary() -> List[Tuple[str, int]]:
+    """Compare open_ask_summary against the base tables.
+
+    Returns (problem, ask_id) pairs where problem is 'missing', 'stale' or 'mismatch'; empty means in sync.
+    """
+    problems = []
+    for shard in shards():
+        with get_pool(shard).read() as conn:
+            problems += conn.execute("""
+                WITH expected AS (
+                    SELECT a.id as ask_id, a.chat_id, a.created_at, a.text, a.requester_name,""" + _SUMMARY_ASSIGNEES.format(ask_id="a.id") + """ as assignees_json
+                    FROM asks a WHERE a.status = 'open'
+                )
+                SELECT 'missing', e.ask_id FROM expected e
+                WHERE NOT EXISTS (SELECT 1 FROM open_ask_summary s WHERE s.ask_id = e.ask_id)
+                UNION ALL
+                SELECT 'stale', s.ask_id FROM open_ask_summary s
+                WHERE NOT EXISTS (SELECT 1 FROM expected e WHERE e.ask_id = s.ask_id)
+                UNION ALL
+                SELECT 'mismatch', e.ask_id FROM expected e JOIN open_ask_summary s ON s.ask_id = e.ask_id
+                WHERE s.chat_id IS NOT e.chat_id OR s.created_at IS NOT e.created_at OR s.text IS NOT e.text
+                   OR s.requester_name IS NOT e.requester_name OR s.assignees_json IS NOT e.assignees_json
+                ORDER BY 2
+            """).fetchall()
+    return problems
+
+
+class RosterCache:
+    """Process-wide copy of one group's roster: sorted roster, id -> name index and a version counter."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = 0
+        self._roster: Optional[Tuple[Tuple[int, str], ...]] = None
+        self._names: Dict[int, str] = {}
+
+    def snapshot(self) -> Optional[Tuple[Tuple[Tuple[int, str], ...], Dict[int, str]]]:
+        """Return (roster, names) if the cache is warm, otherwise None."""
+        with self._lock:
+            if self._roster is None:
+                return None
+            return self._roster, self._names
+
+    def fill(self, version: int, rows: List[Tuple[int, str]]):
+        """Store freshly loaded rows unless the roster changed while they were being read."""
+        with self._lock:
+            if version == self.version:
+                self._roster = tuple(rows)
+                self._names = dict(rows)
+
+    def invalidate(self):
+        with self._lock:
+            self._roster = None
+            self._names = {}
+            self.version += 1
+
+
+# chat_id -> that group's roster cache
+_rosters: Dict[int, RosterCache] = {}
+
+
+def roster_cache(chat_id: int) -> RosterCache:
+    return _rosters.get(chat_id) or _rosters.setdefault(chat_id, RosterCache())
+
+
+def invalidate_rosters(chat_ids: Optional[Iterable[int]] = None):
+    """Drop cached rosters of the given groups, or of every group (e.g. after a rename)."""
+    for chat_id in (list(_rosters) if chat_ids is None else chat_ids):
+        roster_cache(chat_id).invalidate()
+
+
+class VersionCounters:
+    """Per-key change counters; callers cache derived data under the version they read first."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[int, int] = {}
+
+    def get(self, key: int) -> int:
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def bump(self, keys: Iterable[int]):
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+
+# assignee_id -> version of their open assignments, bumped after each write that changes them commits
+assignment_versions = VersionCounters()
+
+
+class OpenAsk(NamedTuple):
+    """An open ask as held by the in-memory index."""
+    ask_id: int
+    chat_id: int
+    requester_id: int
+    requester_name: str
+    text: str
+    created_at: str
+
+
+def _fold_words(text: str) -> List[str]:
+    """Words of text casefolded and without accents, matching how asks_fts tokenizes."""
+    text = text.casefold()
+    if not text.isascii():
+        text = "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+    return re.findall(r"\w+", text)
+
+
+def _index_words(ask: OpenAsk) -> Tuple[str, ...]:
+    return tuple(set(_fold_words(f"{ask.text} {ask.requester_name}")))
+
+
+class _UserAsks:
+    """One user's open asks with a sorted (word, ask_id) list for bisect prefix lookups."""
+
+    def __init__(self):
+        # ask_id -> the user's open assignment on it, or None when they only asked it
+        self.assignments: Dict[int, Optional[int]] = {}
+        self.words: List[Tuple[str, int]] = []
+
+    def add(self, ask_id: int, words: Tuple[str, ...], assignment_id: Optional[int], keep_sorted: bool = True):
+        """Hold an ask; with keep_sorted=False words are appended and the caller sorts them afterwards."""
+        if ask_id not in self.assignments:
+            if keep_sorted:
+                for word in words:
+                    insort(self.words, (word, ask_id))
+            else:
+                self.words.extend((word, ask_id) for word in words)
+        self.assignments[ask_id] = assignment_id
+
+    def remove(self, ask_id: int, words: Tuple[str, ...]):
+        if self.assignments.pop(ask_id, False) is False:
+            return
+        for word in words:
+            i = bisect_left(self.words, (word, ask_id))
+            if i < len(self.words) and self.words[i] == (word, ask_id):
+                del self.words[i]
+
+    def match(self, query: str) -> Iterable[int]:
+        """Ids of asks with a word starting with each word of query; every ask for an empty query."""
+        matches = None
+        for prefix in _fold_words(query):
+            hits = set()
+            i = bisect_left(self.words, (prefix,))
+            while i < len(self.words) and self.words[i][0].startswith(prefix):
+                hits.add(self.words[i][1])
+                i += 1
+            matches = hits if matches is None else matches & hits
+            if not matches:
+                break
+        return self.assignments if matches is None else matches
+
+
+class OpenAskIndex:
+    """Process-wide index of every open ask by the users who can act on it, for inline queries.
+
+    Each ask is held by its requester (to share it) and by its assignees with an open assignment
+    (to share it or mark it done). Writes update it after they commit; changes made while load()
+    is reading SQLite are replayed on top of what it read, so none are lost.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # ask_id -> (ask, its folded words)
+        self._asks: Dict[int, Tuple[OpenAsk, Tuple[str, ...]]] = {}
+        self._holders: Dict[int, Set[int]] = {}
+        self._users: Dict[int, _UserAsks] = {}
+        # Changes made while a load is reading, replayed once it is done
+        self._replay: Optional[List[Tuple[Callable, tuple]]] = None
+
+    def __len__(self) -> int:
+        return len(self._asks)
+
+    def _apply(self, change: Callable, *args):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((change, args))
+            change(*args)
+
+    def add(self, ask: OpenAsk, assignments: Iterable[Tuple[int, int]]):
+        """Index a new open ask with its (assignee_id, assignment_id) pairs."""
+        self._apply(self._add, ask, tuple(assignments))
+
+    def complete(self, ask_id: int, assignee_id: int, closed: bool):
+        """Drop an assignment that was marked done, and the whole ask once it closed."""
+        self._apply(self._complete, ask_id, assignee_id, closed)
+
+    def _user(self, user_id: int) -> _UserAsks:
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _UserAsks()
+        return user
+
+    def _add(self, ask: OpenAsk, assignments: Tuple[Tuple[int, int], ...], keep_sorted: bool = True):
+        if ask.ask_id in self._asks:
+            words = self._asks[ask.ask_id][1]
+        else:
+            words = _index_words(ask)
+            self._asks[ask.ask_id] = (ask, words)
+        holders = self._holders.setdefault(ask.ask_id, set())
+        if ask.requester_id not in holders:
+            self._user(ask.requester_id).add(ask.ask_id, words, None, keep_sorted)
+            holders.add(ask.requester_id)
+        for user_id, assignment_id in assignments:
+            self._user(user_id).add(ask.ask_id, words, assignment_id, keep_sorted)
+            holders.add(user_id)
+
+    def _complete(self, ask_id: int, assignee_id: int, closed: bool):
+        if ask_id not in self._asks:
+            return
+        ask, words = self._asks[ask_id]
+        for user_id in (list(self._holders[ask_id]) if closed else [assignee_id]):
+            user = self._users.get(user_id)
+            if user is None:
+                continue
+            if user_id == ask.requester_id and not closed:
+                # Requesters who assigned themselves keep their own ask to share
+                user.add(ask_id, words, None)
+                continue
+            user.remove(ask_id, words)
+            self._holders[ask_id].discard(user_id)
+            if not user.assignments:
+                del self._users[user_id]
+        if closed:
+            del self._asks[ask_id]
+            del self._holders[ask_id]
+
+    def load(self, read: Callable[[], Iterable[Tuple[OpenAsk, List[Tuple[int, int]]]]]):
+        """Rebuild the index from read(), which yields every open ask with its open assignments."""
+        with self._lock:
+            self._replay = []
+        try:
+            loaded = list(read())
+        except BaseException:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            replay, self._replay = self._replay, None
+            self._asks, self._holders, self._users = {}, {}, {}
+            for ask, assignments in loaded:
+                self._add(ask, tuple(assignments), keep_sorted=False)
+            for user in self._users.values():
+                user.words.sort()
+            for change, args in replay:
+                change(*args)
+
+    def search(self, user_id: int, query: str, limit: int,
+               offset: int = 0) -> Tuple[List[Tuple[OpenAsk, Optional[int]]], bool]:
+        """A user's open asks matching query as word prefixes, newest first. Returns ([(ask, assignment_id)], more)."""
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                return [], False
+            found = sorted(((self._asks[ask_id][0], user.assignments[ask_id]) for ask_id in user.match(query)),
+                           key=lambda item: (item[0].created_at, item[0].ask_id), reverse=True)
+        return found[offset:offset + limit], len(found) > offset + limit
+
+
+open_ask_index = OpenAskIndex()
+
 
+# Directory memo loaded from shard 0 on first use: chat_id -> (title, shard) and user_id -> group chat ids
+_directory: Optional[Tuple[Dict[int, Tuple[Optional[str], int]], Dict[int, Set[int]]]] = None
+_directory_lock = threading.Lock()
 
-def register_user(user_id: int, display_name: str) -> None:
-    """Register or update a user in the database."""
+
+def _load_directory() -> Tuple[Dict[int, Tuple[Optional[str], int]], Dict[int, Set[int]]]:
+    global _directory
+    with _directory_lock:
+        if _directory is None:
+            with get_pool().read() as conn:
+                groups = {chat_id: (title, shard)
+                          for chat_id, title, shard in conn.execute("SELECT chat_id, title, shard FROM groups")}
+                members: Dict[int, Set[int]] = {}
+                for chat_id, user_id in conn.execute("SELECT chat_id, user_id FROM group_members"):
+                    members.setdefault(user_id, set()).add(chat_id)
+            _directory = (groups, members)
+        return _directory
+
+
+def shard_for_chat(chat_id: int) -> int:
+    """Shard holding a group's asks: where it was created, or where it would be created."""
+    group = _load_directory()[0].get(chat_id)
+    return group[1] if group else abs(chat_id) % settings.DB_SHARDS
+
+
+def shards() -> List[int]:
+    """Every shard that may hold data."""
+    groups = _load_directory()[0]
+    return sorted(set(range(settings.DB_SHARDS)) | {shard for _, shard in groups.values()})
+
+
+def _default_group_title() -> Optional[str]:
+    """Title of the synthetic everyone group; a real default group keeps its chat's title."""
+    return GLOBAL_GROUP_TITLE if settings.DEFAULT_GROUP_ID == GLOBAL_GROUP_ID else None
+
+
+class _DirectoryChanges:
+    """Directory rows written in an open shard-0 transaction, applied to the memo once it commits."""
+    
+    def __init__(self):
+        self.groups: Dict[int, Tuple[Optional[str], int]] = {}
+        self.members: List[Tuple[int, int]] = []
+    
+    def apply(self):
+        groups, members = _load_directory()
+        with _directory_lock:
+            groups.update(self.groups)
+            for chat_id, user_id in self.members:
+                members.setdefault(user_id, set()).add(chat_id)
+
+
+def _ensure_group(conn: sqlite3.Connection, changes: _DirectoryChanges, chat_id: int, title: Optional[str],
+                  now: str):
+    """Record a group (and pin its shard) in the caller's shard-0 transaction; refreshes a changed title."""
+    known = changes.groups.get(chat_id) or _load_directory()[0].get(chat_id)
+    if known is not None and (title is None or known[0] == title):
+        return
+    shard = known[1] if known else shard_for_chat(chat_id)
+    conn.execute("""
+        INSERT INTO groups (chat_id, title, shard, created_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(chat_id) DO UPDATE SET title = excluded.title
+    """, (chat_id, title, shard, now))
+    changes.groups[chat_id] = (title if title is not None else (known[0] if known else None), shard)
+
+
+def _add_member(conn: sqlite3.Connection, changes: _DirectoryChanges, chat_id: int, user_id: int,
+                now: str) -> bool:
+    """Put a user on a group's roster in the caller's shard-0 transaction. Returns True if they were new."""
+    if chat_id in _load_directory()[1].get(user_id, ()) or (chat_id, user_id) in changes.members:
+        return False
+    conn.execute("INSERT OR IGNORE INTO group_members (chat_id, user_id, joined_at) VALUES (?, ?, ?)",
+                 (chat_id, user_id, now))
+    changes.members.append((chat_id, user_id))
+    return True
+
+
+def is_member(chat_id: int, user_id: int, title: Optional[str] = None) -> bool:
+    """True if the user is already on this group's roster (and the group title is current)."""
+    groups, members = _load_directory()
+    group = groups.get(chat_id)
+    return (chat_id in members.get(user_id, ()) and group is not None
+            and (title is None or group[0] == title))
+
+
+def is_known_group(chat_id: int) -> bool:
+    """True if the group is in the directory, so its shard is pinned."""
+    return chat_id in _load_directory()[0]
+
+
+def register_group(chat_id: int) -> bool:
+    """Record a group in the shard-0 directory, pinning its shard, if it is new. Returns True if it was."""
+    if is_known_group(chat_id):
+        return False
+    changes = _DirectoryChanges()
+    with get_pool().write() as conn:
+        _ensure_group(conn, changes, chat_id, None, datetime.utcnow().isoformat())
+    changes.apply()
+    return True
+
+
+def join_group(chat_id: int, title: Optional[str], user_id: int, display_name: str) -> bool:
+    """Register a user and add them to a group's roster. Returns True if the roster changed."""
+    register_user(user_id, display_name)
+    if is_member(chat_id, user_id, title):
+        return False
     now = datetime.utcnow().isoformat()
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
-            INSERT OR REPLACE INTO users (user_id, display_name, created_at)
-            VALUES (?, ?, COALESCE((SELECT created_at FROM users WHERE user_id = ?), ?))
-        """, (user_id, display_name, user_id, now))
-        conn.commit()
+    changes = _DirectoryChanges()
+    with get_pool().write() as conn:
+        _ensure_group(conn, changes, chat_id, title, now)
+        joined = _add_member(conn, changes, chat_id, user_id, now)
+    changes.apply()
+    if joined:
+        invalidate_rosters([chat_id])
+        logger.info(f"User {user_id} joined the roster of group {chat_id}")
+    return joined
+
+
+def leave_group(chat_id: int, user_id: int) -> bool:
+    """Take a user off a group's roster. Returns True if they were on it."""
+    with get_pool().write() as conn:
+        left = conn.execute("DELETE FROM group_members WHERE chat_id = ? AND user_id = ?",
+                            (chat_id, user_id)).rowcount
+    members = _load_directory()[1]
+    with _directory_lock:
+        members.get(user_id, set()).discard(chat_id)
+    if left:
+        invalidate_rosters([chat_id])
+        logger.info(f"User {user_id} left the roster of group {chat_id}")
+    return bool(left)
+
+
+def get_groups() -> List[Tuple[int, Optional[str]]]:
+    """(chat_id, title) of every known group."""
+    groups = _load_directory()[0]
+    return sorted((chat_id, title) for chat_id, (title, _) in groups.items())
+
+
+def get_user_groups(user_id: int) -> List[Tuple[int, Optional[str]]]:
+    """(chat_id, title) of every group the user is on the roster of, by title."""
+    groups, members = _load_directory()
+    return sorted(((chat_id, groups.get(chat_id, (None, 0))[0]) for chat_id in members.get(user_id, ())),
+                  key=lambda group: (group[1] or "", group[0]))
 
 
-def get_roster() -> List[Tuple[int, str]]:
-    """Get all registered users ordered by display name."""
-    with sqlite3.connect(DB_PATH) as conn:
+# user_id -> display_name as last written to SQLite, so repeat registrations skip the write
+_known_users: Optional[Dict[int, str]] = None
+# Registrations waiting for the next flush when REGISTER_FLUSH_SECONDS > 0
+_pending_users: Dict[int, str] = {}
+_users_lock = threading.Lock()
+
+
+def _upsert_users(conn: sqlite3.Connection, changes: _DirectoryChanges, users: List[Tuple[int, str]]) -> int:
+    """Insert new users or rename existing ones; unchanged rows are not touched. Returns rows changed.
+    
+    New users join the default group's roster.
+    """
+    now = datetime.utcnow().isoformat()
+    changed = 0
+    for user_id, display_name in users:
         cursor = conn.execute("""
-            SELECT user_id, display_name 
-            FROM users 
-            ORDER BY display_name
-        """)
-        return cursor.fetchall()
+            INSERT INTO users (user_id, display_name, created_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET display_name = excluded.display_name
+            WHERE users.display_name != excluded.display_name
+        """, (user_id, display_name, now))
+        changed += cursor.rowcount
+        if cursor.rowcount:
+            _ensure_group(conn, changes, settings.DEFAULT_GROUP_ID, _default_group_title(), now)
+            _add_member(conn, changes, settings.DEFAULT_GROUP_ID, user_id, now)
+    return changed
+
+
+def is_registered(user_id: int, display_name: str) -> bool:
+    """True if this user is already stored (or queued) under this exact name."""
+    with _users_lock:
+        if user_id in _pending_users:
+            return _pending_users[user_id] == display_name
+        return _known_users is not None and _known_users.get(user_id) == display_name
+
+
+def register_user(user_id: int, display_name: str) -> bool:
+    """Register or update a user in the database. Returns True if a row was written."""
+    global _known_users
+    with _users_lock:
+        if _known_users is None:
+            with get_pool().read() as conn:
+                _known_users = dict(conn.execute("SELECT user_id, display_name FROM users").fetchall())
+        if _known_users.get(user_id) == display_name:
+            _pending_users.pop(user_id, None)
+            return False
+        if settings.REGISTER_FLUSH_SECONDS > 0:
+            _pending_users[user_id] = display_name
+            return False
+        changes = _DirectoryChanges()
+        with get_pool().write() as conn:
+            changed = _upsert_users(conn, changes, [(user_id, display_name)])
+        changes.apply()
+        _known_users[user_id] = display_name
+    if changed:
+        invalidate_rosters()
+    return bool(changed)
+
+
+def flush_registrations() -> int:
+    """Write all queued registrations in one transaction. Returns rows changed."""
+    with _users_lock:
+        if not _pending_users:
+            return 0
+        users = list(_pending_users.items())
+        changes = _DirectoryChanges()
+        with get_pool().write() as conn:
+            changed = _upsert_users(conn, changes, users)
+        changes.apply()
+        _known_users.update(users)
+        _pending_users.clear()
+    if changed:
+        invalidate_rosters()
+        logger.info(f"Flushed {len(users)} queued registrations ({changed} changed)")
+    return changed
+
+
+def _load_roster(chat_id: int):
+    """Read a group's roster from SQLite into its cache and return the (roster, names) snapshot."""
+    cache = roster_cache(chat_id)
+    version = cache.version
+    with get_pool().read() as conn:
+        cursor = conn.execute("""
+            SELECT u.user_id, u.display_name
+            FROM group_members m
+            JOIN users u ON u.user_id = m.user_id
+            WHERE m.chat_id = ?
+            ORDER BY u.display_name
+        """, (chat_id,))
+        rows = cursor.fetchall()
+    cache.fill(version, rows)
+    return tuple(rows), dict(rows)
+
+
+def get_roster(chat_id: int) -> Tuple[Tuple[int, str], ...]:
+    """Get a group's members ordered by display name (served from the roster cache)."""
+    snapshot = roster_cache(chat_id).snapshot() or _load_roster(chat_id)
+    return snapshot[0]
+
+
+def get_roster_names(chat_id: int) -> Dict[int, str]:
+    """Get a user_id -> display_name index of a group's roster for O(1) lookups. Do not mutate."""
+    snapshot = roster_cache(chat_id).snapshot() or _load_roster(chat_id)
+    return snapshot[1]
+
+
+def load_persisted_user_data() -> List[Tuple[int, bytes]]:
+    """Every stored (user_id, pickled user_data) pair."""
+    with get_pool().read() as conn:
+        return conn.execute("SELECT user_id, data FROM persisted_user_data").fetchall()
+
+
+def load_persisted_conversations(name: str) -> List[Tuple[str, str]]:
+    """Stored (key JSON, state JSON) pairs of one ConversationHandler."""
+    with get_pool().read() as conn:
+        return conn.execute("SELECT key, state FROM persisted_conversations WHERE name = ?", (name,)).fetchall()
+
+
+def save_persisted_state(user_data: List[Tuple[int, Optional[bytes]]],
+                         conversations: List[Tuple[str, str, Optional[str]]]) -> None:
+    """Write changed user_data and conversation states in one transaction; None deletes the row."""
+    now = datetime.utcnow().isoformat()
+    with get_pool().write() as conn:
+        conn.executemany("""
+            INSERT INTO persisted_user_data (user_id, data, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+        """, [(user_id, data, now) for user_id, data in user_data if data is not None])
+        conn.executemany("DELETE FROM persisted_user_data WHERE user_id = ?",
+                         [(user_id,) for user_id, data in user_data if data is None])
+        conn.executemany("""
+            INSERT INTO persisted_conversations (name, key, state, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(name, key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+        """, [(name, key, state, now) for name, key, state in conversations if state is not None])
+        conn.executemany("DELETE FROM persisted_conversations WHERE name = ? AND key = ?",
+                         [(name, key) for name, key, state in conversations if state is None])
+
+
+ASK_NOTIFICATION = "{requester_name} asked you: {text}"
+DONE_NOTIFICATION = "{assignee_name} marked done: {text}{suffix}"
+
+
+def _enqueue(conn: sqlite3.Connection, chat_id: int, text: str, kind: str, ref_id: int, now: str):
+    """Queue a notification in the outbox of ref_id's shard as part of the caller's transaction."""
+    outbox_id = _allocate_ids(conn, "outbox", shard_of_id(ref_id))
+    conn.execute("""
+        INSERT INTO outbox (id, chat_id, text, kind, ref_id, status, next_attempt_at, created_at)
+        VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)
+    """, (outbox_id, chat_id, text, kind, ref_id, now, now))
 
 
 def create_ask(chat_id: int, requester_id: int, requester_name: str, text: str, 
-               assignees: List[Tuple[int, str]]) -> int:
-    """Create a new ask with assignees. Returns ask_id."""
+               assignees: List[Tuple[int, str]], notify: bool = False) -> int:
+    """Create a new ask with assignees in its group's shard. Returns ask_id.
+    
+    With notify=True an outbox row per assignee is queued in the same transaction.
+    """
     now = datetime.utcnow().isoformat()
+    register_group(chat_id)
+    shard = shard_for_chat(chat_id)
     
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_pool(shard).write() as conn:
         # Create the ask
-        cursor = conn.execute("""
-            INSERT INTO asks (chat_id, requester_id, requester_name, text, status, created_at)
-            VALUES (?, ?, ?, ?, 'open', ?)
-        """, (chat_id, requester_id, requester_name, text, now))
-        
-        ask_id = cursor.lastrowid
+        ask_id = _allocate_ids(conn, "asks", shard)
+        conn.execute("""
+            INSERT INTO asks (id, chat_id, requester_id, requester_name, text, status, created_at, open_assignees)
+            VALUES (?, ?, ?, ?, ?, 'open', ?, ?)
+        """, (ask_id, chat_id, requester_id, requester_name, text, now, len(assignees)))
         
         # Create assignees
-        for user_id, display_name in assignees:
-            conn.execute("""
-                INSERT INTO ask_assignees (ask_id, assignee_id, assignee_name, status)
-                VALUES (?, ?, ?, 'open')
-            """, (ask_id, user_id, display_name))
+        first_id = _allocate_ids(conn, "ask_assignees", shard, len(assignees)) if assignees else 0
+        conn.executemany("""
+            INSERT INTO ask_assignees (id, ask_id, assignee_id, assignee_name, status)
+            VALUES (?, ?, ?, ?, 'open')
+        """, [(first_id + i, ask_id, user_id, display_name)
+              for i, (user_id, display_name) in enumerate(assignees)])
         
-        conn.commit()
+        if notify:
+            notification = ASK_NOTIFICATION.format(requester_name=requester_name, text=text)
+            for user_id, _ in assignees:
+                _enqueue(conn, user_id, notification, 'ask', ask_id, now)
         logger.info(f"Created ask {ask_id} with {len(assignees)} assignees")
-        return ask_id
+    
+    assignment_versions.bump(user_id for user_id, _ in assignees)
+    open_ask_index.add(OpenAsk(ask_id, chat_id, requester_id, requester_name, text, now),
+                       [(user_id, first_id + i) for i, (user_id, _) in enumerate(assignees)])
+    return ask_id
 
 
-def list_my_open_assignments(user_id: int) -> List[Dict]:
-    """List all open assignments for a user."""
-    with sqlite3.connect(DB_PATH) as conn:
+def get_frequent_assignees(chat_id: int, requester_id: int, recent_asks: int = 200) -> List[int]:
+    """User ids this requester assigned in their latest asks in a group, most often first, then most recently."""
+    with get_pool(shard_for_chat(chat_id)).read() as conn:
         cursor = conn.execute("""
-            SELECT aa.id as assignment_id, a.id as ask_id, a.text, a.requester_name
+            WITH recent AS (
+                SELECT id FROM asks WHERE requester_id = ? AND chat_id = ? ORDER BY created_at DESC LIMIT ?
+            )
+            SELECT aa.assignee_id
+            FROM recent r
+            JOIN ask_assignees aa ON aa.ask_id = r.id
+            GROUP BY aa.assignee_id
+            ORDER BY COUNT(*) DESC, MAX(aa.ask_id) DESC
+        """, (requester_id, chat_id, recent_asks))
+        return [row[0] for row in cursor]
+
+
+def list_my_open_assignments(user_id: int) -> List[Dict]:
+    """List all open assignments for a user across every group, newest first."""
+    found = []
+    for shard in shards():
+        with get_pool(shard).read() as conn:
+            cursor = conn.execute("""
+                SELECT aa.id as assignment_id, a.id as ask_id, a.chat_id, a.text, a.requester_name,
+                       a.created_at
+                FROM ask_assignees aa 
+                JOIN asks a ON a.id = aa.ask_id
+                WHERE aa.assignee_id = ? AND aa.status = 'open' AND a.status = 'open'
+            """, (user_id,))
+            
+            columns = [desc[0] for desc in cursor.description]
+            found.extend(dict(zip(columns, row)) for row in cursor.fetchall())
+    
+    found.sort(key=lambda item: (item['created_at'], item['ask_id']), reverse=True)
+    for item in found:
+        del item['created_at']
+    return found
+
+
+class Page(NamedTuple):
+    """One keyset page of a newest-first list of asks.
+    
+    Cursors are ask ids: pass prev_cursor as `after` for the newer page and
+    next_cursor as `before` for the older one. None means there is no such page.
+    """
+    items: List[Dict]
+    prev_cursor: Optional[int]
+    next_cursor: Optional[int]
+
+
+def _keyset_page(conn: sqlite3.Connection, sql: str, params: tuple, limit: int,
+                 before: Optional[int], after: Optional[int], key: str = "a.created_at, a.id") -> Page:
+    """Run a query over asks `a` keyed on (a.created_at, a.id), newest first.
+    
+    sql must contain `{cursor}` in its WHERE clause and end with
+    `ORDER BY a.created_at {order}, a.id {order}`; one extra row is fetched to detect more pages.
+    `key` names the (created_at, ask id) columns when `a` is not the asks table itself.
+    """
+    if after is not None:
+        cursor_sql = f"AND ({key}) > (SELECT created_at, id FROM asks WHERE id = ?)"
+        order, cursor_params = "ASC", (after,)
+    elif before is not None:
+        cursor_sql = f"AND ({key}) < (SELECT created_at, id FROM asks WHERE id = ?)"
+        order, cursor_params = "DESC", (before,)
+    else:
+        cursor_sql, order, cursor_params = "", "DESC", ()
+    
+    cursor = conn.execute(sql.format(cursor=cursor_sql, order=order) + " LIMIT ?",
+                          params + cursor_params + (limit + 1,))
+    columns = [desc[0] for desc in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor]
+    more = len(rows) > limit
+    rows = rows[:limit]
+    
+    if after is not None:
+        rows.reverse()
+        has_newer, has_older = more, True
+    else:
+        has_newer, has_older = before is not None, more
+    
+    if not rows:
+        return Page([], None, None)
+    return Page(
+        rows,
+        rows[0]['ask_id'] if has_newer else None,
+        rows[-1]['ask_id'] if has_older else None,
+    )
+
+
+def page_my_open_assignments(chat_id: int, user_id: int, limit: int, before: Optional[int] = None,
+                             after: Optional[int] = None) -> Page:
+    """One page of a user's open assignments in a group, newest first (items as in list_my_open_assignments)."""
+    # Unary + keeps the planner on the user's few open assignments instead of walking every open
+    # ask of the group in order through idx_asks_open_chat_created to avoid the small sort
+    with get_pool(shard_for_chat(chat_id)).read() as conn:
+        return _keyset_page(conn, """
+            SELECT aa.id as assignment_id, a.id as ask_id, a.chat_id, a.text, a.requester_name
             FROM ask_assignees aa 
             JOIN asks a ON a.id = aa.ask_id
-            WHERE aa.assignee_id = ? AND aa.status = 'open' AND a.status = 'open'
-            ORDER BY a.created_at DESC
-        """, (user_id,))
-        
-        columns = [desc[0] for desc in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            WHERE aa.assignee_id = ? AND aa.status = 'open' AND a.status = 'open' AND +a.chat_id = ? {cursor}
+            ORDER BY a.created_at {order}, a.id {order}
+        """, (user_id, chat_id), limit, before, after)
 
 
-def mark_assignment_done(assignment_id: int, assignee_id: int, when_utc: str) -> Tuple[int, int, str, str]:
-    """Mark an assignment as done. Returns (ask_id, requester_id, requester_name, text) for notification."""
-    with sqlite3.connect(DB_PATH) as conn:
-        # Mark assignment done
-        conn.execute("""
+def complete_assignment(assignment_id: int, assignee_id: int, when_utc: str,
+                        notify_name: Optional[str] = None) -> Tuple[int, int, str, str, bool]:
+    """Mark an assignment done and close its ask if it was the last open one, in one transaction.
+    
+    Returns (ask_id, requester_id, requester_name, text, closed). Repeating the call for an
+    assignment that is already done changes nothing and reports the ask's current state; another
+    user's assignment raises ValueError like a missing one.
+    With notify_name set, the requester's notification is queued in the outbox in the same transaction.
+    """
+    try:
+        pool = get_pool(shard_of_id(assignment_id))
+    except UnknownShard:
+        raise ValueError(f"Assignment {assignment_id} not found") from None
+    with pool.write() as conn:
+        # Mark assignment done; only the owner can complete it, and only once
+        done = conn.execute("""
             UPDATE ask_assignees 
             SET status = 'done', done_at = ?
-            WHERE id = ? AND assignee_id = ?
-        """, (when_utc, assignment_id, assignee_id))
+            WHERE id = ? AND assignee_id = ? AND status = 'open'
+            RETURNING ask_id
+        """, (when_utc, assignment_id, assignee_id)).fetchall()
         
-        # Get ask info for notification
-        cursor = conn.execute("""
-            SELECT a.id, a.requester_id, a.requester_name, a.text
-            FROM asks a 
-            JOIN ask_assignees aa ON a.id = aa.ask_id
-            WHERE aa.id = ?
-        """, (assignment_id,))
+        if not done:
+            cursor = conn.execute("""
+                SELECT a.id, a.requester_id, a.requester_name, a.text, a.status = 'closed'
+                FROM asks a 
+                JOIN ask_assignees aa ON a.id = aa.ask_id
+                WHERE aa.id = ? AND aa.assignee_id = ?
+            """, (assignment_id, assignee_id))
+            result = cursor.fetchone()
+            if not result:
+                raise ValueError(f"Assignment {assignment_id} not found")
+            return result[:4] + (bool(result[4]),)
+        
+        # Decrement the open counter and close the ask when it reaches zero (SET sees the old values)
+        ask_id, requester_id, requester_name, text, closed = conn.execute("""
+            UPDATE asks 
+            SET open_assignees = open_assignees - 1,
+                status = CASE WHEN open_assignees <= 1 THEN 'closed' ELSE status END,
+                closed_at = CASE WHEN open_assignees <= 1 THEN ? ELSE closed_at END
+            WHERE id = ?
+            RETURNING id, requester_id, requester_name, text, status = 'closed'
+        """, (when_utc, done[0][0])).fetchall()[0]
+        closed = bool(closed)
         
-        result = cursor.fetchone()
-        if not result:
-            raise ValueError(f"Assignment {assignment_id} not found")
+        if notify_name:
+            suffix = " (Ask completed!)" if closed else ""
+            notification = DONE_NOTIFICATION.format(assignee_name=notify_name, text=text, suffix=suffix)
+            _enqueue(conn, requester_id, notification, 'done', ask_id, when_utc)
         
-        conn.commit()
         logger.info(f"Marked assignment {assignment_id} as done")
-        return result
+        if closed:
+            logger.info(f"Closed ask {ask_id} - all assignments complete")
+    
+    assignment_versions.bump([assignee_id])
+    open_ask_index.complete(ask_id, assignee_id, closed)
+    return ask_id, requester_id, requester_name, text, closed
+
+
+REMINDER_NOTIFICATION = "⏰ Reminder from {requester_name}: {text}"
 
 
-def maybe_close_ask(ask_id: int, when_utc: str) -> bool:
-    """Close ask if all assignments are done. Returns True if closed."""
-    with sqlite3.connect(DB_PATH) as conn:
-        # Check if any assignments are still open
+def get_requester_open_asks(chat_id: int, requester_id: int, limit: int) -> List[Dict]:
+    """A requester's newest open asks in a group as {ask_id, text, open_assignees}."""
+    with get_pool(shard_for_chat(chat_id)).read() as conn:
         cursor = conn.execute("""
-            SELECT COUNT(*) FROM ask_assignees 
-            WHERE ask_id = ? AND status = 'open'
-        """, (ask_id,))
-        
-        open_count = cursor.fetchone()[0]
-        
-        if open_count == 0:
-            # All done, close the ask
-            conn.execute("""
-                UPDATE asks 
-                SET status = 'closed', closed_at = ?
-                WHERE id = ?
-            """, (when_utc, ask_id))
-            conn.commit()
-            logger.info(f"Closed ask {ask_id} - all assignments complete")
-            return True
+            SELECT id as ask_id, text, open_assignees
+            FROM asks
+            WHERE requester_id = ? AND chat_id = ? AND status = 'open'
+            ORDER BY created_at DESC
+            LIMIT ?
+        """, (requester_id, chat_id, limit))
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+
+def create_reminder(ask_id: int, requester_id: int, fire_at_utc: str) -> Tuple[int, str, int]:
+    """Schedule a reminder to an ask's open assignees. Returns (reminder_id, ask text, open assignees).
+    
+    Raises ValueError unless the ask exists, is still open and was created by requester_id.
+    """
+    shard = shard_of_id(ask_id)
+    try:
+        pool = get_pool(shard)
+    except UnknownShard:
+        raise ValueError(f"Ask {ask_id} not found") from None
+    with pool.write() as conn:
+        ask = conn.execute("SELECT requester_id, status, text, open_assignees FROM asks WHERE id = ?",
+                           (ask_id,)).fetchone()
+        if not ask or ask[0] != requester_id:
+            raise ValueError(f"Ask {ask_id} not found")
+        if ask[1] != 'open':
+            raise ValueError(f"Ask {ask_id} is already closed")
         
-        return False
+        reminder_id = _allocate_ids(conn, "reminders", shard)
+        conn.execute("""
+            INSERT INTO reminders (id, ask_id, requester_id, fire_at, status, created_at)
+            VALUES (?, ?, ?, ?, 'pending', ?)
+        """, (reminder_id, ask_id, requester_id, fire_at_utc, datetime.utcnow().isoformat()))
+    logger.info(f"Scheduled reminder {reminder_id} for ask {ask_id} at {fire_at_utc}")
+    return reminder_id, ask[2], ask[3]
+
+
+def get_pending_reminders(limit: int) -> List[Tuple[str, int]]:
+    """The next `limit` pending reminders over all shards as (fire_at, reminder_id), soonest first."""
+    due = []
+    for shard in shards():
+        with get_pool(shard).read() as conn:
+            due.extend(conn.execute("""
+                SELECT fire_at, id FROM reminders
+                WHERE status = 'pending'
+                ORDER BY fire_at
+                LIMIT ?
+            """, (limit,)).fetchall())
+    due.sort()
+    return due[:limit]
+
+
+def fire_reminders(reminder_ids: List[int], now_utc: str) -> int:
+    """Queue outbox notifications for due pending reminders, one transaction per shard. Returns messages queued.
+    
+    Reminders of asks closed in the meantime are marked skipped; ids no longer pending are ignored.
+    """
+    queued = 0
+    for shard in sorted({shard_of_id(reminder_id) for reminder_id in reminder_ids}):
+        ids = [reminder_id for reminder_id in reminder_ids if shard_of_id(reminder_id) == shard]
+        with get_pool(shard).write() as conn:
+            for reminder_id in ids:
+                row = conn.execute("""
+                    SELECT a.id, a.requester_name, a.text, a.status
+                    FROM reminders r
+                    JOIN asks a ON a.id = r.ask_id
+                    WHERE r.id = ? AND r.status = 'pending' AND r.fire_at <= ?
+                """, (reminder_id, now_utc)).fetchone()
+                if not row:
+                    continue
+                ask_id, requester_name, text, status = row
+                
+                assignees = conn.execute(
+                    "SELECT assignee_id FROM ask_assignees WHERE ask_id = ? AND status = 'open'", (ask_id,)
+                ).fetchall() if status == 'open' else []
+                notification = REMINDER_NOTIFICATION.format(requester_name=requester_name, text=text)
+                for (assignee_id,) in assignees:
+                    _enqueue(conn, assignee_id, notification, 'reminder', reminder_id, now_utc)
+                conn.execute("UPDATE reminders SET status = ?, fired_at = ? WHERE id = ?",
+                             ('sent' if assignees else 'skipped', now_utc, reminder_id))
+                queued += len(assignees)
+    return queued
+
+
+def set_digest_opt_out(user_id: int, opted_out: bool) -> bool:
+    """Turn the daily digest off (opted_out=True) or back on for a user. Returns whether anything changed."""
+    with get_pool().write() as conn:
+        if opted_out:
+            changed = conn.execute("INSERT OR IGNORE INTO digest_opt_outs (user_id, opted_out_at) VALUES (?, ?)",
+                                   (user_id, datetime.utcnow().isoformat())).rowcount
+        else:
+            changed = conn.execute("DELETE FROM digest_opt_outs WHERE user_id = ?", (user_id,)).rowcount
+    return bool(changed)
+
+
+def get_digest_opt_outs() -> Set[int]:
+    """Every user who turned the daily digest off."""
+    with get_pool().read() as conn:
+        return {user_id for (user_id,) in conn.execute("SELECT user_id FROM digest_opt_outs")}
+
+
+def iter_open_assignments_by_assignee(chat_id: int) -> Iterator[Tuple[int, List[Dict]]]:
+    """Yield (assignee_id, open assignments oldest first) for every assignee in a chat from one ordered query.
+    
+    Rows stream from the cursor a group at a time, so the read connection is held until the
+    generator is exhausted or closed; consume it on the thread that started it.
+    """
+    with get_pool(shard_for_chat(chat_id)).read() as conn:
+        cursor = conn.execute("""
+            SELECT aa.assignee_id, a.id as ask_id, a.text, a.requester_name, a.created_at
+            FROM asks a
+            JOIN ask_assignees aa ON aa.ask_id = a.id
+            WHERE a.chat_id = ? AND a.status = 'open' AND aa.status = 'open'
+            ORDER BY aa.assignee_id, a.created_at, a.id
+        """, (chat_id,))
+        columns = [desc[0] for desc in cursor.description][1:]
+        for assignee_id, rows in groupby(cursor, key=lambda row: row[0]):
+            yield assignee_id, [dict(zip(columns, row[1:])) for row in rows]
+
+
+def _match_expression(query: str) -> Optional[str]:
+    """FTS5 query for free text: every word must match, each as a prefix. None when there are no words."""
+    words = re.findall(r"\w+", query.lower())
+    return " ".join(f'"{word}"*' for word in words) or None
+
+
+def search_asks(chat_id: int, query: str, limit: int, offset: int = 0) -> Tuple[List[Dict], bool]:
+    """Asks of a group matching query, open or closed, best match first. Returns (items, more).
+    
+    Items are {ask_id, snippet, requester_name, assignees, status, created_at}; the snippet is the
+    ask text with matches in «» and long texts cut around them.
+    """
+    match = _match_expression(query)
+    if match is None:
+        return [], False
+    with get_pool(shard_for_chat(chat_id)).read() as conn:
+        cursor = conn.execute("""
+            WITH hits AS (
+                SELECT rowid AS ask_id, snippet(asks_fts, 1, '«', '»', '…', 16) AS snippet,
+                       requester_name, assignees, rank
+                FROM asks_fts
+                WHERE asks_fts MATCH ? AND chat_id = ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            )
+            SELECT h.ask_id, h.snippet, h.requester_name, h.assignees,
+                   COALESCE(a.status, x.status) as status, COALESCE(a.created_at, x.created_at) as created_at
+            FROM hits h
+            LEFT JOIN asks a ON a.id = h.ask_id
+            LEFT JOIN asks_archive x ON x.id = h.ask_id
+            ORDER BY h.rank
+        """, (match, chat_id, limit + 1, offset))
+        columns = [desc[0] for desc in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor]
+    return rows[:limit], len(rows) > limit
+
+
+def _read_open_asks() -> Iterator[Tuple[OpenAsk, List[Tuple[int, int]]]]:
+    """Every open ask on every shard with its open (assignee_id, assignment_id) pairs."""
+    for shard in shards():
+        with get_pool(shard).read() as conn:
+            # Grouped here rather than with ORDER BY, which would sort every row with its text
+            found: Dict[int, Tuple[OpenAsk, List[Tuple[int, int]]]] = {}
+            for row in conn.execute("""
+                SELECT a.id, a.chat_id, a.requester_id, a.requester_name, a.text, a.created_at,
+                       aa.assignee_id, aa.id
+                FROM asks a
+                LEFT JOIN ask_assignees aa ON aa.ask_id = a.id AND aa.status = 'open'
+                WHERE a.status = 'open'
+            """):
+                entry = found.get(row[0])
+                if entry is None:
+                    entry = found[row[0]] = (OpenAsk(*row[:6]), [])
+                if row[6] is not None:
+                    entry[1].append((row[6], row[7]))
+        yield from found.values()
+
+
+def load_open_ask_index() -> int:
+    """Fill the in-memory open ask index from every shard. Returns the number of open asks it holds."""
+    open_ask_index.load(_read_open_asks)
+    logger.info(f"Indexed {len(open_ask_index)} open asks for inline queries")
+    return len(open_ask_index)
+
+
+def iter_export_rows(chat_id: Optional[int] = None, since: Optional[Dict[int, int]] = None) -> Iterator[tuple]:
+    """Stream every ask, hot and archived, one row per assignee (or one with NULLs if it has none).
+    
+    Rows are (ask_id, chat_id, requester_id, requester_name, text, status, created_at, closed_at,
+    assignment_id, assignee_id, assignee_name, assignment_status, done_at), in ask id order within
+    each shard. `since` maps shard -> last ask id already exported; only later asks are read.
+    Rows come straight off SQLite cursors, so memory stays flat however long the history is.
+    """
+    since = since or {}
+    chosen = [shard_for_chat(chat_id)] if chat_id is not None else shards()
+    # Unary + keeps the archive scan on the id range, in order, instead of sorting a group's whole archive
+    chat_filter = "AND +a.chat_id = ?" if chat_id is not None else ""
+    for shard in chosen:
+        params = (since.get(shard, 0),) + ((chat_id,) if chat_id is not None else ())
+        with get_pool(shard).read() as conn:
+            # An ask is either hot or archived, so the two id-ordered streams merge without duplicates
+            streams = [conn.execute(f"""
+                SELECT a.id, a.chat_id, a.requester_id, a.requester_name, a.text, a.status, a.created_at,
+                       a.closed_at, aa.id, aa.assignee_id, aa.assignee_name, aa.status, aa.done_at
+                FROM {asks} a
+                LEFT JOIN {assignees} aa ON aa.ask_id = a.id
+                WHERE a.id > ? {chat_filter}
+                ORDER BY a.id, aa.id
+            """, params) for asks, assignees in (("asks", "ask_assignees"),
+                                                 ("asks_archive", "ask_assignees_archive"))]
+            yield from heapq.merge(*streams, key=itemgetter(0))
+
+
+def _parse_assignees(assignees_json: str) -> List[Tuple[str, str]]:
+    """Decode a summary row's assignees JSON into (name, status) pairs."""
+    return [(name, status) for name, status in json.loads(assignees_json)]
+
+
+def page_open_asks(chat_id: int, limit: int, before: Optional[int] = None,
+                   after: Optional[int] = None) -> Page:
+    """One page of a chat's open asks, newest first (items as in get_all_open_asks)."""
+    with get_pool(shard_for_chat(chat_id)).read() as conn:
+        page = _keyset_page(conn, """
+            SELECT s.ask_id, s.text, s.requester_name, s.assignees_json
+            FROM open_ask_summary s
+            WHERE s.chat_id = ? {cursor}
+            ORDER BY s.created_at {order}, s.ask_id {order}
+        """, (chat_id,), limit, before, after, key="s.created_at, s.ask_id")
+    for item in page.items:
+        item['assignees'] = _parse_assignees(item.pop('assignees_json'))
+    return page
 
 
 def get_all_open_asks(chat_id: int) -> List[Dict]:
     """Get all open asks with assignee statuses for a chat."""
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_pool(shard_for_chat(chat_id)).read() as conn:
         cursor = conn.execute("""
-            SELECT a.id as ask_id, a.text, a.requester_name,
-                   GROUP_CONCAT(aa.assignee_name || ':' || aa.status) as assignees_status
-            FROM asks a
-            JOIN ask_assignees aa ON a.id = aa.ask_id
-            WHERE a.chat_id = ? AND a.status = 'open'
-            GROUP BY a.id, a.text, a.requester_name
-            ORDER BY a.created_at DESC
+            SELECT ask_id, text, requester_name, assignees_json
+            FROM open_ask_summary
+            WHERE chat_id = ?
+            ORDER BY created_at DESC, ask_id DESC
         """, (chat_id,))
         
-        asks = []
-        for row in cursor.fetchall():
-            ask_id, text, requester_name, assignees_raw = row
-            
-            # Parse assignees status
-            assignees = []
-            if assignees_raw:
-                for assignee_status in assignees_raw.split(','):
-                    name, status = assignee_status.split(':', 1)
-                    assignees.append((name, status))
-            
-            asks.append({
+        # Stream rows straight into the result instead of materialising them first
+        return [
+            {
                 'ask_id': ask_id,
                 'text': text,
                 'requester_name': requester_name,
-                'assignees': assignees
-            })
-        
-        return asks
\ No newline at end of file
+                'assignees': _parse_assignees(assignees_json)
+            }
+            for ask_id, text, requester_name, assignees_json in cursor
+        ]
+
+
+def get_outbox_batch(limit: int, now_utc: str) -> List[Tuple[int, int, str, int]]:
+    """Pending outbox rows that are due on any shard, oldest first, as (id, chat_id, text, attempts)."""
+    due = []
+    for shard in shards():
+        with get_pool(shard).read() as conn:
+            cursor = conn.execute("""
+                SELECT next_attempt_at, id, chat_id, text, attempts
+                FROM outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY next_attempt_at, id
+                LIMIT ?
+            """, (now_utc, limit))
+            due.extend(cursor.fetchall())
+    due.sort()
+    return [row[1:] for row in due[:limit]]
+
+
+def record_outbox_results(sent: List[int], failed: List[Tuple[int, str]],
+                          retry: List[Tuple[int, str, str]], when_utc: str) -> None:
+    """Record delivery outcomes: sent ids, permanently failed (id, error) and (id, error, next_attempt_at) retries."""
+    touched = {shard_of_id(outbox_id) for outbox_id in sent}
+    touched.update(shard_of_id(row[0]) for row in failed + retry)
+    for shard in sorted(touched):
+        with get_pool(shard).write() as conn:
+            conn.executemany("""
+                UPDATE outbox SET status = 'sent', attempts = attempts + 1, sent_at = ?, last_error = NULL
+                WHERE id = ?
+            """, [(when_utc, outbox_id) for outbox_id in sent if shard_of_id(outbox_id) == shard])
+            conn.executemany("""
+                UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ?
+                WHERE id = ?
+            """, [(error, outbox_id) for outbox_id, error in failed if shard_of_id(outbox_id) == shard])
+            conn.executemany("""
+                UPDATE outbox SET attempts = attempts + 1, last_error = ?, next_attempt_at = ?
+                WHERE id = ?
+            """, [(error, next_at, outbox_id) for outbox_id, error, next_at in retry
+                  if shard_of_id(outbox_id) == shard])
+
+
+def get_outbox_progress(kind: str, ref_id: int) -> Tuple[int, int, int]:
+    """Delivery progress for one ask's notifications as (sent, not yet attempted, total)."""
+    with get_pool(shard_of_id(ref_id)).read() as conn:
+        cursor = conn.execute("""
+            SELECT COALESCE(SUM(status = 'sent'), 0),
+                   COALESCE(SUM(status = 'pending' AND attempts = 0), 0),
+                   COUNT(*)
+            FROM outbox
+            WHERE kind = ? AND ref_id = ?
+        """, (kind, ref_id))
+        return cursor.fetchone()
+
+
+def prune_outbox(shard: int, before_utc: str) -> int:
+    """Delete delivered outbox rows older than the cutoff on one shard. Returns rows deleted."""
+    with get_pool(shard).write() as conn:
+        cursor = conn.execute("""
+            DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?
+        """, (before_utc,))
+        return cursor.rowcount
+
+
+def archive_closed_asks(shard: int, closed_before_utc: str, limit: int) -> int:
+    """Move up to `limit` asks closed before the cutoff, with their assignments, into the archive tables.
+    
+    One short transaction per call; returns the asks moved, so callers repeat until it is below limit.
+    Reminders of archived asks go with them (ON DELETE CASCADE); they have all fired by then.
+    """
+    now = datetime.utcnow().isoformat()
+    with get_pool(shard).write() as conn:
+        ask_ids = [(ask_id,) for (ask_id,) in conn.execute("""
+            SELECT id FROM asks
+            WHERE status = 'closed' AND closed_at < ?
+            ORDER BY closed_at
+            LIMIT ?
+        """, (closed_before_utc, limit))]
+        if not ask_ids:
+            return 0
+        conn.executemany(f"""
+            INSERT INTO asks_archive ({_ASK_COLUMNS}, archived_at)
+            SELECT {_ASK_COLUMNS}, ? FROM asks WHERE id = ?
+        """, [(now, ask_id) for (ask_id,) in ask_ids])
+        conn.executemany(f"""
+            INSERT INTO ask_assignees_archive ({_ASSIGNEE_COLUMNS})
+            SELECT {_ASSIGNEE_COLUMNS} FROM ask_assignees WHERE ask_id = ?
+        """, ask_ids)
+        conn.executemany("DELETE FROM ask_assignees WHERE ask_id = ?", ask_ids)
+        conn.executemany("DELETE FROM asks WHERE id = ?", ask_ids)
+    logger.debug(f"Shard {shard}: archived {len(ask_ids)} asks closed before {closed_before_utc}")
+    return len(ask_ids)
+
+
+def incremental_vacuum(shard: int, pages: int) -> int:
+    """Return up to `pages` free pages of a shard to the filesystem (0 = all). Returns pages freed.
+    
+    Only files in auto_vacuum=INCREMENTAL mode shrink; others keep reusing their free pages.
+    """
+    with get_pool(shard).write() as conn:
+        if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] != 2:
+            return 0
+        free = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        if not free:
+            return 0
+        # sqlite3 steps a statement without result columns only once, and each step frees one page
+        for _ in range(free if pages <= 0 else min(pages, free)):
+            conn.execute("PRAGMA incremental_vacuum(1);")
+        return free - conn.execute("PRAGMA freelist_count;").fetchone()[0]
+
+
+def get_retention_stats(shard: int) -> Dict[str, int]:
+    """Hot and archived row counts and free pages of one shard, for tools.retention status."""
+    queries = {
+        'open_asks': "SELECT COUNT(*) FROM asks WHERE status = 'open'",
+        'closed_asks': "SELECT COUNT(*) FROM asks WHERE status = 'closed'",
+        'archived_asks': "SELECT COUNT(*) FROM asks_archive",
+        'archived_assignments': "SELECT COUNT(*) FROM ask_assignees_archive",
+        'auto_vacuum': "PRAGMA auto_vacuum",
+        'page_size': "PRAGMA page_size",
+        'page_count': "PRAGMA page_count",
+        'free_pages': "PRAGMA freelist_count",
+    }
+    with get_pool(shard).read() as conn:
+        return {name: conn.execute(sql).fetchone()[0] for name, sql in queries.items()}
+
+
+def get_health() -> Dict[str, int]:
+    """Cheap liveness facts for /health: pending outbox rows and WAL bytes summed over shards, and the shard count."""
+    pending = wal_bytes = 0
+    for shard in shards():
+        with get_pool(shard).read() as conn:
+            pending += conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        wal_path = shard_path(shard) + "-wal"
+        wal_bytes += os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+    return {
+        'pending_outbox': pending,
+        'wal_bytes': wal_bytes,
+        'shards': len(shards()),
+    }
+
+
+# Functions that run SQL, timed under bot_db_*; db_async binds these wrapped versions when it imports
+# this module. Memo and roster cache lookups stay unwrapped (a roster miss is timed as _load_roster), and
+# generators too: only creating them would be timed
+metrics.instrument_db(globals(), (
+    "schema_version", "run_online_migrations", "init_db", "rebuild_open_ask_summary", "verify_open_ask_summary",
+    "register_group", "join_group", "leave_group", "register_user", "flush_registrations", "_load_roster",
+    "load_persisted_user_data", "load_persisted_conversations", "save_persisted_state",
+    "create_ask", "get_frequent_assignees", "list_my_open_assignments", "page_my_open_assignments",
+    "complete_assignment", "get_requester_open_asks", "create_reminder", "get_pending_reminders", "fire_reminders",
+    "set_digest_opt_out", "get_digest_opt_outs", "search_asks", "load_open_ask_index", "page_open_asks",
+    "get_all_open_asks", "get_outbox_batch", "record_outbox_results", "get_outbox_progress", "prune_outbox",
+    "archive_closed_asks", "incremental_vacuum", "get_retention_stats", "get_health",
+))
@@ -0,0 +1,254 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import db
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# SQLite allows one writer at a time per file, so each shard's writes are funnelled
+# through its own thread (a busy group never queues behind another shard's commit);
+# reads fan out across a small pool so they never queue behind a slow commit.
+_writers: Dict[int, ThreadPoolExecutor] = {}
+_writers_lock = threading.Lock()
+_readers = ThreadPoolExecutor(max_workers=settings.DB_READER_THREADS, thread_name_prefix="db-reader")
+
+
+def _on_executor(executor: ThreadPoolExecutor, func):
+    """Wrap a blocking db function so it runs on the given executor and can be awaited."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+    return wrapper
+
+
+def _writer(shard: int) -> ThreadPoolExecutor:
+    """The single writer thread of a shard, started on first use."""
+    executor = _writers.get(shard)
+    if executor is None:
+        with _writers_lock:
+            executor = _writers.get(shard)
+            if executor is None:
+                executor = _writers[shard] = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix=f"db-writer-{shard}")
+    return executor
+
+
+def _read(func):
+    return _on_executor(_readers, func)
+
+
+def _write(func, shard_of: Optional[Callable[..., int]] = None):
+    """Run func on the writer thread of the shard picked from its arguments (shard 0 by default)."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        shard = shard_of(*args, **kwargs) if shard_of is not None else 0
+        if not db.is_known_shard(shard):
+            # An id from a callback or command that no shard holds: func rejects it itself, and no
+            # writer thread is started for it
+            shard = 0
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_writer(shard), functools.partial(func, *args, **kwargs))
+    return wrapper
+
+
+_register_user = _write(db.register_user)
+flush_registrations = _write(db.flush_registrations)
+_join_group = _write(db.join_group)
+leave_group = _write(db.leave_group)
+_load_roster = _read(db.get_roster)
+_load_roster_names = _read(db.get_roster_names)
+_register_group = _write(db.register_group)
+_create_ask = _write(db.create_ask, shard_of=lambda chat_id, *args, **kwargs: db.shard_for_chat(chat_id))
+get_frequent_assignees = _read(db.get_frequent_assignees)
+list_my_open_assignments = _read(db.list_my_open_assignments)
+complete_assignment = _write(db.complete_assignment,
+                             shard_of=lambda assignment_id, *args, **kwargs: db.shard_of_id(assignment_id))
+get_all_open_asks = _read(db.get_all_open_asks)
+page_my_open_assignments = _read(db.page_my_open_assignments)
+page_open_asks = _read(db.page_open_asks)
+search_asks = _read(db.search_asks)
+load_open_ask_index = _read(db.load_open_ask_index)
+get_outbox_batch = _read(db.get_outbox_batch)
+get_outbox_progress = _read(db.get_outbox_progress)
+get_health = _read(db.get_health)
+archive_closed_asks = _write(db.archive_closed_asks, shard_of=lambda shard, *args, **kwargs: shard)
+incremental_vacuum = _write(db.incremental_vacuum, shard_of=lambda shard, *args, **kwargs: shard)
+get_requester_open_asks = _read(db.get_requester_open_asks)
+create_reminder = _write(db.create_reminder, shard_of=lambda ask_id, *args, **kwargs: db.shard_of_id(ask_id))
+get_pending_reminders = _read(db.get_pending_reminders)
+set_digest_opt_out = _write(db.set_digest_opt_out)
+get_digest_opt_outs = _read(db.get_digest_opt_outs)
+load_persisted_user_data = _read(db.load_persisted_user_data)
+load_persisted_conversations = _read(db.load_persisted_conversations)
+save_persisted_state = _write(db.save_persisted_state)
+_pending_migrations = _read(db.pending_migrations)
+
+
+async def register_user(user_id: int, display_name: str) -> bool:
+    """Register a user; known users with an unchanged name never leave the event loop."""
+    if db.is_registered(user_id, display_name):
+        return False
+    return await _register_user(user_id, display_name)
+
+
+async def join_group(chat_id: int, title: Optional[str], user_id: int, display_name: str) -> bool:
+    """Put a user on a group's roster; members seen before never leave the event loop."""
+    if db.is_member(chat_id, user_id, title) and db.is_registered(user_id, display_name):
+        return False
+    return await _join_group(chat_id, title, user_id, display_name)
+
+
+async def create_ask(chat_id: int, requester_id: int, requester_name: str, text: str,
+                     assignees: List[Tuple[int, str]], notify: bool = False) -> int:
+    """Create an ask on the writer of its group's shard.
+
+    A group seen for the first time is recorded by shard 0's writer first: the directory lives on
+    shard 0, so it is never written from another shard's thread.
+    """
+    if not db.is_known_group(chat_id):
+        await _register_group(chat_id)
+    return await _create_ask(chat_id, requester_id, requester_name, text, assignees, notify)
+
+
+def _by_shard(items: Iterable[T], id_of: Callable[[T], int] = lambda item: item) -> Dict[int, List[T]]:
+    grouped: Dict[int, List[T]] = {}
+    for item in items:
+        grouped.setdefault(db.shard_of_id(id_of(item)), []).append(item)
+    return grouped
+
+
+async def fire_reminders(reminder_ids: List[int], now_utc: str) -> int:
+    """Fire due reminders, each shard's share on that shard's writer thread. Returns messages queued."""
+    queued = await asyncio.gather(*(
+        _on_executor(_writer(shard), db.fire_reminders)(ids, now_utc)
+        for shard, ids in _by_shard(reminder_ids).items()
+    ))
+    return sum(queued)
+
+
+async def record_outbox_results(sent: List[int], failed: List[Tuple[int, str]],
+                                retry: List[Tuple[int, str, str]], when_utc: str) -> None:
+    """Record delivery outcomes, each shard's rows on that shard's writer thread."""
+    sent_by, failed_by, retry_by = (_by_shard(sent), _by_shard(failed, lambda row: row[0]),
+                                    _by_shard(retry, lambda row: row[0]))
+    await asyncio.gather(*(
+        _on_executor(_writer(shard), db.record_outbox_results)(
+            sent_by.get(shard, []), failed_by.get(shard, []), retry_by.get(shard, []), when_utc)
+        for shard in sorted(sent_by.keys() | failed_by.keys() | retry_by.keys())
+    ))
+
+
+async def prune_outbox(before_utc: str) -> int:
+    """Delete delivered outbox rows older than the cutoff, every shard on its own writer thread."""
+    deleted = await asyncio.gather(*(
+        _on_executor(_writer(shard), db.prune_outbox)(shard, before_utc) for shard in db.shards()
+    ))
+    return sum(deleted)
+
+
+def get_groups():
+    """(chat_id, title) of every known group, straight from the in-memory directory."""
+    return db.get_groups()
+
+
+def get_user_groups(user_id: int):
+    """(chat_id, title) of the user's groups, straight from the in-memory directory."""
+    return db.get_user_groups(user_id)
+
+
+def search_open_asks(user_id: int, query: str, limit: int, offset: int = 0):
+    """A user's open asks matching query, straight from the in-memory open ask index."""
+    return db.open_ask_index.search(user_id, query, limit, offset)
+
+
+async def get_roster(chat_id: int):
+    """A group's roster from the in-memory cache; only a cold cache costs a trip to the reader pool."""
+    snapshot = db.roster_cache(chat_id).snapshot()
+    if snapshot is not None:
+        return snapshot[0]
+    return await _load_roster(chat_id)
+
+
+async def get_roster_names(chat_id: int):
+    """A group's user_id -> display_name index from the in-memory cache."""
+    snapshot = db.roster_cache(chat_id).snapshot()
+    if snapshot is not None:
+        return snapshot[1]
+    return await _load_roster_names(chat_id)
+
+
+async def map_open_assignments_by_assignee(chat_id: int,
+                                           func: Callable[[int, List[Dict]], Optional[T]]) -> List[T]:
+    """Run func(assignee_id, assignments) over a chat's open assignments as they stream grouped from one query.
+    
+    Runs on a reader thread, so func must not touch the event loop; None results are dropped.
+    """
+    def run():
+        results = (func(assignee_id, items) for assignee_id, items in db.iter_open_assignments_by_assignee(chat_id))
+        return [result for result in results if result is not None]
+    return await asyncio.get_running_loop().run_in_executor(_readers, run)
+
+
+async def stream_export_rows(chat_id: Optional[int], since: Optional[Dict[int, int]],
+                             func: Callable[[Iterator[tuple]], T]) -> T:
+    """Run func over db.iter_export_rows as the rows stream off SQLite, on a reader thread.
+    
+    func must not touch the event loop; it holds a reader connection until it returns.
+    """
+    def run():
+        rows = db.iter_export_rows(chat_id, since)
+        try:
+            return func(rows)
+        finally:
+            # Hands the reader connection back now even if func stopped early
+            rows.close()
+    return await asyncio.get_running_loop().run_in_executor(_readers, run)
+
+
+def assignment_version(user_id: int) -> int:
+    """Current version of a user's open assignments; changes whenever a write touches them."""
+    return db.assignment_versions.get(user_id)
+
+
+_migrations_stop = threading.Event()
+_migrations: Optional[asyncio.Future] = None
+
+
+async def start_online_migrations():
+    """Run pending online migrations on a thread of their own; their short batches interleave with normal writes."""
+    global _migrations
+    if not any((await _pending_migrations()).values()):
+        return
+    _migrations_stop.clear()
+    _migrations = asyncio.get_running_loop().run_in_executor(
+        None, db.run_online_migrations, _migrations_stop.is_set)
+
+
+async def stop_online_migrations():
+    """Pause online migrations after the batch in flight; the next start resumes them."""
+    global _migrations
+    if _migrations is None:
+        return
+    _migrations_stop.set()
+    try:
+        await _migrations
+    except Exception as e:
+        logger.error(f"Online migration failed: {e}")
+    _migrations = None
+
+
+def shutdown():
+    """Wait for queued database work to finish, stop the executor threads and close the pools."""
+    logger.info("Shutting down database executors")
+    for executor in list(_writers.values()):
+        executor.shutdown(wait=True)
+    _readers.shutdown(wait=True)
+    db.close_pool()
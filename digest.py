@@ -0,0 +1,70 @@
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import db_async
+import metrics
+from outbound import dispatcher
+
+logger = logging.getLogger(__name__)
+
+# Assignments listed per digest; the rest are counted so a digest stays far below Telegram's 4096 characters
+MAX_DIGEST_ITEMS = 15
+MAX_ITEM_CHARS = 120
+
+
+class DigestReport(NamedTuple):
+    """What one daily digest run did and how long each step took."""
+    groups: int
+    messages: int
+    delivered: int
+    build_seconds: float
+    send_seconds: float
+
+    @property
+    def total_seconds(self) -> float:
+        return self.build_seconds + self.send_seconds
+
+
+def render_digest(title: Optional[str], items: List[Dict]) -> str:
+    """One assignee's digest for one group, oldest assignment first."""
+    lines = [f"☀️ Still open for you in {title}:" if title else "☀️ Still open for you:"]
+    for item in items[:MAX_DIGEST_ITEMS]:
+        text = item['text'] if len(item['text']) <= MAX_ITEM_CHARS else item['text'][:MAX_ITEM_CHARS - 3] + "..."
+        lines.append(f"• {text} (from {item['requester_name']})")
+    if len(items) > MAX_DIGEST_ITEMS:
+        lines.append(f"…and {len(items) - MAX_DIGEST_ITEMS} more.")
+    lines.append("\nMark them done from /my_asks. Send /digest off to stop these messages.")
+    return "\n".join(lines)
+
+
+async def send_daily_digest() -> DigestReport:
+    """Build every assignee's digest with one grouped query per group and send them as one rate-limited batch."""
+    started = time.perf_counter()
+    opted_out = await db_async.get_digest_opt_outs()
+    groups = db_async.get_groups()
+
+    messages: List[Tuple[int, str]] = []
+    for chat_id, title in groups:
+        def render(assignee_id: int, items: List[Dict], title=title) -> Optional[Tuple[int, str]]:
+            if assignee_id in opted_out:
+                return None
+            return assignee_id, render_digest(title, items)
+
+        messages.extend(await db_async.map_open_assignments_by_assignee(chat_id, render))
+    built = time.perf_counter()
+
+    delivered = await dispatcher.submit_batch(messages) if messages else 0
+    report = DigestReport(len(groups), len(messages), delivered, built - started, time.perf_counter() - built)
+
+    metrics.DIGEST_SECONDS.set(report.build_seconds, "build")
+    metrics.DIGEST_SECONDS.set(report.send_seconds, "send")
+    metrics.DIGEST_SECONDS.set(report.total_seconds, "total")
+    metrics.DIGEST_MESSAGES.set(report.messages, "built")
+    metrics.DIGEST_MESSAGES.set(report.delivered, "delivered")
+    logger.info(
+        f"Daily digest: {report.delivered}/{report.messages} delivered "
+        f"for {report.groups} groups in {report.total_seconds * 1000:.0f} ms "
+        f"(query and render {report.build_seconds * 1000:.0f} ms, send {report.send_seconds * 1000:.0f} ms)"
+    )
+    return report
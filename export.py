@@ -0,0 +1,108 @@
+import csv
+import gzip
+import io
+import json
+import logging
+import tempfile
+from typing import BinaryIO, Dict, Iterable, NamedTuple, Optional, Tuple
+
+import db
+import db_async
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Column order of db.iter_export_rows, written as the CSV header and the JSONL keys
+EXPORT_COLUMNS = (
+    "ask_id", "chat_id", "requester_id", "requester_name", "text", "status", "created_at", "closed_at",
+    "assignment_id", "assignee_id", "assignee_name", "assignment_status", "done_at",
+)
+FORMATS = ("csv", "jsonl")
+
+
+class ExportStats(NamedTuple):
+    """What an export wrote and where the next incremental one should start."""
+    rows: int
+    asks: int
+    cursor: Dict[int, int]
+
+
+def parse_cursor(text: Optional[str]) -> Dict[int, int]:
+    """Read a cursor as printed by format_cursor: the last exported ask id of each shard, comma separated."""
+    if not text or not text.strip():
+        return {}
+    cursor = {}
+    for part in text.strip().split(","):
+        if not part.strip().isdigit():
+            raise ValueError(f"Invalid export cursor {text.strip()!r}")
+        ask_id = int(part)
+        cursor[db.shard_of_id(ask_id)] = ask_id
+    return cursor
+
+
+def format_cursor(cursor: Dict[int, int]) -> str:
+    """Ask ids carry their shard, so the cursor is just the last id of every shard."""
+    return ",".join(str(cursor[shard]) for shard in sorted(cursor))
+
+
+def filename(chat_id: Optional[int], fmt: str, compress: bool, day: str) -> str:
+    scope = f"{abs(chat_id)}-" if chat_id is not None else ""
+    return f"asks-{scope}{day}.{fmt}{'.gz' if compress else ''}"
+
+
+def write_export(rows: Iterable[tuple], out: BinaryIO, fmt: str, compress: bool = False,
+                 since: Optional[Dict[int, int]] = None) -> ExportStats:
+    """Encode rows from db.iter_export_rows into out one at a time, as CSV or JSONL, optionally gzipped.
+
+    out is left open; the returned cursor is `since` moved past every ask written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    cursor = dict(since or {})
+    count = asks = 0
+    last_ask = None
+
+    raw = gzip.GzipFile(filename="", fileobj=out, mode="wb", compresslevel=6) if compress else out
+    text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    try:
+        if fmt == "csv":
+            writer = csv.writer(text)
+            writer.writerow(EXPORT_COLUMNS)
+            write = writer.writerow
+        else:
+            def write(row):
+                text.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+                text.write("\n")
+        for row in rows:
+            write(row)
+            count += 1
+            if row[0] != last_ask:
+                last_ask = row[0]
+                asks += 1
+                cursor[db.shard_of_id(last_ask)] = last_ask
+    finally:
+        # Hand out back to the caller: flush through the layers without closing it
+        text.flush()
+        text.detach()
+        if compress:
+            raw.close()
+    return ExportStats(count, asks, cursor)
+
+
+async def export_to_spool(chat_id: Optional[int], since: Dict[int, int], fmt: str,
+                          compress: bool) -> Tuple[tempfile.SpooledTemporaryFile, ExportStats]:
+    """Stream an export into a temp file kept in memory up to EXPORT_SPOOL_BYTES, then on disk.
+
+    Rows are read and encoded on a reader thread; the caller gets the file rewound and must close it.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.EXPORT_SPOOL_BYTES)
+    try:
+        stats = await db_async.stream_export_rows(
+            chat_id, since, lambda rows: write_export(rows, spool, fmt, compress, since))
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    logger.info(f"Exported {stats.asks} asks ({stats.rows} rows) of chat {chat_id} as {fmt}"
+                f"{' gzipped' if compress else ''}")
+    return spool, stats
@@ -1,19 +1,133 @@
+import hashlib
+import json
 import logging
+from collections import OrderedDict
 from datetime import datetime
-from typing import Set
-from telegram import Update
+from typing import Optional, Set, Tuple
+from telegram import InlineKeyboardMarkup, Message, Update
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes, ConversationHandler
-from telegram.error import BadRequest, Forbidden
 
-import db
-from keyboards import assignee_picker, asks_list, confirm_done, ask_creation_confirm
+import db_async
+from keyboards import (
+    assignee_picker, picker_index, asks_list, confirm_done, ask_creation_confirm, open_asks_nav, search_nav, clip
+)
 from config import settings
+from outbound import dispatcher
+import outbox
+from handlers.groups import current_group
 
 logger = logging.getLogger(__name__)
 
 # Conversation states
 PICK_ASSIGNEES, ENTER_TEXT, CONFIRM_SUBMIT = range(3)
 
+PICKER_PROMPT = "Who should I ask? Select one or more people, or type a name to search:"
+
+# user_data keys that live only as long as one ask conversation ('group' outlives it)
+CONVERSATION_KEYS = ('sel', 'order', 'ids', 'pg', 'q', 'picker_msg', 'ask_text')
+
+# Per-item cap in list views so a full page stays under Telegram's 4096-char message limit
+MAX_ITEM_CHARS = 300
+
+
+def _end_conversation(context: ContextTypes.DEFAULT_TYPE):
+    """Drop the ask conversation's state, keeping the user's chosen group."""
+    for key in CONVERSATION_KEYS:
+        context.user_data.pop(key, None)
+
+
+def _page_cursor(data: str):
+    """Parse (before, after) from paging callbacks: ak:?n:<id> is older, ak:?p:<id> is newer."""
+    parts = data.split(':')
+    if len(parts) == 3 and parts[1] in ('mn', 'an'):
+        return int(parts[2]), None
+    if len(parts) == 3 and parts[1] in ('mp', 'ap'):
+        return None, int(parts[2])
+    return None, None
+
+
+# A rendered screen: (text, reply markup, content digest)
+View = Tuple[str, Optional[InlineKeyboardMarkup], str]
+
+
+def _digest(text: Optional[str], markup: Optional[InlineKeyboardMarkup]) -> str:
+    """Hash of what a message shows, comparable between rendered views and received messages."""
+    rows = markup.inline_keyboard if markup else ()
+    buttons = [[(button.text, button.callback_data) for button in row] for row in rows]
+    return hashlib.sha1(json.dumps([text or "", buttons]).encode()).hexdigest()
+
+
+class RenderedViews:
+    """Bounded LRU of rendered list screens, each stored with the data version it was built from."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._views: "OrderedDict[tuple, Tuple[int, View]]" = OrderedDict()
+
+    def get(self, key: tuple, version: int) -> Optional[View]:
+        entry = self._views.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        self._views.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: tuple, version: int, view: View):
+        self._views[key] = (version, view)
+        self._views.move_to_end(key)
+        while len(self._views) > self.maxsize:
+            self._views.popitem(last=False)
+
+
+_views = RenderedViews(settings.VIEW_CACHE_SIZE)
+
+
+async def _send_view(send_func, text: str, markup: Optional[InlineKeyboardMarkup] = None,
+                     current: Optional[Message] = None, digest: Optional[str] = None):
+    """Send a screen, skipping the edit when `current` (the message being edited) already shows it."""
+    if current is not None and _digest(current.text, current.reply_markup) == (digest or _digest(text, markup)):
+        return
+    try:
+        await send_func(text, reply_markup=markup)
+    except BadRequest as e:
+        # Two quick taps can race past the digest check; the message already shows this content
+        if "message is not modified" not in str(e).lower():
+            raise
+
+
+async def _render_my_asks(chat_id: int, user_id: int, header: str, before, after, empty_text: str) -> View:
+    """Render one page of a user's open assignments in a group with Done buttons and paging."""
+    page = await db_async.page_my_open_assignments(chat_id, user_id, settings.PAGE_SIZE, before, after)
+    if not page.items and (before is not None or after is not None):
+        # The page emptied since it was rendered; start over from the newest assignments
+        page = await db_async.page_my_open_assignments(chat_id, user_id, settings.PAGE_SIZE)
+    
+    if not page.items:
+        return empty_text, None, _digest(empty_text, None)
+    
+    parts = [header]
+    for i, assignment in enumerate(page.items, 1):
+        parts.append(f"{i}. From {assignment['requester_name']}: {clip(assignment['text'], MAX_ITEM_CHARS)}")
+    
+    text = "\n\n".join(parts)
+    markup = asks_list(page.items, page.prev_cursor, page.next_cursor)
+    return text, markup, _digest(text, markup)
+
+
+async def _show_my_asks(chat_id: int, user_id: int, send_func, header: str, before=None, after=None,
+                        empty_text: str = "You have no open assignments! 🎉", current: Optional[Message] = None):
+    """Show a page of a user's open assignments, reusing the rendered page while their data is unchanged."""
+    # Read the version before the data so a concurrent write can only make the entry stale, never wrong
+    version = db_async.assignment_version(user_id)
+    key = (chat_id, user_id, header, empty_text, before, after)
+    view = _views.get(key, version)
+    if view is None:
+        view = await _render_my_asks(chat_id, user_id, header, before, after, empty_text)
+        _views.put(key, version, view)
+    
+    text, markup, digest = view
+    await _send_view(send_func, text, markup, current, digest)
+
 
 async def start_new_ask(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start the new ask conversation flow."""
@@ -23,41 +137,51 @@ async def start_new_ask(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Register user
     display_name = f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username or f"User {user.id}"
-    db.register_user(user.id, display_name)
+    await db_async.register_user(user.id, display_name)
     
     logger.info(f"Starting new ask conversation for user {user.id}")
     
-    # Get roster
-    roster = db.get_roster()
-    if not roster:
-        # Handle both callback query entry (button press) and direct message entry (/ask command)
-        if update.callback_query:
-            await update.callback_query.answer()
-            send_func = update.callback_query.edit_message_text
-        else:
-            send_func = update.message.reply_text
-            
-        await send_func("No family members have started the bot yet. Ask them to send /start to the bot first!")
-        return ConversationHandler.END
-    
-    # Initialize selection state
-    context.user_data['sel'] = set()
-    
-    # Handle both entry modes
+    # Handle both callback query entry (button press) and direct message entry (/ask command)
     if update.callback_query:
         await update.callback_query.answer()
         send_func = update.callback_query.edit_message_text
     else:
         send_func = update.message.reply_text
     
-    await send_func(
-        "Who should I ask? Select one or more people:",
-        reply_markup=assignee_picker(roster, set())
-    )
+    # The ask goes to the user's current group; users in several groups pick one first
+    chat_id = await current_group(update, context, "new")
+    if chat_id is None:
+        return ConversationHandler.END
+    
+    # Get roster
+    roster = await db_async.get_roster(chat_id)
+    if not roster:
+        await send_func("No family members have joined this group yet. Ask them to send /start in the group chat!")
+        return ConversationHandler.END
+    
+    # Recent/frequent assignees of this requester first, then everyone else by name
+    preferred = await db_async.get_frequent_assignees(chat_id, user.id)
+    order = picker_index(chat_id, roster).order(preferred)
+    
+    # Initialize selection state
+    context.user_data.update(sel=set(), order=order, ids=order, pg=0, q=None)
+    
+    message = await send_func(PICKER_PROMPT, reply_markup=_picker_markup(context, roster))
+    if isinstance(message, Message):
+        context.user_data['picker_msg'] = (message.chat_id, message.message_id)
     
     return PICK_ASSIGNEES
 
 
+def _picker_markup(context: ContextTypes.DEFAULT_TYPE, roster):
+    """Render the picker page described by the conversation's user_data."""
+    data = context.user_data
+    return assignee_picker(
+        picker_index(data['group'], roster), data.get('ids', ()), data.get('sel', set()),
+        data.get('pg', 0), settings.PICKER_PAGE_SIZE, data.get('q'),
+    )
+
+
 async def on_toggle_assignee(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle toggling assignee selection."""
     query = update.callback_query
@@ -76,10 +200,54 @@ async def on_toggle_assignee(update: Update, context: ContextTypes.DEFAULT_TYPE)
     context.user_data['sel'] = selected
     
     # Refresh picker
-    roster = db.get_roster()
-    await query.edit_message_reply_markup(
-        reply_markup=assignee_picker(roster, selected)
-    )
+    roster = await db_async.get_roster(context.user_data['group'])
+    await query.edit_message_reply_markup(reply_markup=_picker_markup(context, roster))
+    
+    return PICK_ASSIGNEES
+
+
+async def on_picker_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle paging through the assignee picker (ak:pg:<page>)."""
+    query = update.callback_query
+    await query.answer()
+    
+    context.user_data['pg'] = int(query.data.split(':')[2])
+    roster = await db_async.get_roster(context.user_data['group'])
+    await query.edit_message_reply_markup(reply_markup=_picker_markup(context, roster))
+    
+    return PICK_ASSIGNEES
+
+
+async def on_picker_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle text typed while picking: filter the picker to names with matching word prefixes."""
+    text = update.message.text.strip()[:50]
+    roster = await db_async.get_roster(context.user_data['group'])
+    ids = picker_index(context.user_data['group'], roster).search(text, context.user_data.get('order', ()))
+    context.user_data.update(ids=ids, pg=0, q=text or None)
+    
+    # The fresh picker is posted below the typed text; strip the old one so only one stays live
+    previous = context.user_data.pop('picker_msg', None)
+    if previous:
+        try:
+            await context.bot.edit_message_reply_markup(chat_id=previous[0], message_id=previous[1], reply_markup=None)
+        except BadRequest as e:
+            logger.debug(f"Could not clear previous picker: {e}")
+    
+    prompt = f"People matching \"{text}\":" if ids else f"Nobody matches \"{text}\". Type another name or clear the search:"
+    message = await update.message.reply_text(prompt, reply_markup=_picker_markup(context, roster))
+    context.user_data['picker_msg'] = (message.chat_id, message.message_id)
+    
+    return PICK_ASSIGNEES
+
+
+async def on_picker_clear(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle clearing the picker search (ak:qc)."""
+    query = update.callback_query
+    await query.answer()
+    
+    context.user_data.update(ids=context.user_data.get('order', ()), pg=0, q=None)
+    roster = await db_async.get_roster(context.user_data['group'])
+    await query.edit_message_text(PICKER_PROMPT, reply_markup=_picker_markup(context, roster))
     
     return PICK_ASSIGNEES
 
@@ -117,8 +285,8 @@ async def on_text_entered(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Show confirmation
     selected = context.user_data.get('sel', set())
-    roster = {uid: name for uid, name in db.get_roster()}
-    selected_names = [roster[uid] for uid in selected if uid in roster]
+    names = await db_async.get_roster_names(context.user_data['group'])
+    selected_names = [names[uid] for uid in selected if uid in names]
     
     summary = f"Ask {len(selected_names)} people to: {text}\n\n"
     summary += f"Assignees: {', '.join(selected_names)}"
@@ -145,52 +313,47 @@ async def on_submit_ask(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     
     # Get display names for assignees
-    roster = {uid: name for uid, name in db.get_roster()}
-    assignees = [(uid, roster[uid]) for uid in selected if uid in roster]
+    names = await db_async.get_roster_names(context.user_data['group'])
+    assignees = [(uid, names[uid]) for uid in selected if uid in names]
     
     if not assignees:
         await query.edit_message_text("Error: Selected assignees not found. Please start over.")
         return ConversationHandler.END
     
-    # Determine chat_id (use first allowed chat if set, otherwise user's chat)
-    chat_id = update.effective_chat.id
-    if settings.ALLOWED_CHAT_IDS:
-        chat_id = next(iter(settings.ALLOWED_CHAT_IDS))
+    # The ask belongs to the group whose roster the assignees were picked from
+    chat_id = context.user_data['group']
     
     # Create the ask
     requester_name = f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username or f"User {user.id}"
     
     try:
-        ask_id = db.create_ask(chat_id, user.id, requester_name, text, assignees)
-        
-        # Notify assignees via DM
-        notification_text = f"{requester_name} asked you: {text}"
-        successful_notifications = 0
-        
-        for assignee_id, assignee_name in assignees:
-            try:
-                await context.bot.send_message(
-                    chat_id=assignee_id,
-                    text=notification_text
-                )
-                successful_notifications += 1
-            except (BadRequest, Forbidden) as e:
-                logger.info(f"Could not notify user {assignee_id}: {e}")
-        
-        # Confirm to requester
-        await query.edit_message_text(
-            f"✅ Ask created! Notified {successful_notifications} of {len(assignees)} people.\n\n"
-            f"Your request: {text}"
-        )
-        
-        logger.info(f"Created ask {ask_id} by user {user.id} with {len(assignees)} assignees")
-        
+        ask_id = await db_async.create_ask(chat_id, user.id, requester_name, text, assignees, notify=True)
     except Exception as e:
         logger.error(f"Error creating ask: {e}")
         await query.edit_message_text("Error creating ask. Please try again later.")
+        _end_conversation(context)
+        return ConversationHandler.END
+    
+    logger.info(f"Created ask {ask_id} by user {user.id} with {len(assignees)} assignees")
+    
+    # Confirm to requester right away; delivery counts are filled in once the DMs settle
+    await query.edit_message_text(
+        f"✅ Ask created! Notifying {len(assignees)} people...\n\n"
+        f"Your request: {text}"
+    )
+    
+    async def report_delivery(delivered: int, total: int):
+        await dispatcher.call(query.message.chat_id, lambda: query.edit_message_text(
+            f"✅ Ask created! Notified {delivered} of {total} people.\n\n"
+            f"Your request: {text}"
+        ))
+    
+    # Assignee DMs were queued in the outbox with the ask; have the worker send them now
+    outbox.worker.watch('ask', ask_id, report_delivery)
+    outbox.worker.wake()
     
-    # Clear user data
-    context.user_data.clear()
+    # Clear the conversation's data
+    _end_conversation(context)
     
     return ConversationHandler.END
 
@@ -201,19 +364,19 @@ async def on_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     await query.edit_message_text("Ask creation cancelled.")
     
-    context.user_data.clear()
+    _end_conversation(context)
     return ConversationHandler.END
 
 
 async def my_asks(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show user's open assignments."""
+    """Show a page of the user's open assignments (ak:my, or ak:mp/ak:mn:<cursor> for paging)."""
     user = update.effective_user
     if not user:
         return
     
     # Register user
     display_name = f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username or f"User {user.id}"
-    db.register_user(user.id, display_name)
+    await db_async.register_user(user.id, display_name)
     
     logger.info(f"Showing my asks for user {user.id}")
     
@@ -221,20 +384,17 @@ async def my_asks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.callback_query:
         await update.callback_query.answer()
         edit_func = update.callback_query.edit_message_text
+        before, after = _page_cursor(update.callback_query.data)
+        current = update.callback_query.message
     else:
         edit_func = update.message.reply_text
+        before, after, current = None, None, None
     
-    assignments = db.list_my_open_assignments(user.id)
-    
-    if not assignments:
-        await edit_func("You have no open assignments! 🎉")
+    chat_id = await current_group(update, context, "my")
+    if chat_id is None:
         return
     
-    text = f"Your open assignments ({len(assignments)}):\n\n"
-    for i, assignment in enumerate(assignments, 1):
-        text += f"{i}. From {assignment['requester_name']}: {assignment['text']}\n\n"
-    
-    await edit_func(text, reply_markup=asks_list(assignments))
+    await _show_my_asks(chat_id, user.id, edit_func, "Your open assignments:", before, after, current=current)
 
 
 async def on_done_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -264,41 +424,22 @@ async def on_done_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     assignment_id = int(query.data.split(':')[2])
     
     try:
-        # Mark as done
+        # Mark as done (closing the ask if it was the last one); the requester's notification
+        # is queued in the same transaction
         now = datetime.utcnow().isoformat()
-        ask_id, requester_id, requester_name, text = db.mark_assignment_done(
-            assignment_id, user.id, now
-        )
-        
-        # Check if ask should be closed
-        is_closed = db.maybe_close_ask(ask_id, now)
-        
-        # Notify requester
         assignee_name = f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username or f"User {user.id}"
-        status_text = " (Ask completed!)" if is_closed else ""
-        notification_text = f"{assignee_name} marked done: {text}{status_text}"
-        
-        try:
-            await context.bot.send_message(
-                chat_id=requester_id,
-                text=notification_text
-            )
-        except (BadRequest, Forbidden) as e:
-            logger.info(f"Could not notify requester {requester_id}: {e}")
+        await db_async.complete_assignment(assignment_id, user.id, now, notify_name=assignee_name)
+        outbox.worker.wake()
+        logger.info(f"User {user.id} completed assignment {assignment_id}")
         
         # Refresh the assignments list
-        assignments = db.list_my_open_assignments(user.id)
-        
-        if assignments:
-            text = f"✅ Marked as done!\n\nYour remaining assignments ({len(assignments)}):\n\n"
-            for i, assignment in enumerate(assignments, 1):
-                text += f"{i}. From {assignment['requester_name']}: {assignment['text']}\n\n"
-            
-            await query.edit_message_text(text, reply_markup=asks_list(assignments))
-        else:
-            await query.edit_message_text("✅ Marked as done! You have no more open assignments! 🎉")
-        
-        logger.info(f"User {user.id} completed assignment {assignment_id}")
+        chat_id = await current_group(update, context, "my")
+        if chat_id is None:
+            return
+        await _show_my_asks(
+            chat_id, user.id, query.edit_message_text, "✅ Marked as done!\n\nYour remaining assignments:",
+            empty_text="✅ Marked as done! You have no more open assignments! 🎉", current=query.message
+        )
         
     except Exception as e:
         logger.error(f"Error marking assignment done: {e}")
@@ -315,24 +456,21 @@ async def on_done_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Refresh the assignments list
-    assignments = db.list_my_open_assignments(user.id)
-    
-    text = f"Your open assignments ({len(assignments)}):\n\n"
-    for i, assignment in enumerate(assignments, 1):
-        text += f"{i}. From {assignment['requester_name']}: {assignment['text']}\n\n"
-    
-    await query.edit_message_text(text, reply_markup=asks_list(assignments))
+    chat_id = await current_group(update, context, "my")
+    if chat_id is None:
+        return
+    await _show_my_asks(chat_id, user.id, query.edit_message_text, "Your open assignments:", current=query.message)
 
 
 async def all_open_asks(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show all open asks for the family group."""
+    """Show a page of open asks for the family group (ak:all, or ak:ap/ak:an:<cursor> for paging)."""
     user = update.effective_user
     if not user:
         return
     
     # Register user
     display_name = f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username or f"User {user.id}"
-    db.register_user(user.id, display_name)
+    await db_async.register_user(user.id, display_name)
     
     logger.info(f"Showing all open asks for user {user.id}")
     
@@ -340,28 +478,79 @@ async def all_open_asks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.callback_query:
         await update.callback_query.answer()
         edit_func = update.callback_query.edit_message_text
+        before, after = _page_cursor(update.callback_query.data)
+        current = update.callback_query.message
     else:
         edit_func = update.message.reply_text
+        before, after, current = None, None, None
     
-    # Determine chat_id (use first allowed chat if set, otherwise user's chat)
-    chat_id = update.effective_chat.id
-    if settings.ALLOWED_CHAT_IDS:
-        chat_id = next(iter(settings.ALLOWED_CHAT_IDS))
+    chat_id = await current_group(update, context, "all")
+    if chat_id is None:
+        return
     
-    asks = db.get_all_open_asks(chat_id)
+    page = await db_async.page_open_asks(chat_id, settings.PAGE_SIZE, before, after)
+    if not page.items and (before is not None or after is not None):
+        # The page emptied since it was rendered; start over from the newest asks
+        page = await db_async.page_open_asks(chat_id, settings.PAGE_SIZE)
     
-    if not asks:
-        await edit_func("No open asks! Everyone's on top of things! 🎉")
+    if not page.items:
+        await _send_view(edit_func, "No open asks! Everyone's on top of things! 🎉", current=current)
         return
     
-    text = f"All open asks ({len(asks)}):\n\n"
-    for i, ask in enumerate(asks, 1):
+    parts = ["All open asks:"]
+    for i, ask in enumerate(page.items, 1):
         assignee_statuses = []
         for name, status in ask['assignees']:
             emoji = "✅" if status == "done" else "⏳"
             assignee_statuses.append(f"{name} {emoji}")
         
-        assignee_text = ", ".join(assignee_statuses)
-        text += f"{i}. {ask['text']}\n   └ {assignee_text}\n\n"
+        assignee_text = clip(", ".join(assignee_statuses), MAX_ITEM_CHARS)
+        parts.append(f"{i}. {clip(ask['text'], MAX_ITEM_CHARS)}\n   └ {assignee_text}")
+    
+    await _send_view(edit_func, "\n\n".join(parts), open_asks_nav(page.prev_cursor, page.next_cursor), current)
+
+
+async def search_results(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show a page of the group's asks matching the saved /search query (ak:fp/ak:fn:<offset> for paging)."""
+    user = update.effective_user
+    if not user:
+        return
+    
+    if update.callback_query:
+        await update.callback_query.answer()
+        send_func = update.callback_query.edit_message_text
+        parts = update.callback_query.data.split(':')
+        offset = int(parts[2]) if parts[1] in ('fp', 'fn') else 0
+        current = update.callback_query.message
+    else:
+        send_func = update.message.reply_text
+        offset, current = 0, None
+    
+    query_text = context.user_data.get('search')
+    if not query_text:
+        await _send_view(send_func, "Send /search followed by what to look for, e.g. /search fencing dues",
+                         current=current)
+        return
+    
+    chat_id = await current_group(update, context, "sr")
+    if chat_id is None:
+        return
+    
+    items, more = await db_async.search_asks(chat_id, query_text, settings.PAGE_SIZE, offset)
+    if not items and offset > 0:
+        # Fewer matches than when the page was rendered; start over from the best ones
+        offset = 0
+        items, more = await db_async.search_asks(chat_id, query_text, settings.PAGE_SIZE)
+    
+    logger.info(f"Search by user {user.id} in group {chat_id}: {len(items)} results from offset {offset}")
+    if not items:
+        await _send_view(send_func, f"No asks match \"{clip(query_text, 100)}\".", current=current)
+        return
+    
+    parts = [f"🔎 \"{clip(query_text, 100)}\" - results {offset + 1}-{offset + len(items)}:"]
+    for i, item in enumerate(items, offset + 1):
+        status = "⏳ open" if item['status'] == 'open' else "✅ closed"
+        people = f"{item['requester_name']} → {item['assignees']}" if item['assignees'] else item['requester_name']
+        parts.append(f"{i}. {clip(item['snippet'], MAX_ITEM_CHARS)}\n   └ {clip(people, 100)} · {status} · {(item['created_at'] or '')[:10]}")
     
-    await edit_func(text)
\ No newline at end of file
+    await _send_view(send_func, "\n\n".join(parts), search_nav(offset, settings.PAGE_SIZE, more), current)
@@ -1,9 +1,11 @@
 import logging
+import time
 from telegram import Update
 from telegram.ext import ContextTypes
 from config import settings
 from keyboards import main_menu, main_menu_dm
-import db
+import db_async
+from outbound import dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -18,12 +20,12 @@ def is_private_chat(update: Update) -> bool:
     return update.effective_chat.type == 'private'
 
 
-def register_user_if_dm(update: Update):
+async def register_user_if_dm(update: Update):
     """Register user in database if this is a DM command."""
     if is_private_chat(update) and update.effective_user:
         user = update.effective_user
         display_name = f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username or f"User {user.id}"
-        db.register_user(user.id, display_name)
+        await db_async.register_user(user.id, display_name)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -34,7 +36,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"Start command invoked - user_id: {user_id}, chat_id: {chat_id}")
     
     # Register user if this is a DM
-    register_user_if_dm(update)
+    await register_user_if_dm(update)
     
     if is_private_chat(update):
         # Private chat - show DM menu with Asks functionality
@@ -52,20 +54,35 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def health(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /health command - simple health check."""
+    """Handle /health command - deep check of the database and outbound queues."""
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id if update.effective_user else None
     
     logger.info(f"Health command invoked - user_id: {user_id}, chat_id: {chat_id}")
     
     # Register user if this is a DM
-    register_user_if_dm(update)
+    await register_user_if_dm(update)
     
     if not is_private_chat(update) and not allowed(chat_id):
         logger.info(f"Ignoring health command from unauthorized chat: {chat_id}")
         return
     
-    await update.message.reply_text("OK")
+    # Round trip through the reader executor and pool, as every handler query pays it
+    started = time.perf_counter()
+    try:
+        facts = await db_async.get_health()
+    except Exception as e:
+        logger.error(f"Health check failed: {e}")
+        await update.message.reply_text(f"DEGRADED\nDatabase: {e}")
+        return
+    round_trip_ms = (time.perf_counter() - started) * 1000
+    
+    await update.message.reply_text(
+        f"OK\n"
+        f"DB round trip: {round_trip_ms:.1f} ms\n"
+        f"WAL size: {facts['wal_bytes'] / 1024 / 1024:.1f} MB\n"
+        f"Outbound: {dispatcher.pending} sending, {facts['pending_outbox']} queued in outbox"
+    )
 
 
 async def version(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -76,7 +93,7 @@ async def version(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"Version command invoked - user_id: {user_id}, chat_id: {chat_id}")
     
     # Register user if this is a DM
-    register_user_if_dm(update)
+    await register_user_if_dm(update)
     
     if not is_private_chat(update) and not allowed(chat_id):
         logger.info(f"Ignoring version command from unauthorized chat: {chat_id}")
@@ -101,7 +118,7 @@ async def ask_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Register user and start ask conversation
-    register_user_if_dm(update)
+    await register_user_if_dm(update)
     
     # Import here to avoid circular imports
     from handlers.asks import start_new_ask
@@ -146,6 +163,64 @@ async def all_asks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await all_open_asks(update, context)
 
 
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /search <words> in DM - find asks of the current group, open or closed."""
+    chat_id = update.effective_chat.id
+    user_id = update.effective_user.id if update.effective_user else None
+    
+    logger.info(f"Search command invoked - user_id: {user_id}, chat_id: {chat_id}")
+    
+    if not is_private_chat(update):
+        await update.message.reply_text(
+            "Please send me a direct message to search asks! You can start by clicking here: @UsualSuspects_bot"
+        )
+        return
+    
+    await register_user_if_dm(update)
+    
+    # Kept for paging and for picking a group before the results can be shown
+    context.user_data['search'] = " ".join(context.args or ())
+    
+    # Import here to avoid circular imports
+    from handlers.asks import search_results
+    await search_results(update, context)
+
+
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /digest [on|off] - show or change whether the daily digest is sent, DM only."""
+    chat_id = update.effective_chat.id
+    user_id = update.effective_user.id if update.effective_user else None
+    
+    logger.info(f"Digest command invoked - user_id: {user_id}, chat_id: {chat_id}")
+    
+    if not is_private_chat(update):
+        await update.message.reply_text(
+            "Please send me a direct message to change your digest! You can start by clicking here: @UsualSuspects_bot"
+        )
+        return
+    
+    await register_user_if_dm(update)
+    
+    if settings.DIGEST_TIME is None:
+        await update.message.reply_text("The daily digest is turned off for this bot.")
+        return
+    
+    choice = context.args[0].lower() if context.args else None
+    if choice in ("on", "off"):
+        await db_async.set_digest_opt_out(user_id, choice == "off")
+        opted_out = choice == "off"
+    else:
+        opted_out = user_id in await db_async.get_digest_opt_outs()
+    
+    at = settings.DIGEST_TIME.strftime("%H:%M")
+    if opted_out:
+        await update.message.reply_text(f"Your daily digest is off. Send /digest on to get it at {at} ({settings.TZ}).")
+    else:
+        await update.message.reply_text(
+            f"Your daily digest of open assignments arrives at {at} ({settings.TZ}). Send /digest off to stop it."
+        )
+
+
 async def noop_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle noop callback queries from inline keyboard buttons."""
     q = update.callback_query
@@ -0,0 +1,118 @@
+import logging
+from datetime import datetime
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import local_zone
+import export
+from handlers.commands import is_private_chat, register_user_if_dm
+from handlers.groups import current_group
+from outbound import dispatcher
+
+logger = logging.getLogger(__name__)
+
+# Telegram bots can upload documents up to 50 MB
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+EXPORT_USAGE = (
+    "Usage: /export [csv|jsonl] [gz] [new]\n"
+    "Sends every ask of your group, open, closed and archived, one row per assignee. "
+    "gz compresses the file; new only includes asks created since your last export."
+)
+
+
+def _parse_options(args) -> dict:
+    """Options from /export arguments; raises ValueError on anything unknown."""
+    options = {'format': "csv", 'gzip': False, 'new': False}
+    for arg in (arg.lower() for arg in args):
+        if arg in export.FORMATS:
+            options['format'] = arg
+        elif arg in ("gz", "gzip"):
+            options['gzip'] = True
+        elif arg == "new":
+            options['new'] = True
+        else:
+            raise ValueError(arg)
+    return options
+
+
+async def _send_export(update: Update, context: ContextTypes.DEFAULT_TYPE, send_func):
+    """Stream the current group's asks into a file and upload it to the user."""
+    chat_id = await current_group(update, context, "ex")
+    if chat_id is None:
+        return
+    
+    user_id = update.effective_user.id
+    options = context.user_data.get('export') or _parse_options(())
+    # Per-group cursor of the last export that reached the user, for "new"
+    cursors = context.user_data.setdefault('export_cursors', {})
+    since = export.parse_cursor(cursors.get(chat_id)) if options['new'] else {}
+    
+    await send_func("Preparing your export…")
+    try:
+        spool, stats = await export.export_to_spool(chat_id, since, options['format'], options['gzip'])
+    except Exception as e:
+        logger.error(f"Error exporting asks of chat {chat_id}: {e}")
+        await send_func("❌ Error preparing the export. Please try again.")
+        return
+    
+    with spool:
+        if stats.rows == 0:
+            await send_func("No new asks since your last export." if options['new'] else "This group has no asks yet.")
+            return
+        size = spool.seek(0, 2)
+        if size > MAX_UPLOAD_BYTES:
+            await send_func(f"The export is {size // (1024 * 1024)} MB, over Telegram's 50 MB limit. "
+                            "Try /export gz, or /export new for only the latest asks.")
+            return
+        
+        name = export.filename(chat_id, options['format'], options['gzip'],
+                               datetime.now(local_zone()).strftime("%Y-%m-%d"))
+        
+        async def upload():
+            # Rewound on every attempt: a retry after a network error re-reads the file
+            spool.seek(0)
+            await context.bot.send_document(
+                chat_id=user_id, document=spool, filename=name,
+                caption=f"{stats.asks} asks, {stats.rows} rows" + (" (new since your last export)" if since else "")
+            )
+        
+        if not await dispatcher.call(user_id, upload):
+            await send_func("❌ Could not send the export. Please try again.")
+            return
+    
+    cursors[chat_id] = export.format_cursor(stats.cursor)
+    logger.info(f"Sent export of chat {chat_id} to user {user_id}: {stats.asks} asks, {size} bytes")
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /export [csv|jsonl] [gz] [new] - send the group's asks as a file, DM only."""
+    chat_id = update.effective_chat.id
+    user_id = update.effective_user.id if update.effective_user else None
+    
+    logger.info(f"Export command invoked - user_id: {user_id}, chat_id: {chat_id}")
+    
+    if not is_private_chat(update):
+        await update.message.reply_text(
+            "Please send me a direct message to export asks! You can start by clicking here: @UsualSuspects_bot"
+        )
+        return
+    
+    await register_user_if_dm(update)
+    
+    try:
+        options = _parse_options(context.args or ())
+    except ValueError:
+        await update.message.reply_text(EXPORT_USAGE)
+        return
+    
+    # Kept for when a group has to be picked before the export can run
+    context.user_data['export'] = options
+    await _send_export(update, context, update.message.reply_text)
+
+
+async def on_export_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle choosing the group for /export (ak:g:<chat_id>:ex)."""
+    query = update.callback_query
+    await query.answer()
+    await _send_export(update, context, query.edit_message_text)
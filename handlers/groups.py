@@ -0,0 +1,92 @@
+import logging
+from typing import Optional
+from telegram import Update
+from telegram.ext import ContextTypes
+
+import db_async
+from handlers.commands import allowed, is_private_chat
+from keyboards import group_picker, main_menu_dm
+
+logger = logging.getLogger(__name__)
+
+NO_GROUP_TEXT = "You're not in any family group yet. Send /start in your family group chat first!"
+
+
+async def track_membership(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Keep group rosters current from the messages the bot sees in allowed group chats."""
+    chat = update.effective_chat
+    if chat is None or chat.type not in ('group', 'supergroup') or not allowed(chat.id):
+        return
+    
+    message = update.effective_message
+    if message is not None and message.left_chat_member:
+        if not message.left_chat_member.is_bot:
+            await db_async.leave_group(chat.id, message.left_chat_member.id)
+        return
+    
+    # With privacy mode on the bot only sees commands and service messages, so people join the
+    # roster by sending /start in the group or by being added to it
+    members = list(message.new_chat_members or ()) if message is not None else []
+    if update.effective_user:
+        members.append(update.effective_user)
+    for user in members:
+        if user.is_bot:
+            continue
+        display_name = f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username or f"User {user.id}"
+        await db_async.join_group(chat.id, chat.title, user.id, display_name)
+
+
+async def current_group(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str) -> Optional[int]:
+    """The group a DM action applies to, or None after asking the user to pick one.
+    
+    A choice made with an ak:g:<chat_id>:<action> button is remembered in user_data; users on
+    a single group's roster are never asked.
+    """
+    groups = db_async.get_user_groups(update.effective_user.id)
+    ids = [chat_id for chat_id, _ in groups]
+    query = update.callback_query
+    
+    if query and query.data.startswith("ak:g:"):
+        chosen = int(query.data.split(':')[2])
+        if chosen in ids:
+            context.user_data['group'] = chosen
+    if len(ids) == 1:
+        context.user_data['group'] = ids[0]
+    if context.user_data.get('group') in ids:
+        return context.user_data['group']
+    
+    send_func = query.edit_message_text if query else update.message.reply_text
+    if groups:
+        await send_func("Which group?", reply_markup=group_picker(groups, action))
+    else:
+        await send_func(NO_GROUP_TEXT)
+    return None
+
+
+async def group_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /group command - choose the group that new asks and lists apply to."""
+    user = update.effective_user
+    if not user or not is_private_chat(update):
+        return
+    
+    logger.info(f"Group command invoked - user_id: {user.id}")
+    
+    groups = db_async.get_user_groups(user.id)
+    if not groups:
+        await update.message.reply_text(NO_GROUP_TEXT)
+        return
+    
+    await update.message.reply_text("Which group do you want to work in?", reply_markup=group_picker(groups, "sw"))
+
+
+async def on_switch_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle choosing a group from /group (ak:g:<chat_id>:sw)."""
+    query = update.callback_query
+    await query.answer()
+    
+    chat_id = await current_group(update, context, "sw")
+    if chat_id is None:
+        return
+    
+    title = dict(db_async.get_user_groups(update.effective_user.id)).get(chat_id) or f"group {chat_id}"
+    await query.edit_message_text(f"Now working in {title}. What would you like to do?", reply_markup=main_menu_dm())
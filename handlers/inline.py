@@ -0,0 +1,79 @@
+import logging
+from datetime import datetime
+from telegram import InlineQueryResultArticle, InlineQueryResultsButton, InputTextMessageContent, Update
+from telegram.ext import ContextTypes
+
+from config import settings
+import db_async
+from keyboards import clip, inline_ask_done
+import outbox
+
+logger = logging.getLogger(__name__)
+
+# Result titles show the start of the ask; Telegram cuts longer ones to a line anyway
+MAX_TITLE_CHARS = 100
+
+
+async def on_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Answer "@bot <words>" from any chat with the user's open asks matching them, paged by next_offset."""
+    query = update.inline_query
+    user_id = query.from_user.id
+    offset = int(query.offset) if query.offset.isdigit() else 0
+    
+    # Served from memory on every keystroke; SQLite is only read when the index is built at startup
+    items, more = db_async.search_open_asks(user_id, query.query, settings.INLINE_RESULTS, offset)
+    titles = dict(db_async.get_user_groups(user_id))
+    
+    results = []
+    for ask, assignment_id in items:
+        role = f"From {ask.requester_name}" if assignment_id is not None else "Your ask"
+        group = titles.get(ask.chat_id)
+        results.append(InlineQueryResultArticle(
+            id=str(ask.ask_id),
+            title=clip(ask.text, MAX_TITLE_CHARS),
+            description=f"{role} · {group}" if group else role,
+            input_message_content=InputTextMessageContent(f"📝 {ask.requester_name} asked: {ask.text}"),
+            reply_markup=inline_ask_done(assignment_id, user_id) if assignment_id is not None else None,
+        ))
+    
+    button = None
+    if not results and offset == 0:
+        button = InlineQueryResultsButton(text="No matching open asks - open the bot", start_parameter="asks")
+    await query.answer(
+        results,
+        cache_time=settings.INLINE_CACHE_SECONDS,
+        is_personal=True,
+        next_offset=str(offset + len(items)) if more else "",
+        button=button,
+    )
+
+
+async def on_inline_done(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle Mark done under an ask shared inline (ak:id:<assignment_id>:<assignee_id>)."""
+    query = update.callback_query
+    user = update.effective_user
+    
+    _, _, assignment_id, assignee_id = query.data.split(':')
+    if user.id != int(assignee_id):
+        # Anyone in the chat the ask was shared to can see the button
+        await query.answer("Only the person this was asked of can mark it done.", show_alert=True)
+        return
+    
+    try:
+        now = datetime.utcnow().isoformat()
+        assignee_name = f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username or f"User {user.id}"
+        _, _, _, text, closed = await db_async.complete_assignment(
+            int(assignment_id), user.id, now, notify_name=assignee_name)
+        outbox.worker.wake()
+    except ValueError:
+        await query.answer("This ask no longer exists.", show_alert=True)
+        return
+    except Exception as e:
+        logger.error(f"Error marking assignment done inline: {e}")
+        await query.answer("Error updating assignment. Please try again.", show_alert=True)
+        return
+    
+    logger.info(f"User {user.id} completed assignment {assignment_id} inline")
+    await query.answer("Marked as done!")
+    suffix = " (Ask completed!)" if closed else ""
+    await query.edit_message_text(f"✅ {assignee_name} marked done: {text}{suffix}")
@@ -0,0 +1,162 @@
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import local_zone, settings
+import db_async
+from handlers.commands import is_private_chat, register_user_if_dm
+from handlers.groups import current_group
+from keyboards import reminder_asks, reminder_times
+import reminders
+
+logger = logging.getLogger(__name__)
+
+# Open asks offered by /remind without arguments
+MAX_REMINDER_ASKS = 10
+
+REMIND_USAGE = (
+    "Usage: /remind <ask id> <when>\n"
+    "When is 30m, 2h, 1d, 18:00, tomorrow, tomorrow 9:00 or 2025-01-31 09:00 "
+    f"({settings.TZ} time). Send /remind alone to pick an ask."
+)
+
+_RELATIVE = re.compile(r"^(\d+)\s*([mhd])$")
+_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+def _parse_when(text: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Parse a reminder time into a naive UTC datetime, or None if it is not understood.
+    
+    Accepts relative times (30m, 2h, 1d), a time of day (HH:MM, the next one to come),
+    "tomorrow [HH:MM]" and "YYYY-MM-DD HH:MM"; clock times are in settings.TZ.
+    """
+    zone = local_zone()
+    now = now or datetime.now(timezone.utc)
+    local_now = now.astimezone(zone)
+    text = text.strip().lower()
+    
+    match = _RELATIVE.match(text)
+    if match:
+        amount, unit = int(match.group(1)), match.group(2)
+        if amount <= 0:
+            return None
+        fire_at = now + timedelta(**{_UNITS[unit]: amount})
+        return fire_at.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    try:
+        if text.startswith("tomorrow"):
+            clock = text[len("tomorrow"):].strip() or "9:00"
+            day = local_now.date() + timedelta(days=1)
+            local = datetime.combine(day, datetime.strptime(clock, "%H:%M").time())
+        elif re.match(r"^\d{1,2}:\d{2}$", text):
+            local = datetime.combine(local_now.date(), datetime.strptime(text, "%H:%M").time())
+            if local.replace(tzinfo=zone) <= local_now:
+                local += timedelta(days=1)
+        else:
+            local = datetime.strptime(text, "%Y-%m-%d %H:%M")
+    except ValueError:
+        return None
+    
+    fire_at = local.replace(tzinfo=zone)
+    if fire_at <= local_now:
+        return None
+    return fire_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _format_local(fire_at_utc: datetime) -> str:
+    """A naive UTC time as shown to users, in the bot's timezone."""
+    return fire_at_utc.replace(tzinfo=timezone.utc).astimezone(local_zone()).strftime("%a %d %b %H:%M")
+
+
+async def _schedule(user_id: int, ask_id: int, when: str, send_func):
+    """Create the reminder for `when`, hand it to the scheduler and confirm it to the requester."""
+    fire_at = _parse_when(when)
+    if fire_at is None:
+        await send_func(f"I can't tell when '{when}' is, or it is in the past.\n\n{REMIND_USAGE}")
+        return
+    
+    try:
+        reminder_id, text, open_assignees = await db_async.create_reminder(ask_id, user_id, fire_at.isoformat())
+    except ValueError as e:
+        await send_func(f"{e}. You can only set reminders on your own open asks.")
+        return
+    except Exception as e:
+        logger.error(f"Error creating reminder: {e}")
+        await send_func("❌ Error setting the reminder. Please try again.")
+        return
+    
+    reminders.scheduler.add(fire_at.isoformat(), reminder_id)
+    logger.info(f"User {user_id} set reminder {reminder_id} on ask {ask_id}")
+    await send_func(
+        f"⏰ I'll remind {open_assignees} open assignee(s) of \"{text}\" on {_format_local(fire_at)} ({settings.TZ})."
+    )
+
+
+async def _show_reminder_asks(update: Update, context: ContextTypes.DEFAULT_TYPE, send_func):
+    """List the requester's open asks in the current group to pick one to remind about."""
+    chat_id = await current_group(update, context, "rm")
+    if chat_id is None:
+        return
+    
+    items = await db_async.get_requester_open_asks(chat_id, update.effective_user.id, MAX_REMINDER_ASKS)
+    if not items:
+        await send_func("You have no open asks to send reminders for.")
+        return
+    await send_func("Which ask should I send a reminder for?", reply_markup=reminder_asks(items))
+
+
+async def remind_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /remind [<ask id> <when>] - schedule a reminder to an ask's open assignees, DM only."""
+    chat_id = update.effective_chat.id
+    user_id = update.effective_user.id if update.effective_user else None
+    
+    logger.info(f"Remind command invoked - user_id: {user_id}, chat_id: {chat_id}")
+    
+    if not is_private_chat(update):
+        await update.message.reply_text(
+            "Please send me a direct message to set reminders! You can start by clicking here: @UsualSuspects_bot"
+        )
+        return
+    
+    await register_user_if_dm(update)
+    
+    if not context.args:
+        await _show_reminder_asks(update, context, update.message.reply_text)
+        return
+    
+    if len(context.args) < 2 or not context.args[0].isdigit():
+        await update.message.reply_text(REMIND_USAGE)
+        return
+    
+    await _schedule(user_id, int(context.args[0]), " ".join(context.args[1:]), update.message.reply_text)
+
+
+async def on_remind_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle choosing the group for /remind (ak:g:<chat_id>:rm)."""
+    query = update.callback_query
+    await query.answer()
+    await _show_reminder_asks(update, context, query.edit_message_text)
+
+
+async def on_remind_pick(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle picking an ask to remind about (ak:r:<ask_id>)."""
+    query = update.callback_query
+    await query.answer()
+    
+    ask_id = int(query.data.split(':')[2])
+    await query.edit_message_text(
+        f"When should I send the reminder? Pick a time, or send /remind {ask_id} <when>.",
+        reply_markup=reminder_times(ask_id)
+    )
+
+
+async def on_remind_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle picking a reminder time (ak:rt:<ask_id>:<when>)."""
+    query = update.callback_query
+    await query.answer()
+    
+    _, _, ask_id, when = query.data.split(':', 3)
+    await _schedule(update.effective_user.id, int(ask_id), when, query.edit_message_text)
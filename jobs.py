@@ -0,0 +1,51 @@
+import logging
+from datetime import datetime, timedelta
+from telegram.ext import ContextTypes
+
+import db
+import db_async
+import digest
+from config import local_zone, quiet_seconds_left, settings
+
+logger = logging.getLogger(__name__)
+
+
+async def flush_registrations(context: ContextTypes.DEFAULT_TYPE):
+    """Periodic job: write queued user registrations in a single transaction."""
+    try:
+        await db_async.flush_registrations()
+    except Exception as e:
+        logger.error(f"Error flushing registrations: {e}")
+
+
+async def send_daily_digest(context: ContextTypes.DEFAULT_TYPE):
+    """Daily job: DM every assignee what is still open for them, once QUIET_HOURS are over."""
+    wait = quiet_seconds_left(datetime.now(local_zone()), settings.QUIET_HOURS)
+    if wait:
+        context.job_queue.run_once(send_daily_digest, wait, name="daily_digest_after_quiet_hours")
+        logger.info(f"Daily digest held for {wait / 60:.0f} minutes of quiet hours")
+        return
+    try:
+        await digest.send_daily_digest()
+    except Exception as e:
+        logger.error(f"Error sending daily digest: {e}")
+
+
+async def run_retention(context: ContextTypes.DEFAULT_TYPE):
+    """Periodic job: move long-closed asks to the archive a batch at a time, then shrink the files."""
+    cutoff = (datetime.utcnow() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)).isoformat()
+    for shard in db.shards():
+        try:
+            archived = 0
+            if settings.ARCHIVE_AFTER_DAYS > 0:
+                # Each batch is its own transaction, so writes from handlers queue behind one batch at most
+                while True:
+                    moved = await db_async.archive_closed_asks(shard, cutoff, settings.ARCHIVE_BATCH_SIZE)
+                    archived += moved
+                    if moved < settings.ARCHIVE_BATCH_SIZE:
+                        break
+            freed = await db_async.incremental_vacuum(shard, settings.VACUUM_PAGES)
+            if archived or freed:
+                logger.info(f"Retention on shard {shard}: archived {archived} asks, freed {freed} pages")
+        except Exception as e:
+            logger.error(f"Error running retention on shard {shard}: {e}")
@@ -1,5 +1,11 @@
+from bisect import bisect_left
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
-from typing import List, Tuple, Set
+from typing import Dict, List, Tuple, Set, Sequence, Optional
+
+
+def clip(text: str, limit: int) -> str:
+    """Shorten text to limit characters for labels and list views."""
+    return text if len(text) <= limit else text[:limit - 1] + "…"
 
 
 def main_menu():
@@ -19,38 +25,125 @@ def main_menu_dm():
     ])
 
 
-def assignee_picker(roster: List[Tuple[int, str]], selected_ids: Set[int]):
-    """Create assignee picker keyboard with roster and selection state."""
-    keyboard = []
+class PickerIndex:
+    """Prebuilt assignee buttons and a name-prefix index for one roster version.
+    
+    Buttons are immutable, so each person's plain and ticked button is built once per roster
+    and every picker shares them; a toggle only looks up the row whose selection changed.
+    """
+    
+    MAX_ROWS = 4096
+    
+    def __init__(self, roster: Sequence[Tuple[int, str]]):
+        self.roster = roster
+        self._buttons: Dict[int, Tuple[InlineKeyboardButton, InlineKeyboardButton]] = {
+            user_id: (
+                InlineKeyboardButton(display_name, callback_data=f"ak:t:{user_id}"),
+                InlineKeyboardButton(f"✓ {display_name}", callback_data=f"ak:t:{user_id}"),
+            )
+            for user_id, display_name in roster
+        }
+        # Sorted (word, user_id) pairs over every word of every name, for bisect prefix lookups
+        self._words = sorted(
+            (word, user_id) for user_id, display_name in roster for word in set(display_name.casefold().split())
+        )
+        self._keys = [word for word, _ in self._words]
+        self._rows: Dict[tuple, Tuple[InlineKeyboardButton, ...]] = {}
     
-    # Add user buttons in rows of 2
-    for i in range(0, len(roster), 2):
-        row = []
-        for j in range(2):
-            if i + j < len(roster):
-                user_id, display_name = roster[i + j]
-                prefix = "✓ " if user_id in selected_ids else ""
-                label = f"{prefix}{display_name}"
-                row.append(InlineKeyboardButton(label, callback_data=f"ak:t:{user_id}"))
-        keyboard.append(row)
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._buttons
+    
+    def order(self, preferred: Sequence[int]) -> List[int]:
+        """Roster ids with `preferred` first, in the given order, then everyone else by name."""
+        first = [user_id for user_id in dict.fromkeys(preferred) if user_id in self._buttons]
+        seen = set(first)
+        return first + [user_id for user_id, _ in self.roster if user_id not in seen]
+    
+    def search(self, text: str, user_ids: Sequence[int]) -> List[int]:
+        """Ids from user_ids whose name has a word starting with each typed word, order kept."""
+        matches = None
+        for prefix in text.casefold().split():
+            hits = set()
+            i = bisect_left(self._keys, prefix)
+            while i < len(self._keys) and self._keys[i].startswith(prefix):
+                hits.add(self._words[i][1])
+                i += 1
+            matches = hits if matches is None else matches & hits
+        if matches is None:
+            return list(user_ids)
+        return [user_id for user_id in user_ids if user_id in matches]
+    
+    def row(self, user_ids: Sequence[int], selected_ids: Set[int]) -> Tuple[InlineKeyboardButton, ...]:
+        """One picker row for user_ids, shared between pickers with the same selection state."""
+        key = tuple((user_id, user_id in selected_ids) for user_id in user_ids)
+        row = self._rows.get(key)
+        if row is None:
+            if len(self._rows) >= self.MAX_ROWS:
+                self._rows.clear()
+            row = self._rows[key] = tuple(self._buttons[user_id][ticked] for user_id, ticked in key)
+        return row
+
+
+# group chat_id -> PickerIndex of that group's roster
+_picker_indexes: Dict[int, PickerIndex] = {}
+
+
+def picker_index(chat_id: int, roster: Sequence[Tuple[int, str]]) -> PickerIndex:
+    """The PickerIndex for a group's roster snapshot, rebuilt only when the roster changes."""
+    index = _picker_indexes.get(chat_id)
+    if index is None or index.roster is not roster:
+        if index is not None and index.roster == roster:
+            # Same people in a fresh snapshot (e.g. after a cold roster load): keep the built buttons
+            index.roster = roster
+        else:
+            index = _picker_indexes[chat_id] = PickerIndex(roster)
+    return index
+
+
+def assignee_picker(index: PickerIndex, user_ids: Sequence[int], selected_ids: Set[int], page: int = 0,
+                    page_size: int = 10, search: Optional[str] = None):
+    """Create one page of the assignee picker over user_ids (already ordered and filtered)."""
+    pages = max(1, -(-len(user_ids) // page_size))
+    page = min(max(page, 0), pages - 1)
+    shown = [user_id for user_id in user_ids[page * page_size:(page + 1) * page_size] if user_id in index]
+    
+    # People in rows of 2
+    keyboard = [index.row(shown[i:i + 2], selected_ids) for i in range(0, len(shown), 2)]
+    
+    if pages > 1:
+        nav_row = []
+        if page > 0:
+            nav_row.append(InlineKeyboardButton(f"◀️ {page}/{pages}", callback_data=f"ak:pg:{page - 1}"))
+        if page < pages - 1:
+            nav_row.append(InlineKeyboardButton(f"{page + 2}/{pages} ▶️", callback_data=f"ak:pg:{page + 1}"))
+        keyboard.append(nav_row)
+    
+    if search:
+        keyboard.append([InlineKeyboardButton(f"✖️ Clear search: {clip(search, 20)}", callback_data="ak:qc")])
     
     # Add control buttons
     control_row = []
     if selected_ids:
-        control_row.append(InlineKeyboardButton("➡️ Next", callback_data="ak:n"))
+        control_row.append(InlineKeyboardButton(f"➡️ Next ({len(selected_ids)})", callback_data="ak:n"))
     control_row.append(InlineKeyboardButton("❌ Cancel", callback_data="ak:c"))
     keyboard.append(control_row)
     
     return InlineKeyboardMarkup(keyboard)
 
 
-def asks_list(items: List[dict]):
-    """Create keyboard for My Asks list with Done buttons."""
-    if not items:
-        return InlineKeyboardMarkup([[
-            InlineKeyboardButton("🔄 Refresh", callback_data="ak:my")
-        ]])
-    
+def _page_nav(prefix: str, refresh_data: str, prev_cursor: Optional[int], next_cursor: Optional[int]) -> List[InlineKeyboardButton]:
+    """Prev / Refresh / Next row for a keyset-paginated list (callbacks <prefix>p:<id> and <prefix>n:<id>)."""
+    row = []
+    if prev_cursor is not None:
+        row.append(InlineKeyboardButton("◀️ Prev", callback_data=f"{prefix}p:{prev_cursor}"))
+    row.append(InlineKeyboardButton("🔄 Refresh", callback_data=refresh_data))
+    if next_cursor is not None:
+        row.append(InlineKeyboardButton("Next ▶️", callback_data=f"{prefix}n:{next_cursor}"))
+    return row
+
+
+def asks_list(items: List[dict], prev_cursor: Optional[int] = None, next_cursor: Optional[int] = None):
+    """Create keyboard for one page of My Asks with Done buttons and page navigation."""
     keyboard = []
     for item in items:
         # Truncate text if too long for button display
@@ -63,14 +156,28 @@ def asks_list(items: List[dict]):
             InlineKeyboardButton(label, callback_data=f"ak:d:{item['assignment_id']}")
         ])
     
-    # Add refresh button
-    keyboard.append([
-        InlineKeyboardButton("🔄 Refresh", callback_data="ak:my")
-    ])
+    # Add navigation + refresh row
+    keyboard.append(_page_nav("ak:m", "ak:my", prev_cursor, next_cursor))
     
     return InlineKeyboardMarkup(keyboard)
 
 
+def open_asks_nav(prev_cursor: Optional[int], next_cursor: Optional[int]):
+    """Create page navigation for All Open Asks, or None when everything fits on one page."""
+    if prev_cursor is None and next_cursor is None:
+        return None
+    return InlineKeyboardMarkup([_page_nav("ak:a", "ak:all", prev_cursor, next_cursor)])
+
+
+def search_nav(offset: int, page_size: int, more: bool):
+    """Create page navigation for /search results (ak:fp/ak:fn:<offset>), or None when they fit on one page."""
+    if offset == 0 and not more:
+        return None
+    prev_offset = max(offset - page_size, 0) if offset > 0 else None
+    next_offset = offset + page_size if more else None
+    return InlineKeyboardMarkup([_page_nav("ak:f", f"ak:fp:{offset}", prev_offset, next_offset)])
+
+
 def confirm_done(assignment_id: int):
     """Create confirmation keyboard for marking assignment done."""
     return InlineKeyboardMarkup([
@@ -81,6 +188,21 @@ def confirm_done(assignment_id: int):
     ])
 
 
+def inline_ask_done(assignment_id: int, assignee_id: int):
+    """Done button under an ask shared through an inline query; only the assignee may press it."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅ Mark done", callback_data=f"ak:id:{assignment_id}:{assignee_id}")]
+    ])
+
+
+def group_picker(groups: List[Tuple[int, Optional[str]]], action: str):
+    """Create keyboard for choosing which group an action (new/my/all/sw) applies to."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(title or f"Group {chat_id}", callback_data=f"ak:g:{chat_id}:{action}")]
+        for chat_id, title in groups
+    ])
+
+
 def ask_creation_confirm():
     """Create keyboard for confirming ask creation."""
     return InlineKeyboardMarkup([
@@ -89,3 +211,24 @@ def ask_creation_confirm():
             InlineKeyboardButton("❌ Cancel", callback_data="ak:c")
         ]
     ])
+
+
+# Quick choices on the reminder keyboard: (label, time as understood by /remind)
+REMINDER_TIMES = [("In 1 hour", "1h"), ("In 3 hours", "3h"), ("Tomorrow 9:00", "tomorrow 9:00"), ("In 1 day", "1d")]
+
+
+def reminder_asks(items: List[dict]):
+    """Create keyboard listing a requester's open asks to set a reminder on."""
+    keyboard = []
+    for item in items:
+        text = item['text']
+        if len(text) > 30:
+            text = text[:27] + "..."
+        keyboard.append([InlineKeyboardButton(f"⏰ {text}", callback_data=f"ak:r:{item['ask_id']}")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def reminder_times(ask_id: int):
+    """Create keyboard of reminder times for one ask, two per row."""
+    buttons = [InlineKeyboardButton(label, callback_data=f"ak:rt:{ask_id}:{when}") for label, when in REMINDER_TIMES]
+    return InlineKeyboardMarkup([buttons[i:i + 2] for i in range(0, len(buttons), 2)])
@@ -0,0 +1,278 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, ConversationHandler, TypeHandler
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond SQLite reads to slow Bot API calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    """Base for metrics rendered in the Prometheus text format; values are keyed by label values."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _labels(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._labels(labels)} {value}" for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for labels, counts in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                    lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{self._labels(labels)} {counts[-1]}")
+                lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+_registry: List[Metric] = []
+# Called before each scrape to refresh gauges whose value lives elsewhere (queue sizes etc.)
+_collectors: List[Callable[[], None]] = []
+
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Time spent in update handlers.", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Update handlers that raised.", ("handler",))
+HANDLERS_IN_FLIGHT = Gauge("bot_handlers_in_flight", "Update handlers currently running.", ("handler",))
+UPDATE_LAG = Histogram("bot_update_lag_seconds", "Age of incoming messages when handling starts.")
+UPDATE_QUEUE = Gauge("bot_update_queue_size", "Updates received but not yet picked up.")
+
+DB_SECONDS = Histogram("bot_db_seconds", "Time spent in db.py functions.", ("function",))
+DB_ERRORS = Counter("bot_db_errors_total", "db.py calls that raised.", ("function",))
+DB_IN_FLIGHT = Gauge("bot_db_in_flight", "db.py calls currently running.", ("function",))
+
+API_SECONDS = Histogram("bot_api_seconds", "Bot API HTTP round trips.", ("method",))
+API_RESPONSES = Counter("bot_api_responses_total", "Bot API responses by HTTP status.", ("method", "code"))
+API_ERRORS = Counter("bot_api_errors_total", "Bot API calls that failed without a response.", ("method",))
+API_IN_FLIGHT = Gauge("bot_api_in_flight", "Bot API requests currently in flight.", ("method",))
+OUTBOUND_PENDING = Gauge("bot_outbound_pending", "Deliveries tracked by the outbound dispatcher.")
+STARTUP_SECONDS = Gauge("bot_startup_seconds", "Time spent in each startup step of the running process.", ("step",))
+DIGEST_SECONDS = Gauge("bot_digest_seconds", "Time spent in each step of the last daily digest.", ("step",))
+DIGEST_MESSAGES = Gauge("bot_digest_messages", "Digests built and delivered by the last daily digest.", ("outcome",))
+
+
+def add_collector(collect: Callable[[], None]):
+    """Run collect() before every scrape, e.g. to set gauges from live objects."""
+    _collectors.append(collect)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    for collect in _collectors:
+        try:
+            collect()
+        except Exception as e:
+            logger.error(f"Error in metrics collector: {e}")
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+def timed(func: Callable, label: str, seconds: Histogram, errors: Counter, in_flight: Gauge) -> Callable:
+    """Wrap a sync or async function to record its latency, errors and concurrency under label."""
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            in_flight.inc(label)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                errors.inc(label)
+                raise
+            finally:
+                seconds.observe(time.perf_counter() - started, label)
+                in_flight.dec(label)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        in_flight.inc(label)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            errors.inc(label)
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - started, label)
+            in_flight.dec(label)
+    return wrapper
+
+
+def instrument_db(namespace: Dict[str, object], names: Iterable[str]):
+    """Replace the named db.py functions in its namespace with versions timed under bot_db_*."""
+    for name in names:
+        namespace[name] = timed(namespace[name], name, DB_SECONDS, DB_ERRORS, DB_IN_FLIGHT)
+
+
+def _handler_callbacks(handler) -> Iterable:
+    """Yield every leaf handler, descending into conversation states."""
+    if isinstance(handler, ConversationHandler):
+        for child in handler.entry_points + handler.fallbacks:
+            yield from _handler_callbacks(child)
+        for children in handler.states.values():
+            for child in children:
+                yield from _handler_callbacks(child)
+    else:
+        yield handler
+
+
+def instrument_handlers(app: Application):
+    """Time every handler registered on app, including those inside conversations."""
+    seen = set()
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            for leaf in _handler_callbacks(handler):
+                if id(leaf) in seen:
+                    continue
+                seen.add(id(leaf))
+                leaf.callback = timed(leaf.callback, leaf.callback.__name__,
+                                      HANDLER_SECONDS, HANDLER_ERRORS, HANDLERS_IN_FLIGHT)
+
+    async def observe_update(update: Update, context):
+        message = update.effective_message
+        if message is not None and message.date and not update.callback_query:
+            UPDATE_LAG.observe(max(0.0, time.time() - message.date.timestamp()))
+
+    app.add_handler(TypeHandler(Update, observe_update), group=-1)
+    add_collector(lambda: UPDATE_QUEUE.set(app.update_queue.qsize()))
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that records latency, status codes and failures per Bot API method."""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> Tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        API_IN_FLIGHT.inc(api_method)
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            API_ERRORS.inc(api_method)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - started, api_method)
+            API_IN_FLIGHT.dec(api_method)
+        API_RESPONSES.inc(api_method, str(code))
+        return code, payload
+
+
+class MetricsServer:
+    """Minimal asyncio HTTP server answering GET /metrics with render()."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Drain the headers; the request body, if any, is ignored
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", render().encode()
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logger.debug(f"Metrics request aborted: {e}")
+        finally:
+            writer.close()
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of Dispatcher.deliver()
+SENT = "sent"
+REJECTED = "rejected"    # Telegram refused it (blocked bot, bad chat); retrying won't help
+EXHAUSTED = "exhausted"  # transient errors outlasted the retries; worth trying again later
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursting up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated: Optional[float] = None
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        loop = asyncio.get_running_loop()
+        while True:
+            self._refill(loop.time())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Dispatcher:
+    """Outbound Bot API calls with bounded concurrency, Telegram rate limits and automatic retries."""
+
+    def __init__(self, concurrency: int, global_rate: float, chat_rate: float, max_retries: int):
+        self.concurrency = concurrency
+        self.chat_rate = chat_rate
+        self.max_retries = max_retries
+        self._bot: Optional[Bot] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._hold_until = 0.0
+        self._tasks: set = set()
+
+    def start(self, bot: Bot):
+        """Bind the dispatcher to the running bot."""
+        self._bot = bot
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def stop(self):
+        """Wait for in-flight deliveries so nothing is cut off mid-send."""
+        if self._tasks:
+            logger.info(f"Waiting for {len(self._tasks)} outbound deliveries")
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 1000:
+                # Idle chats have refilled completely; forgetting them loses nothing
+                now = asyncio.get_running_loop().time()
+                self._chats = {cid: b for cid, b in self._chats.items() if not b.is_full(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, 1)
+        return bucket
+
+    async def call(self, chat_id: int, func: Callable[[], Awaitable]) -> bool:
+        """Run one Bot API call for chat_id under the rate limits. Returns True on success."""
+        return (await self.deliver(chat_id, func))[0] == SENT
+
+    async def deliver(self, chat_id: int, func: Callable[[], Awaitable]) -> Tuple[str, Optional[str]]:
+        """Run one Bot API call for chat_id under the rate limits, retrying transient errors.
+
+        Returns (outcome, error) where outcome is SENT, REJECTED or EXHAUSTED.
+        """
+        error = None
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            # Per-chat pacing and flood holds are waited out before taking a slot, so a busy chat
+            # or a pause does not keep the other chats' sends from using the concurrency
+            await self._chat_bucket(chat_id).acquire()
+            hold = self._hold_until - loop.time()
+            if hold > 0:
+                await asyncio.sleep(hold)
+            async with self._semaphore:
+                # Taken next to the call, so sends queued on the semaphore cannot burst past the global rate
+                await self._global.acquire()
+                try:
+                    await func()
+                    return SENT, None
+                except RetryAfter as e:
+                    # Flood control applies to the whole bot, so pause every sender
+                    error = str(e)
+                    self._hold_until = max(self._hold_until, loop.time() + e.retry_after)
+                    logger.warning(f"Flood limit hit sending to {chat_id}; pausing {e.retry_after}s")
+                    continue
+                except (BadRequest, Forbidden) as e:
+                    logger.info(f"Could not deliver to {chat_id}: {e}")
+                    return REJECTED, str(e)
+                except NetworkError as e:
+                    error = str(e)
+                    delay = min(2 ** attempt, 30)
+                    logger.warning(f"Network error sending to {chat_id} (attempt {attempt + 1}): {e}")
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+        logger.error(f"Giving up on delivery to {chat_id} after {self.max_retries + 1} attempts")
+        return EXHAUSTED, error
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> bool:
+        """Send a message through the limiter. Returns True if delivered."""
+        return await self.call(chat_id, self._sender(chat_id, text, **kwargs))
+
+    def _sender(self, chat_id: int, text: str, **kwargs) -> Callable[[], Awaitable]:
+        return lambda: self._bot.send_message(chat_id=chat_id, text=text, **kwargs)
+
+    async def deliver_message(self, chat_id: int, text: str, **kwargs) -> Tuple[str, Optional[str]]:
+        """Send a message through the limiter and report the outcome, see deliver()."""
+        return await self.deliver(chat_id, self._sender(chat_id, text, **kwargs))
+
+    def _track(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def submit(self, chat_id: int, text: str, **kwargs) -> asyncio.Task:
+        """Fire-and-track: schedule a message and return the task resolving to its delivery result."""
+        return self._track(self.send_message(chat_id, text, **kwargs))
+
+    def submit_batch(
+        self,
+        messages: Iterable[Tuple[int, str]],
+        on_done: Optional[Callable[[int, int], Awaitable]] = None,
+        **kwargs,
+    ) -> asyncio.Task:
+        """Fire-and-track a batch of (chat_id, text) messages sent concurrently.
+
+        Extra keyword arguments go to every send_message call. When every message has
+        settled, on_done(delivered, total) is awaited.
+        """
+        messages = list(messages)
+
+        async def run():
+            results = await asyncio.gather(*(self.send_message(cid, text, **kwargs) for cid, text in messages))
+            delivered = sum(results)
+            if on_done:
+                try:
+                    await on_done(delivered, len(messages))
+                except Exception as e:
+                    logger.error(f"Error in delivery callback: {e}")
+            return delivered
+
+        return self._track(run())
+
+
+dispatcher = Dispatcher(
+    concurrency=settings.OUTBOUND_CONCURRENCY,
+    global_rate=settings.OUTBOUND_GLOBAL_RATE,
+    chat_rate=settings.OUTBOUND_CHAT_RATE,
+    max_retries=settings.OUTBOUND_MAX_RETRIES,
+)
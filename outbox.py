@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import db_async
+from config import settings
+from outbound import dispatcher, EXHAUSTED, SENT, REJECTED
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxWorker:
+    """Background task that drains the SQLite outbox through the dispatcher in batches.
+
+    Rows are only marked sent after Telegram accepts them, so a restart or outage
+    delays notifications instead of dropping them.
+    """
+
+    def __init__(self, batch_size: int, poll_seconds: float, max_attempts: int, retention_days: int):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.retention_days = retention_days
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._watchers: Dict[Tuple[str, int], List[Callable[[int, int], Awaitable]]] = {}
+
+    def start(self):
+        """Start draining; call once the event loop and dispatcher are running."""
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Finish the batch in flight and stop. Undelivered rows stay pending for the next start."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+
+    def wake(self):
+        """Drain now instead of waiting for the next poll, e.g. right after a write queued rows."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def watch(self, kind: str, ref_id: int, on_done: Callable[[int, int], Awaitable]):
+        """Await on_done(sent, total) once every notification for (kind, ref_id) has been attempted."""
+        self._watchers.setdefault((kind, ref_id), []).append(on_done)
+
+    @property
+    def watching(self) -> int:
+        return len(self._watchers)
+
+    def _backoff(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(30 * 2 ** attempts, 6 * 3600))
+
+    async def _send(self, chat_id: int, text: str) -> Tuple[str, Optional[str]]:
+        """Deliver one row; an unexpected error only sends that row back for a retry, not its whole batch."""
+        try:
+            return await dispatcher.deliver_message(chat_id, text)
+        except Exception as e:
+            logger.error(f"Error delivering outbox message to {chat_id}: {e}")
+            return EXHAUSTED, str(e)
+
+    async def _drain_batch(self) -> int:
+        """Deliver one batch of due rows and record the outcomes. Returns rows processed."""
+        now = datetime.utcnow()
+        rows = await db_async.get_outbox_batch(self.batch_size, now.isoformat())
+        if not rows:
+            return 0
+
+        results = await asyncio.gather(*(self._send(chat_id, text) for _, chat_id, text, _ in rows))
+
+        sent, failed, retry = [], [], []
+        now = datetime.utcnow()
+        for (outbox_id, chat_id, _, attempts), (outcome, error) in zip(rows, results):
+            if outcome == SENT:
+                sent.append(outbox_id)
+            elif outcome == REJECTED or attempts + 1 >= self.max_attempts:
+                failed.append((outbox_id, error))
+            else:
+                retry.append((outbox_id, error, (now + self._backoff(attempts)).isoformat()))
+        await db_async.record_outbox_results(sent, failed, retry, now.isoformat())
+
+        if failed or retry:
+            logger.info(f"Outbox batch: {len(sent)} sent, {len(failed)} failed, {len(retry)} to retry")
+        return len(rows)
+
+    async def _notify_watchers(self):
+        for key in list(self._watchers):
+            sent, unattempted, total = await db_async.get_outbox_progress(*key)
+            if unattempted:
+                continue
+            for on_done in self._watchers.pop(key):
+                try:
+                    await on_done(sent, total)
+                except Exception as e:
+                    logger.error(f"Error in outbox watcher for {key}: {e}")
+
+    async def _run(self):
+        try:
+            cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+            pruned = await db_async.prune_outbox(cutoff.isoformat())
+            if pruned:
+                logger.info(f"Pruned {pruned} delivered outbox rows")
+        except Exception as e:
+            logger.error(f"Error pruning outbox: {e}")
+
+        failures = 0
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                processed = await self._drain_batch()
+                if self._watchers:
+                    await self._notify_watchers()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                delay = min(2 ** failures, 300)
+                logger.error(f"Error draining outbox (retrying in {delay}s): {e}")
+                await asyncio.sleep(delay)
+                continue
+
+            if processed == self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+
+worker = OutboxWorker(
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_seconds=settings.OUTBOX_POLL_SECONDS,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+    retention_days=settings.OUTBOX_RETENTION_DAYS,
+)
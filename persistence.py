@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import pickle
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import db_async
+
+logger = logging.getLogger(__name__)
+
+
+class SQLitePersistence(BasePersistence):
+    """Keeps user_data and conversation states in the bot's SQLite database across restarts.
+    
+    PTB hands over changed entries every update_interval seconds; they are compared with
+    what is stored and the ones that really changed are written right after that run, in
+    one transaction, so button presses never wait on a commit.
+    """
+
+    def __init__(self, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        # What the database holds, as last loaded or flushed
+        self._saved_users: Dict[int, bytes] = {}
+        self._saved_conversations: Dict[Tuple[str, str], str] = {}
+        # Changes waiting for the next flush; None marks a row to delete
+        self._dirty_users: Dict[int, Optional[bytes]] = {}
+        self._dirty_conversations: Dict[Tuple[str, str], Optional[str]] = {}
+        self._writing: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        """Entries changed since the last flush."""
+        return len(self._dirty_users) + len(self._dirty_conversations)
+
+    @staticmethod
+    def _stage(dirty: Dict, saved: Dict, key, value):
+        """Mark key dirty unless value is what is already staged or stored."""
+        if value == saved.get(key):
+            dirty.pop(key, None)
+        else:
+            dirty[key] = value
+
+    def _write_soon(self):
+        """Write what is staged once PTB's current run has handed over every change.
+
+        PTB calls the update_* methods of one run concurrently and none of them awaits, so a
+        task created by the first one starts after the last.
+        """
+        if self.pending and (self._writing is None or self._writing.done()):
+            self._writing = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        rows = await db_async.load_persisted_user_data()
+        self._saved_users = dict(rows)
+        user_data = {}
+        for user_id, data in rows:
+            try:
+                user_data[user_id] = pickle.loads(data)
+            except Exception as e:
+                logger.warning(f"Dropping unreadable user_data of user {user_id}: {e}")
+        logger.info(f"Restored user_data of {len(user_data)} users")
+        return user_data
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[Tuple[int, ...], object]:
+        rows = await db_async.load_persisted_conversations(name)
+        conversations = {}
+        for key, state in rows:
+            self._saved_conversations[(name, key)] = state
+            conversations[tuple(json.loads(key))] = json.loads(state)
+        logger.info(f"Restored {len(conversations)} open '{name}' conversations")
+        return conversations
+
+    async def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]) -> None:
+        state = None if new_state is None else json.dumps(new_state)
+        self._stage(self._dirty_conversations, self._saved_conversations, (name, json.dumps(list(key))), state)
+        self._write_soon()
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        self._stage(self._dirty_users, self._saved_users, user_id,
+                    pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL) if data else None)
+        self._write_soon()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._stage(self._dirty_users, self._saved_users, user_id, None)
+        self._write_soon()
+
+    async def update_chat_data(self, chat_id: int, data: Any) -> None:
+        pass
+
+    async def update_bot_data(self, data: Any) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Any) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Write what is still staged after any write under way; PTB calls this on shutdown."""
+        if self._writing is not None:
+            await asyncio.gather(self._writing, return_exceptions=True)
+        await self._write_staged()
+
+    async def _write_pending(self) -> None:
+        # Changes staged while a write is in flight go out in the next pass
+        while self.pending and await self._write_staged():
+            pass
+
+    async def _write_staged(self) -> bool:
+        """Write every staged change in a single transaction; on failure they stay staged for the next try."""
+        if not self.pending:
+            return True
+        users, self._dirty_users = self._dirty_users, {}
+        conversations, self._dirty_conversations = self._dirty_conversations, {}
+        try:
+            await db_async.save_persisted_state(
+                list(users.items()),
+                [(name, key, state) for (name, key), state in conversations.items()],
+            )
+        except Exception as e:
+            logger.error(f"Error flushing {len(users) + len(conversations)} persisted entries: {e}")
+            # Changes staged while the write was failing are newer; keep those
+            for user_id, data in users.items():
+                self._dirty_users.setdefault(user_id, data)
+            for key, state in conversations.items():
+                self._dirty_conversations.setdefault(key, state)
+            return False
+        
+        for saved, written in ((self._saved_users, users), (self._saved_conversations, conversations)):
+            for key, value in written.items():
+                if value is None:
+                    saved.pop(key, None)
+                else:
+                    saved[key] = value
+        logger.debug(f"Flushed {len(users)} user_data and {len(conversations)} conversation changes")
+        return True
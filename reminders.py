@@ -0,0 +1,123 @@
+import heapq
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from telegram.ext import ContextTypes, Job, JobQueue
+
+import db_async
+from config import local_zone, quiet_seconds_left, settings
+import outbox
+
+logger = logging.getLogger(__name__)
+
+# Delay before retrying after the database could not be reached
+RETRY_SECONDS = 30
+
+
+class ReminderScheduler:
+    """Fires reminders from a min-heap holding only the next `window` pending ones.
+
+    Every reminder at or before `horizon` is in the heap; later ones stay in SQLite and are
+    loaded when the heap drains below half a window. A single JobQueue job is kept armed for
+    the soonest reminder and fires every due one in a batch.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._heap: List[Tuple[str, int]] = []
+        # fire_at of the last reminder loaded when the window was full; None means all are loaded
+        self._horizon: Optional[str] = None
+        # Reminders added while a refill is reading, so the reloaded heap cannot miss them
+        self._added: Optional[List[Tuple[str, int]]] = None
+        # Set after a failed batch: the heap may have lost due reminders and is reloaded first
+        self._stale = False
+        self._job_queue: Optional[JobQueue] = None
+        self._job: Optional[Job] = None
+
+    @property
+    def pending(self) -> int:
+        """Reminders currently held in memory."""
+        return len(self._heap)
+
+    async def start(self, job_queue: JobQueue):
+        """Load the first window and arm the job; call once the application is running."""
+        self._job_queue = job_queue
+        await self._refill()
+        self._arm()
+        logger.info(f"Reminder scheduler started with {len(self._heap)} pending reminders in memory")
+
+    def add(self, fire_at: str, reminder_id: int):
+        """Track a reminder that was just written to SQLite."""
+        if self._added is not None:
+            self._added.append((fire_at, reminder_id))
+        if self._horizon is not None and fire_at > self._horizon:
+            # Beyond the loaded window; a later refill picks it up in order
+            return
+        heapq.heappush(self._heap, (fire_at, reminder_id))
+        if self._heap[0] == (fire_at, reminder_id):
+            self._arm()
+
+    async def _refill(self):
+        """Reload the next window of pending reminders from SQLite."""
+        self._added = []
+        try:
+            rows = await db_async.get_pending_reminders(self.window)
+            horizon = rows[-1][0] if len(rows) >= self.window else None
+            entries = set(rows)
+            entries.update(entry for entry in self._added if horizon is None or entry[0] <= horizon)
+        finally:
+            self._added = None
+        self._heap = list(entries)
+        heapq.heapify(self._heap)
+        self._horizon = horizon
+        self._stale = False
+
+    def _arm(self, delay: Optional[float] = None):
+        """(Re)schedule the single firing job for the soonest reminder, or after `delay` seconds."""
+        if self._job_queue is None:
+            return
+        if self._job is not None:
+            self._job.schedule_removal()
+            self._job = None
+        if delay is None:
+            if not self._heap:
+                return
+            due = datetime.fromisoformat(self._heap[0][0])
+            delay = max(0.0, (due - datetime.utcnow()).total_seconds())
+        self._job = self._job_queue.run_once(self._fire, delay, name="fire_reminders")
+
+    async def _fire(self, context: ContextTypes.DEFAULT_TYPE):
+        """Job callback: fire every due reminder in one batch, refill if needed and re-arm."""
+        self._job = None
+        try:
+            if self._stale:
+                await self._refill()
+            quiet = quiet_seconds_left(datetime.now(local_zone()), settings.QUIET_HOURS)
+            if quiet:
+                # Due reminders stay in the heap and fire together when QUIET_HOURS end
+                self._arm(quiet)
+                return
+            now = datetime.utcnow().isoformat()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[1])
+
+            if due:
+                queued = await db_async.fire_reminders(due, now)
+                logger.info(f"Fired {len(due)} reminders, {queued} notifications queued")
+                if queued:
+                    outbox.worker.wake()
+            if self._horizon is not None and len(self._heap) <= self.window // 2:
+                await self._refill()
+        except Exception as e:
+            logger.error(f"Error firing reminders: {e}")
+            # Popped reminders are still pending in SQLite; reload them on the retry
+            self._stale = True
+            self._arm(RETRY_SECONDS)
+            return
+
+        self._arm()
+
+
+scheduler = ReminderScheduler(settings.REMINDER_WINDOW)
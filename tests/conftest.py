@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+# config reads the environment on import; the tests never reach Telegram
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+# Helpers shared by the test modules; they run against whichever database fixture is active
+CHAT = -100
+
+
+def make_ask(text="buy milk", assignees=((2, "Bea"), (3, "Cy")), chat_id=CHAT, requester=(1, "Al"),
+             notify=False) -> int:
+    return db.create_ask(chat_id, requester[0], requester[1], text, list(assignees), notify=notify)
+
+
+def assignment_of(ask_id: int, assignee_id: int) -> int:
+    with db.get_pool(db.shard_of_id(ask_id)).read() as conn:
+        return conn.execute("SELECT id FROM ask_assignees WHERE ask_id = ? AND assignee_id = ?",
+                            (ask_id, assignee_id)).fetchone()[0]
+
+
+def close(ask_id: int, when: str):
+    """Close an ask made with make_ask's default assignees."""
+    for assignee_id in (2, 3):
+        db.complete_assignment(assignment_of(ask_id, assignee_id), assignee_id, when)
+
+
+@pytest.fixture
+def unopened_database(tmp_path, monkeypatch):
+    """db.py pointed at tmp_path/bot.db, not created yet, with its in-memory caches reset around it."""
+    db.close_pool()
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(db, "_directory", None)
+    monkeypatch.setattr(db, "_known_users", None)
+    monkeypatch.setattr(db, "_pending_users", {})
+    monkeypatch.setattr(db, "_rosters", {})
+    monkeypatch.setattr(db, "open_ask_index", db.OpenAskIndex())
+    yield db
+    db.close_pool()
+
+
+@pytest.fixture
+def database(unopened_database):
+    """A freshly migrated database in tmp_path."""
+    unopened_database.init_db()
+    unopened_database.run_online_migrations()
+    return unopened_database
+
+
+@pytest.fixture
+def sharded(database, monkeypatch):
+    """The database with DB_SHARDS=2: chat -2 lives on shard 0, chat -3 on shard 1."""
+    monkeypatch.setattr(database.settings, "DB_SHARDS", 2)
+    database.init_db()
+    database.run_online_migrations()
+    return database
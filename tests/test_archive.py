@@ -0,0 +1,17 @@
+from conftest import close, make_ask
+
+
+def test_archive_moves_only_long_closed_asks(database):
+    old, recent, still_open = make_ask("old"), make_ask("recent"), make_ask("open")
+    close(old, "2000-01-01")
+    close(recent, "2000-06-01")
+
+    assert database.archive_closed_asks(0, "2000-03-01", limit=10) == 1
+    assert database.archive_closed_asks(0, "2000-03-01", limit=10) == 0
+    with database.get_pool().read() as conn:
+        assert [row[0] for row in conn.execute("SELECT id FROM asks ORDER BY id")] == [recent, still_open]
+        assert conn.execute("SELECT id, status FROM asks_archive").fetchall() == [(old, "closed")]
+        assert sorted(conn.execute("SELECT assignee_id, status FROM ask_assignees_archive")) == [
+            (2, "done"), (3, "done")]
+        assert conn.execute("SELECT COUNT(*) FROM ask_assignees WHERE ask_id = ?", (old,)).fetchone()[0] == 0
+    assert database.verify_open_ask_summary() == []
@@ -0,0 +1,195 @@
+import sqlite3
+import threading
+
+import pytest
+
+from conftest import CHAT, assignment_of, make_ask
+
+
+# Connection pool
+
+def test_pool_serializes_writes_from_many_threads(database):
+    pool = database.get_pool()
+    with pool.write() as conn:
+        conn.execute("CREATE TABLE counter (n INTEGER NOT NULL)")
+        conn.execute("INSERT INTO counter VALUES (0)")
+
+    def bump():
+        for _ in range(50):
+            # Read-modify-write: only correct if no other transaction runs in between
+            with pool.write() as conn:
+                n = conn.execute("SELECT n FROM counter").fetchone()[0]
+                conn.execute("UPDATE counter SET n = ?", (n + 1,))
+
+    threads = [threading.Thread(target=bump) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with pool.read() as conn:
+        assert conn.execute("SELECT n FROM counter").fetchone()[0] == 400
+
+
+def test_pool_rolls_back_a_failed_write_and_readers_are_read_only(database):
+    pool = database.get_pool()
+    with pytest.raises(RuntimeError):
+        with pool.write() as conn:
+            conn.execute("INSERT INTO users (user_id, display_name, created_at) VALUES (9, 'Nine', 'now')")
+            raise RuntimeError("boom")
+
+    with pool.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM users WHERE user_id = 9").fetchone()[0] == 0
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM users")
+    # The writer is usable again
+    with pool.write() as conn:
+        conn.execute("INSERT INTO users (user_id, display_name, created_at) VALUES (9, 'Nine', 'now')")
+
+
+# Creating and completing asks
+
+def test_complete_assignment_closes_the_ask_after_the_last_one(database):
+    ask_id = make_ask()
+    first, second = assignment_of(ask_id, 2), assignment_of(ask_id, 3)
+
+    assert database.complete_assignment(first, 2, "t1") == (ask_id, 1, "Al", "buy milk", False)
+    assert database.complete_assignment(second, 3, "t2") == (ask_id, 1, "Al", "buy milk", True)
+    with database.get_pool().read() as conn:
+        assert conn.execute("SELECT status, closed_at, open_assignees FROM asks WHERE id = ?",
+                            (ask_id,)).fetchone() == ("closed", "t2", 0)
+
+
+def test_completing_twice_changes_nothing(database):
+    ask_id = make_ask(notify=True)
+    assignment_id = assignment_of(ask_id, 2)
+
+    database.complete_assignment(assignment_id, 2, "t1", notify_name="Bea")
+    again = database.complete_assignment(assignment_id, 2, "t2", notify_name="Bea")
+
+    assert again == (ask_id, 1, "Al", "buy milk", False)
+    with database.get_pool().read() as conn:
+        assert conn.execute("SELECT open_assignees FROM asks WHERE id = ?", (ask_id,)).fetchone()[0] == 1
+        assert conn.execute("SELECT done_at FROM ask_assignees WHERE id = ?", (assignment_id,)).fetchone()[0] == "t1"
+        # One "done" notification to the requester, not two
+        assert conn.execute("SELECT COUNT(*) FROM outbox WHERE kind = 'done'").fetchone()[0] == 1
+
+
+def test_only_the_assignee_can_complete_or_see_an_assignment(database):
+    ask_id = make_ask()
+    assignment_id = assignment_of(ask_id, 2)
+    database.complete_assignment(assignment_id, 2, "t1")
+
+    for user_id in (3, 99):
+        with pytest.raises(ValueError, match="not found"):
+            database.complete_assignment(assignment_id, user_id, "t2")
+    with pytest.raises(ValueError, match="not found"):
+        database.complete_assignment(assignment_id + 1000, 2, "t2")
+
+
+# Open ask summary
+
+def test_summary_triggers_follow_every_write(database):
+    first = make_ask("buy milk")
+    second = make_ask("fix bike", assignees=[(2, "Bea")])
+    assert database.verify_open_ask_summary() == []
+
+    database.complete_assignment(assignment_of(first, 3), 3, "t1")
+    database.complete_assignment(assignment_of(second, 2), 2, "t1")
+    assert database.verify_open_ask_summary() == []
+
+    [item] = database.get_all_open_asks(CHAT)
+    assert item["ask_id"] == first
+    assert item["assignees"] == [("Bea", "open"), ("Cy", "done")]
+
+
+def test_summary_verification_finds_drift_and_rebuild_repairs_it(database):
+    kept, edited, dropped = make_ask("a"), make_ask("b"), make_ask("c")
+    with database.get_pool().write() as conn:
+        conn.execute("UPDATE open_ask_summary SET text = 'changed' WHERE ask_id = ?", (edited,))
+        conn.execute("DELETE FROM open_ask_summary WHERE ask_id = ?", (dropped,))
+        conn.execute("INSERT INTO open_ask_summary SELECT ask_id + 1000, chat_id, created_at, text, requester_name, "
+                     "assignees_json FROM open_ask_summary WHERE ask_id = ?", (kept,))
+
+    assert sorted(database.verify_open_ask_summary()) == sorted([
+        ("mismatch", edited), ("missing", dropped), ("stale", kept + 1000)])
+    database.rebuild_open_ask_summary()
+    assert database.verify_open_ask_summary() == []
+
+
+# Keyset paging
+
+def _walk(fetch):
+    """Follow next_cursor to the end, then prev_cursor back; returns the ask ids of each page."""
+    pages = [fetch()]
+    while pages[-1].next_cursor is not None:
+        pages.append(fetch(before=pages[-1].next_cursor))
+    back = [pages[-1]]
+    while back[-1].prev_cursor is not None:
+        back.append(fetch(after=back[-1].prev_cursor))
+    ids = lambda page: [item["ask_id"] for item in page.items]
+    return [ids(page) for page in pages], [ids(page) for page in reversed(back)], pages
+
+
+@pytest.mark.parametrize("kind", ["open asks", "my assignments"])
+def test_keyset_pages_walk_both_ways(database, kind):
+    ask_ids = [make_ask(f"ask {n}") for n in range(7)]
+    newest_first = ask_ids[::-1]
+    if kind == "open asks":
+        fetch = lambda **cursor: database.page_open_asks(CHAT, 3, **cursor)
+    else:
+        fetch = lambda **cursor: database.page_my_open_assignments(CHAT, 2, 3, **cursor)
+
+    forward, backward, pages = _walk(fetch)
+
+    assert forward == [newest_first[0:3], newest_first[3:6], newest_first[6:7]]
+    assert backward == forward
+    assert pages[0].prev_cursor is None and pages[-1].next_cursor is None
+
+
+def test_keyset_page_of_an_empty_list(database):
+    assert database.page_open_asks(CHAT, 3) == database.Page([], None, None)
+
+
+# Sharding and id allocation
+
+def test_ids_carry_their_shard(sharded):
+    home = make_ask(chat_id=-2)
+    away = make_ask(chat_id=-3)
+
+    assert sharded.shard_of_id(home) == 0
+    assert sharded.shard_of_id(away) == 1
+    assert away == (1 << sharded.SHARD_ID_BITS) + 1
+    assert sharded.shard_of_id(assignment_of(away, 2)) == 1
+    assert sharded.complete_assignment(assignment_of(away, 2), 2, "t1")[0] == away
+
+
+def test_ids_are_consecutive_and_never_reused(sharded):
+    first = make_ask(chat_id=-3)
+    second = make_ask(chat_id=-3)
+    with sharded.get_pool(1).write() as conn:
+        conn.execute("DELETE FROM asks WHERE id = ?", (second,))
+
+    assert second == first + 1
+    assert make_ask(chat_id=-3) == second + 1
+
+
+def test_groups_stay_on_their_shard_when_shards_are_reduced(sharded, monkeypatch):
+    away = make_ask(chat_id=-3)
+    monkeypatch.setattr(sharded.settings, "DB_SHARDS", 1)
+    sharded.init_db()
+
+    assert sharded.shards() == [0, 1]
+    assert sharded.shard_for_chat(-3) == 1
+    assert [item["ask_id"] for item in sharded.get_all_open_asks(-3)] == [away]
+
+
+def test_made_up_ids_do_not_open_shards(sharded, tmp_path):
+    junk = (7 << sharded.SHARD_ID_BITS) + 1
+
+    with pytest.raises(ValueError, match="not found"):
+        sharded.complete_assignment(junk, 2, "t1")
+    with pytest.raises(ValueError, match="not found"):
+        sharded.create_reminder(junk, 1, "t1")
+    assert not (tmp_path / "bot.shard7.db").exists()
+    assert sharded.shards() == [0, 1]
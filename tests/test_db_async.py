@@ -0,0 +1,61 @@
+import asyncio
+import threading
+
+import db
+import db_async
+
+
+def test_multi_shard_writes_run_on_each_shards_writer(sharded, monkeypatch):
+    home = sharded.create_ask(-2, 1, "Al", "buy milk", [(2, "Bea")])
+    away = sharded.create_ask(-3, 1, "Al", "fix bike", [(2, "Bea")])
+    reminders = [sharded.create_reminder(ask_id, 1, "2000-01-01")[0] for ask_id in (home, away)]
+    threads = []
+    for name in ("fire_reminders", "record_outbox_results", "prune_outbox"):
+        def spy(*args, func=getattr(db, name), name=name):
+            threads.append((name, threading.current_thread().name))
+            return func(*args)
+        monkeypatch.setattr(db, name, spy)
+
+    async def run():
+        queued = await db_async.fire_reminders(reminders, "2000-01-02")
+        due = [row[0] for row in db.get_outbox_batch(10, "2100-01-01") if row[2].startswith("⏰")]
+        await db_async.record_outbox_results(due, [], [], "2000-01-02")
+        pruned = await db_async.prune_outbox("2100-01-01")
+        return queued, pruned
+
+    assert asyncio.run(run()) == (2, 2)
+    assert sorted(threads) == sorted(
+        (name, f"db-writer-{shard}_0") for name in ("fire_reminders", "record_outbox_results", "prune_outbox")
+        for shard in (0, 1)
+    )
+
+
+def test_writes_for_unknown_shards_start_no_writer(database):
+    junk = (7 << db.SHARD_ID_BITS) + 1
+
+    async def run():
+        try:
+            await db_async.complete_assignment(junk, 2, "t1")
+        except ValueError:
+            return True
+
+    assert asyncio.run(run())
+    assert 7 not in db_async._writers
+
+
+def test_a_new_groups_directory_row_is_written_by_shard_0s_writer(sharded, monkeypatch):
+    threads = []
+    for name in ("_ensure_group", "create_ask"):
+        def spy(*args, func=getattr(db, name), name=name):
+            threads.append((name, threading.current_thread().name))
+            return func(*args)
+        monkeypatch.setattr(db, name, spy)
+    monkeypatch.setattr(db_async, "_create_ask", db_async._write(
+        db.create_ask, shard_of=lambda chat_id, *args, **kwargs: db.shard_for_chat(chat_id)))
+
+    async def run():
+        return await db_async.create_ask(-5, 1, "Al", "fix bike", [(2, "Bea")])
+
+    ask_id = asyncio.run(run())
+    assert db.shard_of_id(ask_id) == 1 and db.is_known_group(-5)
+    assert threads == [("_ensure_group", "db-writer-0_0"), ("create_ask", "db-writer-1_0")]
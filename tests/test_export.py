@@ -0,0 +1,55 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+import export
+from conftest import CHAT, close, make_ask
+
+
+def ask_ids(rows):
+    return [row[0] for row in rows]
+
+
+def test_export_merges_hot_and_archived_asks_in_id_order(database):
+    first, archived, last = make_ask("first"), make_ask("archived"), make_ask("last", assignees=[])
+    close(archived, "2000-01-01")
+    assert database.archive_closed_asks(0, "2000-03-01", limit=10) == 1
+    elsewhere = make_ask("elsewhere", chat_id=-200)
+
+    rows = list(database.iter_export_rows(CHAT))
+
+    # One row per assignee, and one with NULL assignee columns for an ask without any
+    assert ask_ids(rows) == [first, first, archived, archived, last]
+    assert [(row[5], row[11]) for row in rows[2:4]] == [("closed", "done"), ("closed", "done")]
+    assert rows[-1][8:] == (None, None, None, None, None)
+    assert ask_ids(database.iter_export_rows(CHAT, {0: archived})) == [last]
+    assert ask_ids(database.iter_export_rows()) == [first, first, archived, archived, last, elsewhere, elsewhere]
+
+
+@pytest.mark.parametrize("fmt", export.FORMATS)
+def test_write_export_moves_the_cursor_past_every_ask(database, fmt):
+    first, second = make_ask("first"), make_ask("a, \"quoted\" ask", assignees=[(2, "Bea")])
+    out = io.BytesIO()
+
+    stats = export.write_export(database.iter_export_rows(CHAT), out, fmt, compress=True, since={1: 5})
+
+    assert stats == export.ExportStats(3, 2, {0: second, 1: 5})
+    text = gzip.decompress(out.getvalue()).decode()
+    if fmt == "csv":
+        records = [dict(zip(export.EXPORT_COLUMNS, row)) for row in list(csv.reader(io.StringIO(text)))[1:]]
+    else:
+        records = [json.loads(line) for line in text.splitlines()]
+    assert [str(record["ask_id"]) for record in records] == [str(first), str(first), str(second)]
+    assert records[-1]["text"] == 'a, "quoted" ask'
+
+
+def test_cursor_round_trips_through_its_text(database):
+    cursor = {0: 7, 1: (1 << database.SHARD_ID_BITS) + 3}
+
+    assert export.parse_cursor(export.format_cursor(cursor)) == cursor
+    assert export.parse_cursor(" \n") == {}
+    with pytest.raises(ValueError, match="Invalid export cursor"):
+        export.parse_cursor("7,x")
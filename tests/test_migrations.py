@@ -0,0 +1,55 @@
+import asyncio
+
+import db
+import db_async
+from conftest import make_ask
+
+
+def progress():
+    with db.get_pool().read() as conn:
+        return conn.execute("SELECT version, cursor FROM migration_progress").fetchall()
+
+
+def test_online_migration_resumes_from_its_saved_cursor(database, monkeypatch):
+    monkeypatch.setattr(database, "SEARCH_BACKFILL_BATCH", 2)
+    ask_ids = [make_ask(f"groceries {n}") for n in range(5)]
+    backfill = database.MIGRATIONS[-1]
+    cursors = []
+
+    def batch(conn, shard, cursor):
+        cursors.append(cursor)
+        return backfill.batch(conn, shard, cursor)
+
+    monkeypatch.setattr(database, "MIGRATIONS", database.MIGRATIONS[:-1] + [backfill._replace(batch=batch)])
+    # As if the asks predate the search index
+    with database.get_pool().write() as conn:
+        conn.execute("DELETE FROM asks_fts")
+        conn.execute(f"PRAGMA user_version = {database.MIGRATIONS[-2].version}")
+
+    # Stopped after the first batch, e.g. by a shutdown
+    assert not database.run_online_migrations(should_stop=lambda: len(cursors) == 1)
+    assert progress() == [(backfill.version, ask_ids[1])]
+    assert database.pending_migrations() == {0: [backfill.version]}
+
+    assert database.run_online_migrations()
+    assert cursors == [None, ask_ids[1], ask_ids[3], ask_ids[4]]
+    assert progress() == []
+    assert database.schema_version() == backfill.version
+    assert len(database.search_asks(-100, "groceries", 10)[0]) == 5
+
+
+def test_pending_migrations_reads_each_shards_version_once(sharded, monkeypatch):
+    reads = []
+    schema_version = sharded.schema_version
+    monkeypatch.setattr(sharded, "schema_version", lambda shard=0: reads.append(shard) or schema_version(shard))
+
+    assert sharded.pending_migrations() == {0: [], 1: []}
+    assert reads == [0, 1]
+
+
+def test_start_online_migrations_does_nothing_when_current(database):
+    async def run():
+        await db_async.start_online_migrations()
+        return db_async._migrations
+
+    assert asyncio.run(run()) is None
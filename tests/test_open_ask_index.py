@@ -0,0 +1,42 @@
+import db
+from conftest import assignment_of, make_ask
+
+
+def indexed(user_id: int, query: str = ""):
+    return [(ask.ask_id, assignment_id) for ask, assignment_id in db.open_ask_index.search(user_id, query, 10)[0]]
+
+
+def test_index_follows_creates_and_completions(database):
+    milk = make_ask("Buy oat milk")
+    epee = make_ask("Repair the épée", assignees=[(2, "Bea")])
+
+    assert indexed(2) == [(epee, assignment_of(epee, 2)), (milk, assignment_of(milk, 2))]
+    assert indexed(2, "EPE") == [(epee, assignment_of(epee, 2))]
+    # Requesters hold their asks to share them, without an assignment
+    assert indexed(1, "al milk") == [(milk, None)]
+
+    database.complete_assignment(assignment_of(milk, 2), 2, "t1")
+    assert indexed(2) == [(epee, assignment_of(epee, 2))]
+    assert indexed(1, "milk") == [(milk, None)]
+    database.complete_assignment(assignment_of(milk, 3), 3, "t2")
+    assert indexed(1) == [(epee, None)] and indexed(3) == []
+
+
+def test_index_load_replays_changes_made_while_reading(database):
+    kept, done = make_ask("kept"), make_ask("done", assignees=[(2, "Bea")])
+    database.open_ask_index.load(lambda: [])
+    assert len(database.open_ask_index) == 0
+    added = []
+
+    def read():
+        rows = list(database._read_open_asks())
+        # Written after the read saw SQLite but before the index is swapped in
+        database.complete_assignment(assignment_of(done, 2), 2, "t1")
+        added.append(make_ask("added", assignees=[(3, "Cy")]))
+        return rows
+
+    database.open_ask_index.load(read)
+    assert len(database.open_ask_index) == 2
+    assert indexed(1) == [(added[0], None), (kept, None)]
+    assert indexed(3) == [(added[0], assignment_of(added[0], 3)), (kept, assignment_of(kept, 3))]
+    assert indexed(2) == [(kept, assignment_of(kept, 2))]
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+import db
+import outbox
+from outbound import EXHAUSTED, REJECTED, SENT, dispatcher
+
+# Delivery outcome per assignee
+OUTCOMES = {2: (SENT, None), 3: (REJECTED, "Forbidden: bot was blocked by the user"), 4: (EXHAUSTED, "Timed out")}
+
+
+def outbox_rows():
+    with db.get_pool().read() as conn:
+        return {chat_id: (status, attempts, last_error, next_attempt_at) for chat_id, status, attempts, last_error,
+                next_attempt_at in conn.execute("SELECT chat_id, status, attempts, last_error, next_attempt_at "
+                                                "FROM outbox")}
+
+
+def test_outbox_rows_move_through_sent_failed_and_retry(database, monkeypatch):
+    async def deliver_message(chat_id, text):
+        return OUTCOMES[chat_id]
+
+    monkeypatch.setattr(dispatcher, "deliver_message", deliver_message)
+    worker = outbox.OutboxWorker(batch_size=10, poll_seconds=1, max_attempts=2, retention_days=7)
+    ask_id = database.create_ask(-100, 1, "Al", "buy milk", [(2, "Bea"), (3, "Cy"), (4, "Di")], notify=True)
+    assert database.get_outbox_progress("ask", ask_id) == (0, 3, 3)
+
+    assert asyncio.run(worker._drain_batch()) == 3
+    rows = outbox_rows()
+    assert rows[2][:3] == ("sent", 1, None)
+    assert rows[3][:3] == ("failed", 1, OUTCOMES[3][1])
+    assert rows[4][:3] == ("pending", 1, "Timed out")
+    # Backed off, so the next drain does not pick it up yet
+    assert rows[4][3] > datetime.utcnow().isoformat()
+    assert asyncio.run(worker._drain_batch()) == 0
+    assert database.get_outbox_progress("ask", ask_id) == (1, 0, 3)
+
+    # Due again, and this is its last allowed attempt
+    with database.get_pool().write() as conn:
+        conn.execute("UPDATE outbox SET next_attempt_at = '2000-01-01' WHERE chat_id = 4")
+    assert asyncio.run(worker._drain_batch()) == 1
+    assert outbox_rows()[4][:3] == ("failed", 2, "Timed out")
+
+
+def test_an_unexpected_send_error_only_retries_its_own_row(database, monkeypatch):
+    async def deliver_message(chat_id, text):
+        if chat_id == 3:
+            raise RuntimeError("connection pool closed")
+        return SENT, None
+
+    monkeypatch.setattr(dispatcher, "deliver_message", deliver_message)
+    worker = outbox.OutboxWorker(batch_size=10, poll_seconds=1, max_attempts=3, retention_days=7)
+    database.create_ask(-100, 1, "Al", "buy milk", [(2, "Bea"), (3, "Cy"), (4, "Di")], notify=True)
+
+    assert asyncio.run(worker._drain_batch()) == 3
+    rows = outbox_rows()
+    # The rows that went out are recorded as sent and will not be delivered again
+    assert rows[2][:3] == rows[4][:3] == ("sent", 1, None)
+    assert rows[3][:3] == ("pending", 1, "connection pool closed")
+
+
+def test_prune_outbox_only_deletes_old_sent_rows(database):
+    database.create_ask(-100, 1, "Al", "buy milk", [(2, "Bea"), (3, "Cy")], notify=True)
+    sent, pending = [row[0] for row in database.get_outbox_batch(10, "2100-01-01")]
+    database.record_outbox_results([sent], [], [], "2000-01-01")
+
+    assert database.prune_outbox(0, "1999-01-01") == 0
+    assert database.prune_outbox(0, "2001-01-01") == 1
+    assert [row[0] for row in database.get_outbox_batch(10, "2100-01-01")] == [pending]
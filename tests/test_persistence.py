@@ -0,0 +1,38 @@
+import asyncio
+import pickle
+
+import db_async
+from persistence import SQLitePersistence
+
+
+def test_changes_of_one_run_are_written_in_one_transaction(database, monkeypatch):
+    writes = []
+    save = db_async.save_persisted_state
+
+    async def counting_save(user_data, conversations):
+        writes.append((len(user_data), len(conversations)))
+        await save(user_data, conversations)
+
+    monkeypatch.setattr(db_async, "save_persisted_state", counting_save)
+
+    async def run():
+        persistence = SQLitePersistence(update_interval=60)
+        # What Application.update_persistence does with the changes of one interval
+        await asyncio.gather(
+            persistence.update_user_data(1, {"group": -100}),
+            persistence.update_user_data(2, {"group": -200}),
+            persistence.update_conversation("ask", (1, 1), 2),
+        )
+        await persistence._writing
+        # Unchanged data is not written again
+        await persistence.update_user_data(1, {"group": -100})
+        await persistence.flush()
+        return persistence
+
+    persistence = asyncio.run(run())
+
+    assert writes == [(2, 1)]
+    assert persistence.pending == 0
+    assert dict(database.load_persisted_user_data())[1] == pickle.dumps({"group": -100},
+                                                                        protocol=pickle.HIGHEST_PROTOCOL)
+    assert database.load_persisted_conversations("ask") == [("[1, 1]", "2")]
@@ -0,0 +1,49 @@
+import logging
+
+import pytest
+
+import db
+from conftest import make_ask
+
+
+@pytest.fixture
+def profiler(database, monkeypatch):
+    """A profiler that logs every statement as slow, traced on pools opened from here on."""
+    profiler = db.QueryProfiler(slow_ms=0, progress_ops=1000)
+    db.close_pool()
+    monkeypatch.setattr(db, "profiler", profiler)
+    yield profiler
+    db.close_pool()
+
+
+def stats(profiler, prefix: str):
+    return [value for key, value in profiler._stats.items() if key.startswith(prefix)]
+
+
+def test_trigger_statements_count_as_part_of_the_one_that_fired_them(profiler, caplog):
+    caplog.set_level(logging.WARNING, logger="db")
+    # Inserting an ask fires the summary and search triggers
+    make_ask()
+
+    [(calls, _, _, _)] = stats(profiler, "INSERT INTO asks ")
+    assert calls == 1
+    # executemany runs the statement once per assignee
+    [(calls, _, _, _)] = stats(profiler, "INSERT INTO ask_assignees ")
+    assert calls == 2
+    slow = [record.getMessage() for record in caplog.records if "INSERT INTO asks " in record.getMessage()]
+    assert len(slow) == 1
+
+
+def test_plans_come_from_the_statements_own_shard(profiler, monkeypatch, caplog):
+    monkeypatch.setattr(db.settings, "DB_SHARDS", 2)
+    db.init_db()
+    caplog.set_level(logging.WARNING, logger="db")
+    with db.get_pool(1).write() as conn:
+        conn.execute("CREATE TABLE only_on_shard_1 (n INTEGER)")
+    with db.get_pool(1).read() as conn:
+        conn.execute("SELECT n FROM only_on_shard_1").fetchall()
+
+    [message] = [record.getMessage() for record in caplog.records
+                 if record.getMessage().startswith("Slow query") and "FROM only_on_shard_1" in record.getMessage()]
+    assert "SCAN only_on_shard_1" in message
+    assert "<no plan" not in message
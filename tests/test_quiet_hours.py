@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import config
+import db_async
+import jobs
+import reminders
+
+NIGHT = (time(22, 0), time(7, 0))
+
+
+class RecordingJobQueue:
+    """Just enough of PTB's JobQueue to see what would be scheduled."""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def run_once(self, callback, when, name=None):
+        self.scheduled.append((name, when))
+        return SimpleNamespace(schedule_removal=lambda: None)
+
+
+@pytest.mark.parametrize("clock, left", [
+    ("23:30", 7.5 * 3600), ("06:59", 60), ("07:00", 0), ("12:00", 0), ("22:00", 9 * 3600),
+])
+def test_quiet_seconds_left_wraps_past_midnight(clock, left):
+    now = datetime.combine(datetime(2026, 1, 1), config.parse_clock(clock, "test"))
+    assert config.quiet_seconds_left(now, NIGHT) == left
+    assert config.quiet_seconds_left(now, None) == 0
+
+
+def test_parse_clock_range():
+    assert config.parse_clock_range("22:00-07:00", "QUIET_HOURS") == NIGHT
+    assert config.parse_clock_range("22:00", "QUIET_HOURS") is None
+    assert config.parse_clock_range("", "QUIET_HOURS") is None
+
+
+def quiet_now(monkeypatch, quiet: bool):
+    """Make QUIET_HOURS cover the current time, or none of the day."""
+    now = datetime.now(config.local_zone())
+    start, end = (now - timedelta(hours=1)).time(), (now + timedelta(hours=1)).time()
+    monkeypatch.setattr(config.settings, "QUIET_HOURS", (start.replace(second=0, microsecond=0),
+                                                          end.replace(second=0, microsecond=0)) if quiet else None)
+
+
+def test_reminders_due_in_quiet_hours_wait_for_their_end(monkeypatch):
+    fired = []
+
+    async def fire_reminders(reminder_ids, now_utc):
+        fired.extend(reminder_ids)
+        return 0
+
+    monkeypatch.setattr(db_async, "fire_reminders", fire_reminders)
+    scheduler = reminders.ReminderScheduler(window=10)
+    scheduler._job_queue = RecordingJobQueue()
+    scheduler._heap = [("2000-01-01T00:00:00", 7)]
+
+    quiet_now(monkeypatch, quiet=True)
+    asyncio.run(scheduler._fire(None))
+    [(name, delay)] = scheduler._job_queue.scheduled
+    assert fired == [] and scheduler.pending == 1
+    assert 0 < delay <= 3600
+
+    quiet_now(monkeypatch, quiet=False)
+    asyncio.run(scheduler._fire(None))
+    assert fired == [7] and scheduler.pending == 0
+
+
+def test_digest_in_quiet_hours_is_sent_when_they_end(monkeypatch):
+    sent = []
+
+    async def send_daily_digest():
+        sent.append(True)
+
+    monkeypatch.setattr(jobs.digest, "send_daily_digest", send_daily_digest)
+    context = SimpleNamespace(job_queue=RecordingJobQueue())
+
+    quiet_now(monkeypatch, quiet=True)
+    asyncio.run(jobs.send_daily_digest(context))
+    [(name, delay)] = context.job_queue.scheduled
+    assert sent == [] and name == "daily_digest_after_quiet_hours" and 0 < delay <= 3600
+
+    quiet_now(monkeypatch, quiet=False)
+    asyncio.run(jobs.send_daily_digest(context))
+    assert sent == [True]
@@ -0,0 +1,165 @@
+"""Recorded Telegram updates (tools/updates/) fed through the bot's handlers, with the Bot API stubbed."""
+import asyncio
+import json
+import socket
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+from telegram import Update
+from telegram.request import BaseRequest
+
+import app as bot_app
+from outbound import dispatcher
+
+UPDATES = Path(__file__).resolve().parent.parent / "tools" / "updates"
+BOT_USER = {"id": 222222222, "is_bot": True, "first_name": "Ford-Fencers-Bot", "username": "UsualSuspects_bot"}
+USER_ID = 111111111
+
+
+class RecordingRequest(BaseRequest):
+    """Answers Bot API calls the way Telegram would and records (method, parameters) of each."""
+
+    def __init__(self):
+        self.calls: List[Tuple[str, dict]] = []
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls.append((api_method, params))
+        if api_method == "getMe":
+            result = BOT_USER
+        elif api_method in ("sendMessage", "editMessageText"):
+            result = {
+                "message_id": params.get("message_id", len(self.calls)), "date": 0, "from": BOT_USER,
+                "chat": {"id": params.get("chat_id", USER_ID), "type": "private"}, "text": params.get("text", ""),
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    def texts(self, api_method: str) -> List[str]:
+        return [params.get("text") for name, params in self.calls if name == api_method]
+
+
+def replay(*names: str) -> RecordingRequest:
+    """Process the named recordings in order through a fully built application."""
+    request = RecordingRequest()
+    application = bot_app.build_app(request)
+
+    async def run():
+        async with application:
+            dispatcher.start(application.bot)
+            for name in names:
+                data = json.loads((UPDATES / f"{name}.json").read_text())
+                await application.process_update(Update.de_json(data, application.bot))
+
+    asyncio.run(run())
+    return request
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def post(url: str, name: str, secret: str = None) -> int:
+    """POST a recording the way Telegram delivers it to a webhook; returns the HTTP status."""
+    headers = {"Content-Type": "application/json"}
+    if secret is not None:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+    request = urllib.request.Request(url, data=(UPDATES / f"{name}.json").read_bytes(), headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_recordings_are_valid_updates():
+    recordings = sorted(UPDATES.glob("*.json"))
+    assert recordings
+    for path in recordings:
+        assert "update_id" in json.loads(path.read_text()), path.name
+
+
+def test_start_registers_the_user_and_shows_the_menu(database):
+    request = replay("dm_start")
+
+    assert request.texts("sendMessage") == ["UsualSuspects Bot is online! What would you like to do?"]
+    assert "ak:new" in json.dumps(request.calls[-1][1]["reply_markup"])
+    # Registered users land on the default roster
+    assert [user_id for user_id, _ in database.get_roster(0)] == [USER_ID]
+
+
+def test_health_reports_ok(database):
+    request = replay("dm_health")
+
+    [text] = request.texts("sendMessage")
+    assert text.startswith("OK\n")
+    assert "0 queued in outbox" in text
+
+
+def test_my_asks_callback_answers_and_edits(database):
+    request = replay("dm_start", "my_asks_callback")
+
+    methods = [name for name, _ in request.calls]
+    assert "answerCallbackQuery" in methods
+    [text] = request.texts("editMessageText")
+    assert "no open assignments" in text.lower()
+
+
+def test_webhook_mode_requires_a_public_url(monkeypatch):
+    monkeypatch.setattr(bot_app.settings, "UPDATE_MODE", "webhook")
+    monkeypatch.setattr(bot_app.settings, "WEBHOOK_URL", None)
+    monkeypatch.setattr(bot_app.db, "init_db", lambda: pytest.fail("started without WEBHOOK_URL"))
+
+    with pytest.raises(SystemExit, match="WEBHOOK_URL"):
+        bot_app.main()
+
+
+def test_webhook_handles_posted_updates_and_rejects_a_wrong_secret(database, monkeypatch):
+    monkeypatch.setattr(bot_app.settings, "WEBHOOK_SECRET", "family-secret")
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/{bot_app.settings.WEBHOOK_PATH}"
+    request = RecordingRequest()
+    application = bot_app.build_app(request)
+
+    async def run():
+        async with application:
+            dispatcher.start(application.bot)
+            await application.updater.start_webhook(
+                listen="127.0.0.1", port=port, url_path=bot_app.settings.WEBHOOK_PATH,
+                webhook_url=f"https://bot.example/{bot_app.settings.WEBHOOK_PATH}",
+                secret_token=bot_app.settings.WEBHOOK_SECRET,
+            )
+            await application.start()
+            try:
+                statuses = [await asyncio.to_thread(post, url, "dm_start", "family-secret")]
+                for _ in range(100):
+                    if request.texts("sendMessage"):
+                        break
+                    await asyncio.sleep(0.05)
+                statuses.append(await asyncio.to_thread(post, url, "dm_health", "wrong-secret"))
+                statuses.append(await asyncio.to_thread(post, url, "dm_health"))
+                await asyncio.sleep(0.2)
+            finally:
+                await application.updater.stop()
+                await application.stop()
+        return statuses
+
+    assert asyncio.run(run()) == [200, 403, 403]
+    [set_webhook] = [params for name, params in request.calls if name == "setWebhook"]
+    assert set_webhook["secret_token"] == "family-secret"
+    # Only the update with the right secret reached the handlers
+    assert request.texts("sendMessage") == ["UsualSuspects Bot is online! What would you like to do?"]
@@ -0,0 +1,48 @@
+import db
+from conftest import CHAT, close, make_ask
+
+
+def search_ids(query: str, chat_id: int = CHAT):
+    return [(item["ask_id"], item["status"]) for item in db.search_asks(chat_id, query, 10)[0]]
+
+
+def test_search_triggers_index_new_asks_and_assignees(database):
+    milk = make_ask("Buy oat milk")
+    epee = make_ask("Repair the épée", assignees=[(4, "Dora")])
+    make_ask("buy milk", chat_id=-200)
+
+    assert search_ids("milk") == [(milk, "open")]
+    assert search_ids("epee") == [(epee, "open")]
+    # Assignee names are indexed too, and words match as prefixes
+    assert search_ids("dor") == [(epee, "open")]
+    assert search_ids("cy") == [(milk, "open")]
+    assert search_ids("milk repair") == []
+    assert search_ids("   ") == []
+
+
+def test_search_finds_archived_asks(database):
+    ask_id = make_ask("renew fencing licence")
+    close(ask_id, "2000-01-01")
+    database.archive_closed_asks(0, "2000-03-01", limit=10)
+
+    [item], more = database.search_asks(CHAT, "fencing", 10)
+    assert (item["ask_id"], item["status"], more) == (ask_id, "closed", False)
+    assert item["snippet"] == "renew «fencing» licence"
+
+
+def test_search_backfill_indexes_hot_and_archived_history(database, monkeypatch):
+    monkeypatch.setattr(database, "SEARCH_BACKFILL_BATCH", 2)
+    archived = make_ask("archived groceries")
+    close(archived, "2000-01-01")
+    database.archive_closed_asks(0, "2000-03-01", limit=10)
+    hot = [make_ask(f"hot groceries {n}") for n in range(4)]
+    # As if the history predates the search index: drop it and rerun the online backfill
+    with database.get_pool().write() as conn:
+        conn.execute("DELETE FROM asks_fts")
+        conn.execute(f"PRAGMA user_version = {database.MIGRATIONS[-2].version}")
+    assert search_ids("groceries") == []
+    assert database.pending_migrations() == {0: [database.MIGRATIONS[-1].version]}
+
+    assert database.run_online_migrations()
+    assert sorted(search_ids("groceries")) == sorted([(archived, "closed")] + [(ask_id, "open") for ask_id in hot])
+    assert search_ids("cy") and database.pending_migrations() == {0: []}
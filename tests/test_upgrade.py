@@ -0,0 +1,47 @@
+import sqlite3
+
+from config import GLOBAL_GROUP_ID
+
+# The schema and rows of a database written before groups, versioning and sharding existed
+BASELINE = """
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY, user_id INTEGER UNIQUE NOT NULL, display_name TEXT NOT NULL, created_at TEXT NOT NULL
+    );
+    CREATE TABLE asks (
+        id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL, requester_id INTEGER NOT NULL,
+        requester_name TEXT NOT NULL, text TEXT NOT NULL,
+        status TEXT NOT NULL CHECK (status IN ('open','closed')), created_at TEXT NOT NULL, closed_at TEXT
+    );
+    CREATE TABLE ask_assignees (
+        id INTEGER PRIMARY KEY, ask_id INTEGER NOT NULL, assignee_id INTEGER NOT NULL, assignee_name TEXT NOT NULL,
+        status TEXT NOT NULL CHECK (status IN ('open','done')), done_at TEXT,
+        FOREIGN KEY(ask_id) REFERENCES asks(id) ON DELETE CASCADE
+    );
+    CREATE INDEX idx_asks_chat_status ON asks(chat_id, status);
+    CREATE INDEX idx_assign_assignee_status ON ask_assignees(assignee_id, status);
+
+    INSERT INTO users (user_id, display_name, created_at) VALUES (1, 'Al', '2025-01-01'), (2, 'Bea', '2025-01-01');
+    -- Without ALLOWED_CHAT_IDS asks were filed under the requester's DM chat, whose id is the user's
+    INSERT INTO asks (chat_id, requester_id, requester_name, text, status, created_at)
+        VALUES (1, 1, 'Al', 'buy milk', 'open', '2025-02-01');
+    INSERT INTO ask_assignees (ask_id, assignee_id, assignee_name, status) VALUES (1, 2, 'Bea', 'open');
+"""
+
+
+def test_upgrade_keeps_dm_filed_asks_on_the_default_roster(unopened_database):
+    database = unopened_database
+    with sqlite3.connect(database.DB_PATH) as conn:
+        conn.executescript(BASELINE)
+
+    database.init_db()
+    database.run_online_migrations()
+
+    assert database.get_groups() == [(GLOBAL_GROUP_ID, "Everyone")]
+    assert database.get_user_groups(2) == [(GLOBAL_GROUP_ID, "Everyone")]
+    [assignment] = database.page_my_open_assignments(GLOBAL_GROUP_ID, 2, 10).items
+    assert (assignment["ask_id"], assignment["text"]) == (1, "buy milk")
+    assert [item["ask_id"] for item in database.get_all_open_asks(GLOBAL_GROUP_ID)] == [1]
+    assert [item["ask_id"] for item in database.get_requester_open_asks(GLOBAL_GROUP_ID, 1, 10)] == [1]
+    assert database.verify_open_ask_summary() == []
+    # The old assignment can still be completed, which closes the ask
+    assert database.complete_assignment(1, 2, "t1")[-1] is True
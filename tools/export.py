@@ -0,0 +1,75 @@
+"""Export asks, hot and archived, one row per assignee, as CSV or JSONL.
+
+    python -m tools.export [--db family_bot.db] [--chat CHAT_ID] [--format csv|jsonl] [--gzip]
+                           [--since CURSOR | --cursor-file PATH] [--out PATH]
+
+Rows stream from SQLite into the output without loading the history into
+memory; --out defaults to stdout. The cursor of the next incremental export
+is printed to stderr. With --cursor-file the cursor is read from that file
+and replaced once the export is complete, so a nightly
+
+    python -m tools.export --gzip --cursor-file asks.cursor --out asks-$(date +%F).csv.gz
+
+only reads asks created since the previous run. It is safe while the bot is up.
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("BOT_TOKEN", "tools")
+
+import db  # noqa: E402
+import export  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export asks as CSV or JSONL.")
+    parser.add_argument("--db", default=db.DB_PATH, help="database path")
+    parser.add_argument("--chat", type=int, help="only this group's asks")
+    parser.add_argument("--format", choices=export.FORMATS, default="csv")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    cursor = parser.add_mutually_exclusive_group()
+    cursor.add_argument("--since", help="only asks after this cursor, as printed by an earlier export")
+    cursor.add_argument("--cursor-file", help="read the cursor from this file and store the next one in it")
+    parser.add_argument("--out", default="-", help="output path, - for stdout")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} not found")
+    since_text = args.since
+    if args.cursor_file and os.path.exists(args.cursor_file):
+        with open(args.cursor_file) as f:
+            since_text = f.read()
+    try:
+        since = export.parse_cursor(since_text)
+    except ValueError as e:
+        parser.error(str(e))
+
+    db.DB_PATH = args.db
+    db.init_db()
+    started = time.perf_counter()
+    try:
+        if args.out == "-":
+            stats = export.write_export(db.iter_export_rows(args.chat, since), sys.stdout.buffer,
+                                        args.format, args.gzip, since)
+            sys.stdout.buffer.flush()
+        else:
+            with open(args.out, "wb") as out:
+                stats = export.write_export(db.iter_export_rows(args.chat, since), out,
+                                            args.format, args.gzip, since)
+    finally:
+        db.close_pool()
+
+    next_cursor = export.format_cursor(stats.cursor)
+    if args.cursor_file:
+        # Replaced atomically, and only after the export succeeded
+        with open(args.cursor_file + ".tmp", "w") as f:
+            f.write(next_cursor + "\n")
+        os.replace(args.cursor_file + ".tmp", args.cursor_file)
+    print(f"exported {stats.asks} asks ({stats.rows} rows) in {(time.perf_counter() - started) * 1000:.0f} ms; "
+          f"next cursor: {next_cursor or '(none)'}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
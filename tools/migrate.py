@@ -0,0 +1,61 @@
+"""Show or apply schema migrations on every shard of a database.
+
+    python -m tools.migrate status [--db family_bot.db]
+    python -m tools.migrate up [--db family_bot.db]
+
+status lists each shard's PRAGMA user_version and pending migrations and
+exits non-zero if any are pending. up applies everything, including online
+migrations the bot would otherwise run in the background after startup;
+it is safe to run while the bot is up.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+os.environ.setdefault("BOT_TOKEN", "tools")
+
+import db  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or apply schema migrations.")
+    parser.add_argument("command", choices=["status", "up"])
+    parser.add_argument("--db", default=db.DB_PATH, help="database path")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} not found")
+
+    db.DB_PATH = args.db
+    descriptions = {migration.version: migration.description for migration in db.MIGRATIONS}
+    try:
+        if args.command == "up":
+            db.init_db()
+            started = time.perf_counter()
+            db.run_online_migrations()
+            for name, seconds in db.startup_timings.items():
+                print(f"{name:24s} {seconds * 1000:8.1f} ms")
+            print(f"online migrations        {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+        try:
+            shards = db.shards()
+        except sqlite3.OperationalError:
+            # Databases from before versioning have no directory tables yet
+            shards = [0]
+        behind = False
+        for shard in shards:
+            version = db.schema_version(shard)
+            print(f"{db.shard_path(shard)}: version {version} of {db.SCHEMA_VERSION}")
+            for pending in (v for v in descriptions if v > version):
+                print(f"  pending {pending}: {descriptions[pending]}")
+                behind = True
+        if behind:
+            sys.exit(1)
+    finally:
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
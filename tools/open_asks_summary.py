@@ -0,0 +1,55 @@
+"""Check or rebuild the materialized open-asks summary against the base tables.
+
+    python -m tools.open_asks_summary verify [--db family_bot.db]
+    python -m tools.open_asks_summary rebuild [--db family_bot.db]
+
+verify exits non-zero and lists the affected asks if open_ask_summary has
+drifted from asks/ask_assignees; rebuild recomputes it in one transaction.
+Both are safe to run while the bot is up.
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("BOT_TOKEN", "tools")
+
+import db  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify or rebuild the open-asks summary table.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--db", default=db.DB_PATH, help="database path")
+    parser.add_argument("--limit", type=int, default=20, help="problems to list when verifying")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} not found")
+
+    db.DB_PATH = args.db
+    db.init_db()
+    started = time.perf_counter()
+    try:
+        if args.command == "rebuild":
+            rows = db.rebuild_open_ask_summary()
+            print(f"Rebuilt open_ask_summary: {rows} open asks in {time.perf_counter() - started:.2f}s")
+            return
+
+        problems = db.verify_open_ask_summary()
+        elapsed = time.perf_counter() - started
+        if not problems:
+            print(f"open_ask_summary is in sync ({elapsed:.2f}s)")
+            return
+        for problem, ask_id in problems[:args.limit]:
+            print(f"{problem:10s} ask {ask_id}")
+        if len(problems) > args.limit:
+            print(f"... and {len(problems) - args.limit} more")
+        print(f"{len(problems)} asks out of sync; run 'rebuild' to fix")
+        sys.exit(1)
+    finally:
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
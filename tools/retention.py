@@ -0,0 +1,77 @@
+"""Inspect and run the hot/cold retention of every shard of a database.
+
+    python -m tools.retention status [--db family_bot.db]
+    python -m tools.retention archive [--db family_bot.db] [--days 30]
+    python -m tools.retention vacuum [--db family_bot.db]
+
+status prints open, closed and archived row counts and free pages per shard.
+archive moves asks closed more than --days ago to the archive tables now,
+the same way the bot's retention job does; it is safe while the bot is up.
+vacuum switches files created before incremental auto-vacuum to it with a
+full VACUUM, after which the retention job can shrink them; stop the bot
+first, as VACUUM rewrites the whole file.
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("BOT_TOKEN", "tools")
+
+import db  # noqa: E402
+from config import settings  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and run archiving of closed asks.")
+    parser.add_argument("command", choices=["status", "archive", "vacuum"])
+    parser.add_argument("--db", default=db.DB_PATH, help="database path")
+    parser.add_argument("--days", type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                        help="archive asks closed more than this many days ago")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} not found")
+
+    db.DB_PATH = args.db
+    db.init_db()
+    try:
+        for shard in db.shards():
+            started = time.perf_counter()
+            if args.command == "archive":
+                cutoff = (datetime.utcnow() - timedelta(days=args.days)).isoformat()
+                archived = 0
+                while True:
+                    moved = db.archive_closed_asks(shard, cutoff, settings.ARCHIVE_BATCH_SIZE)
+                    archived += moved
+                    if moved < settings.ARCHIVE_BATCH_SIZE:
+                        break
+                freed = db.incremental_vacuum(shard, 0)
+                print(f"{db.shard_path(shard)}: archived {archived} asks, freed {freed} pages "
+                      f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+            elif args.command == "vacuum":
+                conn = sqlite3.connect(db.shard_path(shard), isolation_level=None)
+                try:
+                    if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] == 2:
+                        print(f"{db.shard_path(shard)}: already incremental")
+                        continue
+                    conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+                    conn.execute("VACUUM;")
+                finally:
+                    conn.close()
+                print(f"{db.shard_path(shard)}: switched to incremental auto-vacuum "
+                      f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+            stats = db.get_retention_stats(shard)
+            mode = {0: "none", 1: "full", 2: "incremental"}.get(stats['auto_vacuum'], stats['auto_vacuum'])
+            print(f"{db.shard_path(shard)}: {stats['open_asks']} open, {stats['closed_asks']} closed, "
+                  f"{stats['archived_asks']} archived asks ({stats['archived_assignments']} assignments); "
+                  f"{stats['page_count'] * stats['page_size'] // 1024} KiB, {stats['free_pages']} free pages, "
+                  f"auto_vacuum {mode}")
+    finally:
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()